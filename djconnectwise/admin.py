@@ -13,9 +13,10 @@ class SyncJobAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'start_time', 'end_time', 'duration_or_zero', 'entity_name',
         'synchronizer_class', 'success', 'added', 'updated', 'skipped',
-        'deleted', 'sync_type',
+        'deleted', 'sync_type', 'lease_status',
     )
-    list_filter = ('sync_type', 'success', 'entity_name', 'synchronizer_class')
+    list_filter = ('sync_type', 'success', 'entity_name', 'synchronizer_class',
+                   'lease_status')
 
     def has_add_permission(self, request):
         return False
@@ -1,17 +1,25 @@
 import datetime
+import email.utils
+import http.cookiejar
 import json
 import logging
+import os
 import re
+import threading
+import time
 from decimal import Decimal
 from json import JSONDecodeError
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.core.cache import cache
 from django.db import models
 from retrying import retry
 
+from djconnectwise.ratelimit import get_rate_limiter, parse_retry_after, \
+    get_default_lane
 from djconnectwise.utils import DjconnectwiseSettings, generate_image_url
 
 # Cloud URLs:
@@ -40,6 +48,58 @@ CONTENT_DISPOSITION_RE = re.compile(
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive connection pools, keyed by process and credentials, shared by
+# every client (and synchronizer) in the process.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(key, pool_size):
+    """
+    Return the pooled requests session for the given key, creating it on
+    first use.
+
+    The process ID is part of the key, so a forked worker never reuses the
+    sockets it inherited from its parent. Every client with the same
+    credentials shares the session, so it keeps no cookies, lest one
+    client's responses set cookies on another's requests.
+    """
+    key = (os.getpid(),) + tuple(key)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(
+                http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+    return session
+
+
+def close_sessions():
+    """Close and forget every pooled session."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# Codebases resolved by this process, keyed by server URL and company ID,
+# so the base URL isn't looked up in the Django cache on every request.
+_api_codebases = {}
+_api_codebases_lock = threading.Lock()
+
+
+def clear_api_codebase_cache():
+    """Forget every codebase memoized by this process."""
+    with _api_codebases_lock:
+        _api_codebases.clear()
+
 
 class ConnectWiseAPIError(Exception):
     """Raise this, not request exceptions."""
@@ -63,6 +123,17 @@ class ConnectWiseAPIServerError(ConnectWiseAPIError):
     pass
 
 
+class ConnectWiseAPIThrottledError(ConnectWiseAPIError):
+    """
+    ConnectWise refused the request because too many were made (HTTP 429),
+    or is temporarily unavailable (HTTP 503). Worth retrying once the
+    Retry-After period is over.
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class ConnectWiseRecordNotFoundError(ConnectWiseAPIClientError):
     """The record was not found."""
     pass
@@ -76,6 +147,11 @@ class ConnectWiseSecurityPermissionsException(ConnectWiseAPIClientError):
 class CompanyInfoManager:
     COMPANYINFO_ENDPOINT = '{}/login/companyinfo/{}'
 
+    def __init__(self, session=None, codebase_ttl=0):
+        # Without a pooled session, fall back to a one-off connection.
+        self.session = session or requests
+        self.codebase_ttl = codebase_ttl
+
     def get_company_info(self, server_url, company_id):
         company_endpoint = self.COMPANYINFO_ENDPOINT.format(
             server_url, company_id
@@ -83,7 +159,7 @@ class CompanyInfoManager:
 
         try:
             logger.debug('Making GET request to {}'.format(company_endpoint))
-            response = requests.get(company_endpoint)
+            response = self.session.get(company_endpoint)
             if 200 <= response.status_code < 300:
                 resp_json = response.json()
                 if resp_json is None:
@@ -108,14 +184,22 @@ class CompanyInfoManager:
     def fetch_api_codebase(self, server_url, company_id, force_fetch=True):
         """
         Returns the Codebase value for the hosted Connectwise instance
-        at the supplied URL. The Codebase is retrieved from the cache
-        or, if it is not found, it is retrieved from the companyinfo endpoint.
+        at the supplied URL. The Codebase is retrieved from the process-local
+        memo while it is younger than codebase_ttl seconds, then from the
+        cache or, if it is not found, from the companyinfo endpoint.
         """
         cache_key = 'api_codebase'
         codebase_result = DEFAULT_CW_API_CODEBASE
         codebase_updated = False
 
         if any(domain in server_url for domain in CLOUD_DOMAINS):
+            memo_key = (server_url, company_id)
+            if not force_fetch:
+                with _api_codebases_lock:
+                    memo = _api_codebases.get(memo_key)
+                if memo and memo[1] > time.monotonic():
+                    return memo[0], codebase_updated
+
             codebase_from_cache = cache.get(cache_key)
             if not codebase_from_cache or force_fetch:
                 company_info_json = self.get_company_info(
@@ -134,23 +218,49 @@ class CompanyInfoManager:
                 cache.set(cache_key, codebase_result)
             else:
                 codebase_result = codebase_from_cache
+
+            if self.codebase_ttl:
+                with _api_codebases_lock:
+                    _api_codebases[memo_key] = (
+                        codebase_result,
+                        time.monotonic() + self.codebase_ttl
+                    )
         return codebase_result, codebase_updated
 
 
+def parse_server_date(value):
+    """Return the time in the given HTTP Date header, or None."""
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
 def retry_if_api_error(exception):
     """
     Return True if we should retry (in this case when it's an
     ConnectWiseAPIError), False otherwise.
 
     Basically, don't retry on ConnectWiseAPIClientError, because those are the
-    type of exceptions where retrying won't help (404s, 403s, etc).
+    type of exceptions where retrying won't help (404s, 403s, etc). Throttled
+    requests are retried, and the rate limiter holds them back for the
+    Retry-After period.
     """
-    return type(exception) is ConnectWiseAPIError
+    return type(exception) is ConnectWiseAPIError or \
+        isinstance(exception, ConnectWiseAPIThrottledError)
 
 
 class ConnectWiseAPIClient(object):
     API = None
     MAX_404_ATTEMPTS = 1
+    # The rate limiter lane of this client's requests. None uses the
+    # process default, which cwsync sets to the background lane.
+    request_lane = None
+    # The Date header of the first response received since this was last
+    # reset to None, i.e. ConnectWise's clock at the start of a sync.
+    server_date = None
 
     def __init__(
         self,
@@ -176,7 +286,22 @@ class ConnectWiseAPIClient(object):
         if not self.API:
             raise ValueError('API not specified')
 
-        self.info_manager = CompanyInfoManager()
+        self.request_settings = DjconnectwiseSettings().get_settings()
+        self.timeout = self.request_settings['timeout']
+        self.session = get_session(
+            (server_url, company_id, api_public_key),
+            self.request_settings['session_pool_size'],
+        )
+
+        self.rate_limiter = get_rate_limiter(
+            (server_url, company_id, api_public_key),
+            self.request_settings,
+        )
+
+        self.info_manager = CompanyInfoManager(
+            session=self.session,
+            codebase_ttl=self.request_settings['api_codebase_ttl'],
+        )
         self.company_id = company_id
         self.api_public_key = api_public_key
         self.api_private_key = api_private_key
@@ -187,9 +312,6 @@ class ConnectWiseAPIClient(object):
             '{0}'.format(self.api_private_key),
         )
 
-        self.request_settings = DjconnectwiseSettings().get_settings()
-        self.timeout = self.request_settings['timeout']
-
     def _endpoint(self, path):
         api_base_url, _ = self.build_api_base_url()
         return '{0}{1}'.format(api_base_url, path)
@@ -289,6 +411,10 @@ class ConnectWiseAPIClient(object):
                                                 CW_RESPONSE_MAX_RECORDS)
                 params['page'] = kwargs.get('page', CW_DEFAULT_PAGE)
 
+            order_by = kwargs.get('order_by')
+            if order_by:
+                params['orderBy'] = order_by
+
             try:
                 return self.request('get', endpoint_url, params=params)
             except ConnectWiseRecordNotFoundError as e:
@@ -341,33 +467,68 @@ class ConnectWiseAPIClient(object):
                 )
             )
             complete_endpoint = self._endpoint(endpoint_url)
-            if files:
-                response = requests.request(
-                    method,
-                    complete_endpoint,
-                    files=files,
-                    data=body,
-                    params=params,
-                    auth=self.auth,
-                    timeout=self.timeout,
-                    headers=self.get_headers()
-                )
-            else:
-                response = requests.request(
-                    method,
-                    complete_endpoint,
-                    json=body,
-                    params=params,
-                    auth=self.auth,
-                    timeout=self.timeout,
-                    headers=self.get_headers(),
-                )
+            with self.rate_limiter.slot(self._rate_limit_key(endpoint_url),
+                                        self.get_request_lane()):
+                if files:
+                    response = self.session.request(
+                        method,
+                        complete_endpoint,
+                        files=files,
+                        data=body,
+                        params=params,
+                        auth=self.auth,
+                        timeout=self.timeout,
+                        headers=self.get_headers()
+                    )
+                else:
+                    response = self.session.request(
+                        method,
+                        complete_endpoint,
+                        json=body,
+                        params=params,
+                        auth=self.auth,
+                        timeout=self.timeout,
+                        headers=self.get_headers(),
+                    )
         except requests.RequestException as e:
             logger.debug(
                 'Request failed: {} {}: {}'.format(method, endpoint_url, e)
             )
             raise ConnectWiseAPIError('{}'.format(e))
 
+        return self._handle_response(response, endpoint_url)
+
+    def get_request_lane(self):
+        return self.request_lane or get_default_lane()
+
+    def _rate_limit_key(self, endpoint_url):
+        """
+        Return the path, relative to the API root, that endpoint
+        concurrency caps are matched against, e.g. service/tickets/1.
+        """
+        return '{}/{}'.format(self.API, endpoint_url.split('?')[0])
+
+    def _handle_response(self, response, endpoint_url):
+        """
+        Return the decoded body of the given response, or raise the
+        appropriate ConnectWiseAPIError for its status code.
+        """
+        if self.server_date is None:
+            self.server_date = parse_server_date(
+                response.headers.get('Date'))
+
+        if response.status_code in (429, 503):
+            self._log_failed(response)
+            retry_after = parse_retry_after(
+                response.headers.get('Retry-After'))
+            self.rate_limiter.throttled(retry_after)
+            raise ConnectWiseAPIThrottledError(
+                'Request throttled: HTTP {} for {}'.format(
+                    response.status_code, endpoint_url),
+                retry_after
+            )
+
+        self.rate_limiter.succeeded()
         if response.status_code == 204:  # No content
             return None
         elif 200 <= response.status_code < 300:
@@ -533,6 +694,11 @@ class CompanyAPIClient(ConnectWiseAPIClient):
         return self.fetch_resource(self.ENDPOINT_COMPANIES, should_page=True,
                                    *args, **kwargs)
 
+    def get_companies_count(self, **kwargs):
+        return self.fetch_resource(
+            '{}/count'.format(self.ENDPOINT_COMPANIES), **kwargs
+        ).get('count', 0)
+
     def get_company_statuses(self, *args, **kwargs):
         return self.fetch_resource(self.ENDPOINT_COMPANY_STATUSES,
                                    should_page=True,
@@ -797,6 +963,11 @@ class TimeAPIClient(ConnectWiseAPIClient):
                                    should_page=True,
                                    *args, **kwargs)
 
+    def get_time_entries_count(self, **kwargs):
+        return self.fetch_resource(
+            '{}/count'.format(self.ENDPOINT_ENTRIES), **kwargs
+        ).get('count', 0)
+
     def get_work_types(self, *args, **kwargs):
         return self.fetch_resource(self.ENDPOINT_WORK_TYPES,
                                    should_page=True,
@@ -1094,7 +1265,7 @@ class SystemAPIClient(ConnectWiseAPIClient):
         try:
             logger.debug('Making GET request to {}'.format(endpoint_url))
             complete_endpoint = self._endpoint(endpoint_url)
-            response = requests.get(
+            response = self.session.get(
                 complete_endpoint,
                 auth=self.auth,
                 timeout=self.timeout,
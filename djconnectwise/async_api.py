@@ -0,0 +1,338 @@
+"""
+Asyncio counterparts of the API clients in djconnectwise.api.
+
+Each async client subclasses its blocking client, so endpoints, getters and
+request bodies are shared; only the transport differs. Getters that simply
+return fetch_resource() or request() return awaitables here, and the few
+that post-process a response are overridden below.
+
+Requires httpx, i.e. `pip install django-connectwise[async]`. HTTP/2 is
+used when the h2 package is installed.
+"""
+import asyncio
+import logging
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import api
+from .api import ConnectWiseAPIError, ConnectWiseRecordNotFoundError, \
+    RETRY_WAIT_EXPONENTIAL_MULTAPPLIER, RETRY_WAIT_EXPONENTIAL_MAX, \
+    CW_RESPONSE_MAX_RECORDS, CW_DEFAULT_PAGE, retry_if_api_error
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def retry_wait(attempt):
+    """
+    Return the number of seconds to sleep after the given failed attempt,
+    matching the exponential wait used by the blocking clients.
+    """
+    wait = RETRY_WAIT_EXPONENTIAL_MULTAPPLIER * (2 ** attempt)
+    return min(wait, RETRY_WAIT_EXPONENTIAL_MAX) / 1000.0
+
+
+class AsyncConnectWiseAPIMixin:
+    """
+    Replace the blocking transport of a ConnectWiseAPIClient with an
+    httpx.AsyncClient. Use the client as an async context manager, or call
+    aclose() when done, to release its connections.
+    """
+
+    def __init__(self, *args, transport=None, **kwargs):
+        if httpx is None:
+            raise ImproperlyConfigured(
+                'The async ConnectWise clients require httpx; install '
+                'django-connectwise[async].'
+            )
+        super().__init__(*args, **kwargs)
+
+        pool_size = self.request_settings['session_pool_size']
+        self.async_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and transport is None,
+            auth=self.auth,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.async_client.aclose()
+
+    async def build_api_base_url_async(self, force_fetch=False):
+        # The codebase lookup may hit the cache or the companyinfo endpoint
+        # with blocking calls, so keep it off the event loop.
+        return await asyncio.to_thread(
+            self.build_api_base_url, force_fetch=force_fetch
+        )
+
+    async def _endpoint_async(self, path):
+        api_base_url, _ = await self.build_api_base_url_async()
+        return '{0}{1}'.format(api_base_url, path)
+
+    async def fetch_resource(self, endpoint_url, params=None,
+                             should_page=False, retry_counter=None,
+                             *args, **kwargs):
+        """
+        Issue a GET request to the specified REST endpoint.
+
+        Retries and codebase refreshes behave as in
+        ConnectWiseAPIClient.fetch_resource.
+        """
+        if not retry_counter:
+            retry_counter = {'count': 0}
+        max_attempts = self.request_settings['max_attempts']
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._fetch_resource(
+                    endpoint_url, params=params, should_page=should_page,
+                    retry_counter=retry_counter, *args, **kwargs
+                )
+            except ConnectWiseAPIError as e:
+                if not retry_if_api_error(e) or attempt >= max_attempts:
+                    raise
+                await asyncio.sleep(retry_wait(attempt))
+
+    async def _fetch_resource(self, endpoint_url, params=None,
+                              should_page=False, retry_counter=None,
+                              *args, **kwargs):
+        retry_counter['count'] += 1
+
+        # Copy, so retries don't see conditions added by a previous attempt.
+        params = dict(params) if params else {}
+
+        conditions = kwargs.get('conditions')
+        if conditions:
+            params['conditions'] = self.prepare_conditions(conditions)
+
+        if should_page:
+            params['pageSize'] = kwargs.get('page_size',
+                                            CW_RESPONSE_MAX_RECORDS)
+            params['page'] = kwargs.get('page', CW_DEFAULT_PAGE)
+
+        order_by = kwargs.get('order_by')
+        if order_by:
+            params['orderBy'] = order_by
+
+        try:
+            return await self.request('get', endpoint_url, params=params)
+        except ConnectWiseRecordNotFoundError as e:
+            logger.debug('Resource not found: {}'.format(endpoint_url))
+            if retry_counter['count'] <= self.MAX_404_ATTEMPTS:
+                _, codebase_updated = await self.build_api_base_url_async(
+                    force_fetch=True
+                )
+                if codebase_updated:
+                    logger.info('Codebase value has changed, so this '
+                                'request will be retried.')
+                    raise ConnectWiseAPIError(str(e))
+            raise e
+
+    async def request(self,
+                      method,
+                      endpoint_url,
+                      body=None,
+                      params=None,
+                      files=None):
+        """
+        Issue the given type of request to the specified REST endpoint.
+        """
+        try:
+            logger.debug(
+                'Making {} request to {}, body len {}, params {}'.format(
+                    method, endpoint_url, len(body) if body else 0, params
+                )
+            )
+            complete_endpoint = await self._endpoint_async(endpoint_url)
+            async with self.rate_limiter.slot_async(
+                    self._rate_limit_key(endpoint_url),
+                    self.get_request_lane()):
+                if files:
+                    response = await self.async_client.request(
+                        method,
+                        complete_endpoint,
+                        files=files,
+                        data=body,
+                        params=params,
+                        headers=self.get_headers()
+                    )
+                else:
+                    response = await self.async_client.request(
+                        method,
+                        complete_endpoint,
+                        json=body,
+                        params=params,
+                        headers=self.get_headers(),
+                    )
+        except httpx.HTTPError as e:
+            logger.debug(
+                'Request failed: {} {}: {}'.format(method, endpoint_url, e)
+            )
+            raise ConnectWiseAPIError('{}'.format(e))
+
+        return self._handle_response(response, endpoint_url)
+
+
+class AsyncTicketAPIMixin:
+
+    async def tickets_count(self, **kwargs):
+        result = await self.fetch_resource(
+            '{}/count'.format(self.ENDPOINT_TICKETS), **kwargs)
+        return result.get('count', 0)
+
+
+class AsyncCompanyAPIClient(AsyncConnectWiseAPIMixin, api.CompanyAPIClient):
+
+    async def get_companies_count(self, **kwargs):
+        result = await self.fetch_resource(
+            '{}/count'.format(self.ENDPOINT_COMPANIES), **kwargs)
+        return result.get('count', 0)
+
+
+class AsyncScheduleAPIClient(AsyncConnectWiseAPIMixin,
+                             api.ScheduleAPIClient):
+    pass
+
+
+class AsyncTimeAPIClient(AsyncConnectWiseAPIMixin, api.TimeAPIClient):
+
+    async def get_time_entries_count(self, **kwargs):
+        result = await self.fetch_resource(
+            '{}/count'.format(self.ENDPOINT_ENTRIES), **kwargs)
+        return result.get('count', 0)
+
+
+class AsyncSalesAPIClient(AsyncConnectWiseAPIMixin, api.SalesAPIClient):
+    pass
+
+
+class AsyncSystemAPIClient(AsyncConnectWiseAPIMixin, api.SystemAPIClient):
+
+    async def get_connectwise_version(self):
+        result = await self.fetch_resource(self.ENDPOINT_INFO)
+        return result.get('version', '')
+
+    async def document_download(self, document_id):
+        endpoint_url = self.ENDPOINT_DOCUMENTS_DOWNLOAD.format(document_id)
+        try:
+            logger.debug('Making GET request to {}'.format(endpoint_url))
+            complete_endpoint = await self._endpoint_async(endpoint_url)
+            response = await self.async_client.get(
+                complete_endpoint,
+                headers=self.get_headers(),
+            )
+        except httpx.HTTPError as e:
+            logger.error('Request failed: GET {}: {}'.format(endpoint_url, e))
+            raise ConnectWiseAPIError('{}'.format(e))
+
+        if 200 <= response.status_code < 300:
+            content_disposition_header = response.headers.get(
+                'Content-Disposition', '')
+
+            attachment_filename = self._attachment_filename(
+                content_disposition_header)
+            return attachment_filename, response
+        else:
+            self._log_failed(response)
+            return None, None
+
+    async def get_member_image_by_photo_id(self, photo_id, username):
+        filename, response = await self.document_download(photo_id)
+
+        if filename and response:
+            content_disposition_header = response.headers.get(
+                'Content-Disposition', '')
+
+            logger.info(
+                "Got member '{}' image; size {} bytes and "
+                "content-disposition header '{}'".format(
+                    username,
+                    len(response.content),
+                    content_disposition_header
+                )
+            )
+        return filename, response.content if response else response
+
+    async def get_attachment_count(self, object_id):
+        endpoint_url = f'{self.ENDPOINT_DOCUMENTS}count'
+        params = {
+            'recordType': 'Ticket',
+            'recordId': object_id,
+        }
+        result = await self.fetch_resource(endpoint_url, params=params)
+        return result.get('count', 0)
+
+    async def upload_attachments(self, object_id, files, recordType='Ticket',
+                                 *args, **kwargs):
+        body = {
+            'recordType': recordType,
+            'recordId': object_id
+        }
+        response = await self.request(
+            'POST', self.ENDPOINT_DOCUMENTS, body, files=files)
+        response['attachment_url'] = \
+            api.generate_image_url(self.company_id, response.get('guid'))
+
+        return response
+
+
+class AsyncServiceAPIClient(AsyncTicketAPIMixin, AsyncConnectWiseAPIMixin,
+                            api.ServiceAPIClient):
+    pass
+
+
+class AsyncProjectAPIClient(AsyncTicketAPIMixin, AsyncConnectWiseAPIMixin,
+                            api.ProjectAPIClient):
+
+    async def get_project_notes_count(self, project_id):
+        endpoint_url = '{}{}/{}'.format(self.ENDPOINT_PROJECTS, project_id,
+                                        self.ENDPOINT_PROJECT_NOTES)
+        res = await self.fetch_resource(endpoint_url)
+        return len(res)
+
+
+class AsyncConfigurationAPIClient(AsyncConnectWiseAPIMixin,
+                                  api.ConfigurationAPIClient):
+
+    async def get_configurations_by_ids(self, configuration_ids, *args,
+                                        **kwargs):
+        if not configuration_ids:
+            return []
+        return await super().get_configurations_by_ids(
+            configuration_ids, *args, **kwargs)
+
+
+class AsyncFinanceAPIClient(AsyncConnectWiseAPIMixin,
+                            api.FinanceAPIClient):
+    pass
+
+
+class AsyncHostedAPIClient(AsyncSystemAPIClient, api.HostedAPIClient):
+    pass
+
+
+class AsyncHostedReportAPIClient(AsyncConnectWiseAPIMixin,
+                                 api.HostedReportAPIClient):
+    pass
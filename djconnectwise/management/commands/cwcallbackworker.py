@@ -0,0 +1,183 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+
+from djconnectwise.models import CallbackEvent
+from djconnectwise.sync import InvalidObjectException
+from djconnectwise.utils import DjconnectwiseSettings
+from djconnectwise.views import CallBackView, CALLBACK_DELETED
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = str(_('Apply the ConnectWise callbacks queued by the callback '
+                 'view. Callbacks for the same record that arrive within '
+                 'the coalescing window are applied once. Run several '
+                 'workers to drain the queue faster.'))
+
+    callback_view_class = CallBackView
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once',
+                            action='store_true',
+                            default=False,
+                            help='Exit once no callback is due, instead of '
+                                 'waiting for more.')
+        parser.add_argument('--sleep',
+                            type=float,
+                            default=1.0,
+                            help='Seconds to wait before checking an empty '
+                                 'queue again.')
+
+    def handle(self, *args, **options):
+        verbosity = int(options['verbosity'])
+        if verbosity == 1:
+            logger.setLevel(logging.WARN)
+        elif verbosity == 2:
+            logger.setLevel(logging.INFO)
+
+        settings = DjconnectwiseSettings().get_settings()
+        coalesce_seconds = settings.get('callback_coalesce_seconds', 5)
+        claim_timeout = settings.get('callback_claim_timeout', 300)
+        batch_size = settings.get('callback_batch_size', 100)
+        max_attempts = settings.get('max_attempts', 3)
+
+        view = self.callback_view_class()
+        while True:
+            events = CallbackEvent.objects.claim(
+                coalesce_seconds, claim_timeout, batch_size)
+            if events:
+                self.apply_batch(view, events, max_attempts)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
+
+    def apply_batch(self, view, events, max_attempts):
+        """
+        Apply the claimed events of several records of one callback type.
+        Records handled by the same synchronizer are fetched together with
+        fetch_sync_by_ids(), rather than with a request per record.
+
+        Deletes, and records missing from the batched response, are
+        applied one at a time, so that a record is only deleted once a
+        request for it alone confirms that it's gone.
+        """
+        groups = {}
+        for entity_events in self.group_by_entity(events):
+            if entity_events[-1].action == CALLBACK_DELETED:
+                self.apply(view, entity_events, max_attempts)
+                continue
+
+            sync_class, model_class = view.get_sync_class(
+                entity_events[-1].callback_type,
+                self.get_record_type(entity_events)
+            )
+            groups.setdefault((sync_class, model_class), []) \
+                .append(entity_events)
+
+        for (sync_class, model_class), entities in groups.items():
+            if len(entities) == 1:
+                self.apply(view, entities[0], max_attempts)
+                continue
+
+            group_events = [e for entity in entities for e in entity]
+            entity_ids = [entity[-1].entity_id for entity in entities]
+            description = '{} IDs {}'.format(model_class, entity_ids)
+            try:
+                results = sync_class().fetch_sync_by_ids(entity_ids)
+            except InvalidObjectException as e:
+                self.drop(group_events, description, e)
+                continue
+            except Exception as e:
+                # Any other error is retried, so a callback that keeps
+                # failing is dropped rather than claimed again forever.
+                self.release(group_events, max_attempts, description, e)
+                continue
+
+            synced = [entity for entity in entities
+                      if entity[-1].entity_id in results.synced_ids]
+            if synced:
+                synced_events = [e for entity in synced for e in entity]
+                logger.info(
+                    'Applied {} callback(s) for {} {} records'.format(
+                        len(synced_events), len(synced),
+                        entities[0][-1].callback_type))
+                self.claimed(synced_events).delete()
+
+            for entity_events in entities:
+                if entity_events[-1].entity_id not in results.synced_ids:
+                    self.apply(view, entity_events, max_attempts)
+
+    def apply(self, view, events, max_attempts):
+        """
+        Apply the claimed events of one record. The record is fetched from
+        ConnectWise again, so only the latest action needs applying.
+        """
+        latest = events[-1]
+        synchronizer, model_class = view.get_synchronizer(
+            latest.callback_type, self.get_record_type(events))
+        description = '{} ID {}'.format(model_class, latest.entity_id)
+        try:
+            view.handle(latest.entity_id, latest.action,
+                        latest.callback_type, synchronizer)
+        except InvalidObjectException as e:
+            self.drop(events, description, e)
+            return
+        except Exception as e:
+            self.release(events, max_attempts, description, e)
+            return
+
+        logger.info('Applied {} callback(s) for {} ID {}'.format(
+            len(events), latest.callback_type, latest.entity_id))
+        self.claimed(events).delete()
+
+    def drop(self, events, description, error):
+        """
+        Drop events for a record that can't be synced, such as a ticket on
+        a board that isn't synced, as the callback view ignores them.
+        """
+        logger.warning('Ignoring {} callback: {}'.format(description, error))
+        self.claimed(events).delete()
+
+    def release(self, events, max_attempts, description, error):
+        """
+        Return failed events to the queue, or drop them once they have
+        used up their attempts.
+        """
+        attempts = max(event.attempts for event in events) + 1
+        if attempts >= max_attempts:
+            # The next periodic sync job will pick up the change.
+            logger.error(
+                'Failed to apply {} callback, giving up after {} '
+                'attempts: {}'.format(description, attempts, error)
+            )
+            self.claimed(events).delete()
+        else:
+            logger.warning(
+                'Failed to apply {} callback, will retry: {}'.format(
+                    description, error)
+            )
+            self.claimed(events).update(
+                claimed_at=None, attempts=F('attempts') + 1)
+
+    @staticmethod
+    def claimed(events):
+        return CallbackEvent.objects.filter(id__in=[e.id for e in events])
+
+    @staticmethod
+    def group_by_entity(events):
+        entities = {}
+        for event in events:
+            entities.setdefault(event.entity_id, []).append(event)
+        return list(entities.values())
+
+    @staticmethod
+    def get_record_type(events):
+        return next(
+            (e.record_type for e in reversed(events) if e.record_type), None
+        )
@@ -1,17 +1,80 @@
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 from djconnectwise import sync, api
 from djconnectwise.api import ConnectWiseSecurityPermissionsException
-from djconnectwise.utils import DjconnectwiseSettings
+from djconnectwise.ratelimit import default_lane, LANE_BACKGROUND
+from djconnectwise.utils import DjconnectwiseSettings, setup_worker, \
+    worker_setup_args
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.utils.translation import gettext_lazy as _
 
 OPTION_NAME = 'connectwise_object'
 
 
+def run_synchronizer(sync_class, full_option, resume=False, sharded=False):
+    """Run one synchronizer in a worker process and return its counts."""
+    with default_lane(LANE_BACKGROUND):
+        return run_sync(
+            sync_class(full=full_option, resume=resume), sharded)
+
+
+def run_sync(synchronizer, sharded=False):
+    """
+    Run the given synchronizer, taking part in a sharded full sync if
+    asked to and it can.
+    """
+    if sharded and hasattr(synchronizer, 'sync_sharded'):
+        return synchronizer.sync_sharded()
+    return synchronizer.sync()
+
+
+def synchronizer_dependencies(synchronizer_map):
+    """
+    Return a dict of each synchronizer name to the set of names that must
+    finish before it starts.
+
+    A synchronizer waits for the earlier entries of the map that sync a
+    model it refers to, through related_meta, parent_model_class or a
+    relation field on its own model, and for earlier entries that sync the
+    same model. Later entries are never waited for, so the map's order
+    breaks any cycle, and running the map in order stays valid.
+    """
+    names_by_model = {}
+    dependencies = OrderedDict()
+
+    for name, (sync_class, _obj_name) in synchronizer_map.items():
+        model = sync_class.model_class._meta.concrete_model
+
+        referenced = {model}
+        related_meta = getattr(sync_class, 'related_meta', None) or {}
+        for model_class, _field_name in related_meta.values():
+            referenced.add(model_class._meta.concrete_model)
+        parent_model_class = getattr(sync_class, 'parent_model_class', None)
+        if parent_model_class:
+            referenced.add(parent_model_class._meta.concrete_model)
+        for field in model._meta.get_fields():
+            if field.is_relation and not field.auto_created and \
+                    field.related_model:
+                referenced.add(field.related_model._meta.concrete_model)
+
+        dependencies[name] = {
+            dependency
+            for related_model in referenced
+            for dependency in names_by_model.get(related_model, ())
+        }
+        names_by_model.setdefault(model, []).append(name)
+
+    return dependencies
+
+
 class Command(BaseCommand):
     help = str(_('Synchronize the specified object with the Connectwise API'))
+    # The multiprocessing context of --parallel workers, or None for the
+    # platform's default start method.
+    mp_context = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -142,6 +205,12 @@ class Command(BaseCommand):
                  _('Time Entry'))
             )
 
+        if settings.get('inline_contact_communications', False):
+            # The contact sync persists contact communications itself.
+            synchronizers = tuple(
+                s for s in synchronizers if s[0] != 'contact_communication'
+            )
+
         self.synchronizer_map = OrderedDict()
         for name, synchronizer, obj_name in synchronizers:
             self.synchronizer_map[name] = (synchronizer, obj_name)
@@ -152,12 +221,34 @@ class Command(BaseCommand):
                             action='store_true',
                             dest='full',
                             default=False)
+        parser.add_argument('--parallel',
+                            type=int,
+                            dest='parallel',
+                            default=1,
+                            help='Number of worker processes to sync '
+                                 'independent objects in.')
+        parser.add_argument('--resume',
+                            action='store_true',
+                            dest='resume',
+                            default=False,
+                            help='Resume interrupted full syncs from their '
+                                 'last checkpoint. Implies --full.')
+        parser.add_argument('--sharded',
+                            action='store_true',
+                            dest='sharded',
+                            default=False,
+                            help='Split full syncs into shards that cwsync '
+                                 '--sharded workers on any host share. '
+                                 'Implies --full.')
 
-    def sync_by_class(self, sync_class, obj_name, full_option=False):
-        synchronizer = sync_class(full=full_option)
+    def sync_by_class(self, sync_class, obj_name, full_option=False,
+                      resume=False, sharded=False):
+        synchronizer = sync_class(full=full_option, resume=resume)
+        self.write_summary(
+            obj_name, run_sync(synchronizer, sharded), full_option)
 
-        created_count, updated_count, skipped_count, deleted_count = \
-            synchronizer.sync()
+    def write_summary(self, obj_name, counts, full_option=False):
+        created_count, updated_count, skipped_count, deleted_count = counts
 
         msg = _('{} Sync Summary - Created: {}, Updated: {}, Skipped: {}')
         fmt_msg = msg.format(obj_name, created_count, updated_count,
@@ -171,17 +262,88 @@ class Command(BaseCommand):
 
         self.stdout.write(fmt_msg)
 
+    def get_executor(self, workers):
+        # Forked workers must not share the parent's DB connections; each
+        # opens its own.
+        connections.close_all()
+        # Spawned workers start without the parent's settings, so they are
+        # passed along.
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=self.mp_context,
+                                   initializer=setup_worker,
+                                   initargs=worker_setup_args())
+
+    def sync_in_order(self, names, full_option, resume=False,
+                      sharded=False):
+        """
+        Sync the given objects one after another, yielding each object's
+        name and the API error it failed with, or None.
+        """
+        for name in names:
+            sync_class, obj_name = self.synchronizer_map[name]
+            # Bulk syncs give way to interactive requests made by other
+            # threads and processes sharing the rate limit.
+            try:
+                with default_lane(LANE_BACKGROUND):
+                    self.sync_by_class(sync_class, obj_name,
+                                       full_option=full_option,
+                                       resume=resume, sharded=sharded)
+            except api.ConnectWiseAPIError as e:
+                yield obj_name, e
+            else:
+                yield obj_name, None
+
+    def sync_in_parallel(self, names, full_option, workers, resume=False,
+                         sharded=False):
+        """
+        Sync the given objects across worker processes, starting each one
+        as soon as the objects it depends on have finished, whether they
+        succeeded or not. Yields like sync_in_order.
+        """
+        dependencies = synchronizer_dependencies(self.synchronizer_map)
+        pending = OrderedDict(
+            (name, dependencies[name] & set(names)) for name in names
+        )
+        running = {}
+
+        with self.get_executor(workers) as executor:
+            while pending or running:
+                for name in [n for n, deps in pending.items() if not deps]:
+                    del pending[name]
+                    sync_class, _obj_name = self.synchronizer_map[name]
+                    future = executor.submit(
+                        run_synchronizer, sync_class, full_option, resume,
+                        sharded)
+                    running[future] = name
+
+                done, _not_done = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    for deps in pending.values():
+                        deps.discard(name)
+
+                    _sync_class, obj_name = self.synchronizer_map[name]
+                    try:
+                        counts = future.result()
+                    except api.ConnectWiseAPIError as e:
+                        yield obj_name, e
+                    else:
+                        self.write_summary(obj_name, counts, full_option)
+                        yield obj_name, None
+
     def handle(self, *args, **options):
-        sync_classes = []
         connectwise_object_arg = options[OPTION_NAME]
-        full_option = options.get('full', False)
+        resume = options.get('resume', False)
+        sharded = options.get('sharded', False)
+        full_option = options.get('full', False) or resume or sharded
+        parallel = options.get('parallel') or 1
 
         if connectwise_object_arg:
             object_arg = connectwise_object_arg
             sync_tuple = self.synchronizer_map.get(object_arg)
 
             if sync_tuple:
-                sync_classes.append(sync_tuple)
+                names = [object_arg]
             else:
                 msg = _('Invalid CW object {}, '
                         'choose one of the following: \n{}')
@@ -189,24 +351,25 @@ class Command(BaseCommand):
                 msg = msg.format(sync_tuple, options_txt)
                 raise CommandError(msg)
         else:
-            sync_classes = self.synchronizer_map.values()
+            names = list(self.synchronizer_map.keys())
+
+        if parallel > 1 and len(names) > 1:
+            results = self.sync_in_parallel(
+                names, full_option, parallel, resume, sharded)
+        else:
+            results = self.sync_in_order(
+                names, full_option, resume, sharded)
 
         failed_classes = 0
         error_messages = ''
 
-        for sync_class, obj_name in sync_classes:
-            try:
-                self.sync_by_class(sync_class, obj_name,
-                                   full_option=full_option)
-            except ConnectWiseSecurityPermissionsException as e:
-                msg = 'Failed to sync {}: {}'.format(obj_name, e)
-                self.stderr.write(msg)
-                error_messages += '{}\n'.format(msg)
-
-            except api.ConnectWiseAPIError as e:
-                msg = 'Failed to sync {}: {}'.format(obj_name, e)
-                self.stderr.write(msg)
-                error_messages += '{}\n'.format(msg)
+        for obj_name, error in results:
+            if error is None:
+                continue
+            msg = 'Failed to sync {}: {}'.format(obj_name, error)
+            self.stderr.write(msg)
+            error_messages += '{}\n'.format(msg)
+            if not isinstance(error, ConnectWiseSecurityPermissionsException):
                 failed_classes += 1
 
         if failed_classes > 0:
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0204_alter_configurationtype_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agreement',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunity',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicenote',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='timeentry',
+            name='last_updated_utc',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
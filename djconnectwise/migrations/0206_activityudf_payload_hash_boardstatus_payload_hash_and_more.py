@@ -0,0 +1,58 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0205_activity_last_updated_utc_agreement_last_updated_utc_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activityudf',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='boardstatus',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='holiday',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='opportunityudf',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectudf',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='subtype',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticketudf',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='type',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
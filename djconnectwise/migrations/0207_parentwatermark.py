@@ -0,0 +1,26 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0206_activityudf_payload_hash_boardstatus_payload_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParentWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_name', models.CharField(max_length=100)),
+                ('parent_id', models.PositiveIntegerField()),
+                ('parent_last_updated', models.DateTimeField()),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('entity_name', 'parent_id')},
+            },
+        ),
+    ]
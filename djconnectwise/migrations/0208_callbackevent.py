@@ -0,0 +1,31 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0207_parentwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallbackEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('callback_type', models.CharField(max_length=20)),
+                ('entity_id', models.PositiveIntegerField()),
+                ('action', models.CharField(max_length=10)),
+                ('record_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('priority', models.PositiveSmallIntegerField(default=1)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['priority', 'received_at'], name='djconnectwi_priorit_6076bd_idx'), models.Index(fields=['callback_type', 'entity_id'], name='djconnectwi_callbac_5df180_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0208_callbackevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_name', models.CharField(max_length=100)),
+                ('synchronizer_class', models.CharField(blank=True, default='', max_length=100)),
+                ('watermark', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('entity_name', 'synchronizer_class')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0209_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagedRecordId',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prune_key', models.CharField(max_length=32)),
+                ('record_id', models.BigIntegerField()),
+                ('initial', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['prune_key', 'initial', 'record_id'], name='djconnectwi_prune_k_44222b_idx')],
+            },
+        ),
+    ]
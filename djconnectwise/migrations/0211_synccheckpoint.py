@@ -0,0 +1,33 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0210_stagedrecordid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_name', models.CharField(max_length=100)),
+                ('synchronizer_class', models.CharField(blank=True, default='', max_length=100)),
+                ('prune_key', models.CharField(max_length=32)),
+                ('batch_index', models.PositiveIntegerField(default=0)),
+                ('page', models.PositiveIntegerField(default=0)),
+                ('last_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('entity_name', 'synchronizer_class')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0211_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardedSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_name', models.CharField(max_length=100)),
+                ('synchronizer_class', models.CharField(blank=True, default='', max_length=100)),
+                ('prune_key', models.CharField(max_length=32)),
+                ('started_at', models.DateTimeField()),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('entity_name', 'synchronizer_class')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('spec', models.JSONField(blank=True, default=dict)),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=250)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('done', models.BooleanField(default=False)),
+                ('sharded_sync', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='djconnectwise.shardedsync')),
+            ],
+            options={
+                'unique_together': {('sharded_sync', 'index')},
+            },
+        ),
+    ]
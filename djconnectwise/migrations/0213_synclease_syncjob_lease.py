@@ -0,0 +1,38 @@
+# Generated by Django 6.0.7 on 2026-10-16 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djconnectwise', '0212_shardedsync_syncshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='lease_holder',
+            field=models.CharField(blank=True, max_length=250, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncjob',
+            name='lease_status',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.CreateModel(
+            name='SyncLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_name', models.CharField(max_length=100)),
+                ('synchronizer_class', models.CharField(blank=True, default='', max_length=100)),
+                ('holder', models.CharField(blank=True, default='', max_length=250)),
+                ('lease_expires', models.DateTimeField(blank=True, null=True)),
+                ('sync_job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='djconnectwise.syncjob')),
+            ],
+            options={
+                'unique_together': {('entity_name', 'synchronizer_class')},
+            },
+        ),
+    ]
@@ -5,7 +5,7 @@ import urllib
 
 from django.conf import settings
 from django.contrib.postgres.indexes import GinIndex
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
@@ -101,12 +101,315 @@ class SyncJob(models.Model):
     success = models.BooleanField(null=True)
     message = models.TextField(blank=True, null=True)
     sync_type = models.CharField(max_length=32, default='full')
+    # With the sync_lease_mode setting, whether the job held its
+    # synchronizer's lease, waited for it, skipped or joined a sharded sync,
+    # and the worker that held the lease.
+    lease_status = models.CharField(max_length=16, blank=True, null=True)
+    lease_holder = models.CharField(max_length=250, blank=True, null=True)
 
     def duration(self):
         if self.start_time and self.end_time:
             return self.end_time - self.start_time
 
 
+class ParentWatermark(models.Model):
+    """
+    The lastUpdated value a parent record had when the records of a child
+    entity were last synced for it, e.g. a ticket for its service notes.
+    """
+    entity_name = models.CharField(max_length=100)
+    parent_id = models.PositiveIntegerField()
+    parent_last_updated = models.DateTimeField()
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('entity_name', 'parent_id')
+
+
+class SyncWatermark(models.Model):
+    """
+    The time up to which a synchronizer's records are known to be synced,
+    so that its next partial sync need only fetch records updated since.
+    Advanced only when a sync succeeds.
+    """
+    entity_name = models.CharField(max_length=100)
+    synchronizer_class = models.CharField(max_length=100, blank=True,
+                                          default='')
+    watermark = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('entity_name', 'synchronizer_class')
+
+
+class StagedRecordId(models.Model):
+    """
+    A record ID staged by a full sync that prunes in the database: either
+    a record that existed locally when the sync began, or one the sync
+    received from ConnectWise. A sync's rows share its prune_key, and are
+    removed when it ends.
+    """
+    prune_key = models.CharField(max_length=32)
+    record_id = models.BigIntegerField()
+    initial = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prune_key', 'initial', 'record_id']),
+        ]
+
+
+class SyncCheckpoint(models.Model):
+    """
+    How far an unfinished full sync got, saved after each page so that
+    cwsync --resume can carry on from there. The IDs it has seen are
+    staged as StagedRecordId rows under prune_key.
+    """
+    entity_name = models.CharField(max_length=100)
+    synchronizer_class = models.CharField(max_length=100, blank=True,
+                                          default='')
+    prune_key = models.CharField(max_length=32)
+    # Batches completed, counting each pass over the pages of a batch
+    # condition; and the pages or, with keyset pagination, the last ID
+    # completed in the batch after those.
+    batch_index = models.PositiveIntegerField(default=0)
+    page = models.PositiveIntegerField(default=0)
+    last_id = models.BigIntegerField(blank=True, null=True)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('entity_name', 'synchronizer_class')
+
+
+class ShardedSync(models.Model):
+    """
+    A full sync split into SyncShards, which cwsync --sharded workers on
+    any host claim and fetch. The IDs it started with and the IDs the
+    shards synced are staged as StagedRecordId rows under prune_key, and
+    pruned by whichever worker finds every shard done. While one is
+    pruning, lease_expires holds off the others.
+    """
+    entity_name = models.CharField(max_length=100)
+    synchronizer_class = models.CharField(max_length=100, blank=True,
+                                          default='')
+    prune_key = models.CharField(max_length=32)
+    started_at = models.DateTimeField()
+    lease_expires = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('entity_name', 'synchronizer_class')
+
+
+class SyncShardManager(models.Manager):
+
+    def claim(self, sharded_sync, worker, lease_seconds):
+        """
+        Claim the first shard of the given sync that isn't done and whose
+        lease is free or has expired, and return it, or None if there is
+        no such shard. Rows are locked with SKIP LOCKED, so concurrent
+        workers never claim the same shard.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            shard = self.select_for_update(skip_locked=True).filter(
+                models.Q(lease_expires__isnull=True) |
+                models.Q(lease_expires__lt=now),
+                sharded_sync=sharded_sync,
+                done=False,
+            ).order_by('index').first()
+            if shard is None:
+                return None
+
+            shard.claimed_by = worker
+            shard.lease_expires = now + datetime.timedelta(
+                seconds=lease_seconds)
+            shard.attempts += 1
+            shard.save(
+                update_fields=['claimed_by', 'lease_expires', 'attempts'])
+        return shard
+
+
+class SyncShard(models.Model):
+    """
+    One partition of a ShardedSync, such as a batch of statuses, a range
+    of IDs or a range of parent IDs, described by spec. A worker holds it
+    until lease_expires, renewing the lease while it works; a shard whose
+    lease runs out is assumed abandoned and may be claimed again.
+    """
+    sharded_sync = models.ForeignKey(
+        'ShardedSync', on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveIntegerField()
+    spec = models.JSONField(default=dict, blank=True)
+    claimed_by = models.CharField(max_length=250, blank=True, default='')
+    lease_expires = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    done = models.BooleanField(default=False)
+
+    objects = SyncShardManager()
+
+    class Meta:
+        unique_together = ('sharded_sync', 'index')
+
+
+class SyncLease(models.Model):
+    """
+    The right to run a synchronizer, so that overlapping runs, such as a
+    scheduled sync and a manual one, don't sync the same records at once.
+    The holder renews lease_expires while it syncs; a lease that has
+    expired is free, in case its holder died.
+    """
+    entity_name = models.CharField(max_length=100)
+    synchronizer_class = models.CharField(max_length=100, blank=True,
+                                          default='')
+    holder = models.CharField(max_length=250, blank=True, default='')
+    lease_expires = models.DateTimeField(blank=True, null=True)
+    sync_job = models.ForeignKey(
+        'SyncJob', blank=True, null=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        unique_together = ('entity_name', 'synchronizer_class')
+
+
+class CallbackEventManager(models.Manager):
+
+    def claim(self, coalesce_seconds=0, claim_timeout=300, limit=1):
+        """
+        Claim every pending event of the entity that is next in line, and
+        of up to limit - 1 more due entities of the same callback type.
+        Return them grouped by entity, each entity's events in the order
+        they were received, or an empty list if no event is due yet.
+
+        An entity is next in line when its oldest pending event is older
+        than coalesce_seconds; ticket events go ahead of other types. Rows
+        are locked with SKIP LOCKED, so concurrent workers never claim the
+        same entity, and an entity whose events are still claimed by
+        another worker is skipped so its events are applied in order.
+        Claims older than claim_timeout seconds are assumed to belong to a
+        worker that died, and may be taken over.
+        """
+        now = timezone.now()
+        stale = now - datetime.timedelta(seconds=claim_timeout)
+        unclaimed = models.Q(claimed_at__isnull=True) | \
+            models.Q(claimed_at__lt=stale)
+
+        due = self.filter(unclaimed).filter(
+            received_at__lte=now - datetime.timedelta(
+                seconds=coalesce_seconds)
+        ).order_by('priority', 'received_at', 'id')
+
+        # Entities are looked at a bounded chunk at a time, so a long
+        # queue costs a few queries per chunk rather than per event.
+        chunk_size = max(limit * 2, 10)
+        while True:
+            callback_type = due.values_list(
+                'callback_type', flat=True).first()
+            if callback_type is None:
+                return []
+
+            claimed = []
+            claimed_count = 0
+            seen = []
+            type_due = due.filter(callback_type=callback_type)
+            while claimed_count < limit:
+                entity_ids = []
+                for entity_id in type_due.exclude(entity_id__in=seen) \
+                        .values_list('entity_id', flat=True)[:chunk_size]:
+                    if entity_id not in entity_ids:
+                        entity_ids.append(entity_id)
+                if not entity_ids:
+                    break
+                seen.extend(entity_ids)
+
+                for events in self._claim_entities(
+                        callback_type, entity_ids, unclaimed, stale, now,
+                        limit - claimed_count):
+                    claimed.extend(events)
+                    claimed_count += 1
+
+            if claimed:
+                return claimed
+            # Every due entity of this type is held by another worker.
+            due = due.exclude(callback_type=callback_type)
+
+    def _claim_entities(self, callback_type, entity_ids, unclaimed, stale,
+                        now, limit):
+        """
+        Claim the pending events of up to limit of the given entities, in
+        the given order, skipping those any of whose events another worker
+        holds. Return a list of each claimed entity's events.
+        """
+        with transaction.atomic():
+            busy = set(self.filter(
+                callback_type=callback_type,
+                entity_id__in=entity_ids,
+                claimed_at__gte=stale,
+            ).values_list('entity_id', flat=True))
+            pending = self.filter(
+                unclaimed,
+                callback_type=callback_type,
+                entity_id__in=[e for e in entity_ids if e not in busy],
+            )
+
+            locked = {}
+            for event in pending.select_for_update(skip_locked=True) \
+                    .order_by('received_at', 'id'):
+                locked.setdefault(event.entity_id, []).append(event)
+            pending_ids = {}
+            for event_id, entity_id in pending.values_list(
+                    'id', 'entity_id'):
+                pending_ids.setdefault(entity_id, set()).add(event_id)
+
+            claimed = []
+            for entity_id in entity_ids:
+                events = locked.get(entity_id)
+                if not events or \
+                        {e.id for e in events} != pending_ids[entity_id]:
+                    # Another worker holds some of these rows.
+                    continue
+                claimed.append(events)
+                if len(claimed) >= limit:
+                    break
+
+            self.filter(
+                id__in=[e.id for events in claimed for e in events]
+            ).update(claimed_at=now)
+        return claimed
+
+
+class CallbackEvent(models.Model):
+    """
+    A callback received from ConnectWise that is waiting to be applied by
+    the cwcallbackworker command.
+    """
+    HIGH_PRIORITY = 0
+    NORMAL_PRIORITY = 1
+
+    callback_type = models.CharField(max_length=20)
+    entity_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=10)
+    record_type = models.CharField(max_length=50, blank=True, null=True)
+    priority = models.PositiveSmallIntegerField(default=NORMAL_PRIORITY)
+    received_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    objects = CallbackEventManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['priority', 'received_at']),
+            models.Index(fields=['callback_type', 'entity_id']),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(
+            self.callback_type, self.entity_id, self.action)
+
+
 class AvailableConnectWiseBoardManager(models.Manager):
     """Return only active ConnectWise boards."""
     def get_queryset(self):
@@ -229,6 +532,7 @@ class BoardStatus(TimeStampedModel):
         max_length=20, choices=ESCALATION_STATUSES, db_index=True,
         blank=True, null=True
     )
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     objects = models.Manager()
     available_objects = AvailableBoardStatusManager()
@@ -375,6 +679,7 @@ class Company(TimeStampedModel):
         null=True,
         on_delete=models.SET_NULL
     )
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     objects = models.Manager()
     available_objects = AvailableCompanyManager()
@@ -532,6 +837,7 @@ class Contact(models.Model):
     company = models.ForeignKey(
         'Company', null=True, on_delete=models.CASCADE)
     type = models.ManyToManyField('ContactType')
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ('first_name', 'last_name')
@@ -720,6 +1026,7 @@ class Holiday(models.Model):
                                 )
     holiday_list = models.ForeignKey(
         'HolidayList', on_delete=models.CASCADE)
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     def __str__(self):
         return self.name
@@ -791,6 +1098,7 @@ class ScheduleEntry(models.Model):
         null=True,
         on_delete=models.SET_NULL
     )
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         verbose_name_plural = 'Schedule entries'
@@ -938,6 +1246,7 @@ class TimeEntry(UpdateRecordMixin, models.Model):
     notes = models.TextField(blank=True, null=True, max_length=50000)
     time_start = models.DateTimeField(blank=True, null=True)
     time_end = models.DateTimeField(blank=True, null=True)
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     detail_description_flag = models.BooleanField(default=False)
     internal_analysis_flag = models.BooleanField(default=False)
@@ -1344,6 +1653,7 @@ class Project(UpdateConnectWiseMixin, TimeStampedModel):
     team_members = models.ManyToManyField(
         'Member', through='ProjectTeamMember',
     )
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     objects = models.Manager()
     available_objects = AvailableProjectManager()
@@ -1491,6 +1801,7 @@ class Opportunity(UpdateConnectWiseMixin, TimeStampedModel):
                                          on_delete=models.SET_NULL)
     udf = models.JSONField(blank=True, null=True)
     udf_data = models.JSONField(default=dict, blank=True)
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ('name', )
@@ -1860,6 +2171,7 @@ class ServiceNote(UpdateRecordMixin, TimeStampedModel):
     ticket = models.ForeignKey('Ticket', on_delete=models.CASCADE)
     member = models.ForeignKey(
         'Member', blank=True, null=True, on_delete=models.SET_NULL)
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     objects = models.Manager()
     non_internal_objects = NonInternalNoteManager()
@@ -1985,6 +2297,7 @@ class Activity(UpdateConnectWiseMixin, TimeStampedModel):
         through='ScheduleEntry',
         related_name='member_activities'
     )
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         verbose_name_plural = 'activities'
@@ -2030,6 +2343,7 @@ class Type(TimeStampedModel):
     name = models.CharField(max_length=50)
     board = models.ForeignKey('ConnectWiseBoard', on_delete=models.CASCADE)
     inactive_flag = models.BooleanField(default=False)
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     class Meta:
         verbose_name = 'Type'
@@ -2043,6 +2357,7 @@ class SubType(TimeStampedModel):
     name = models.CharField(max_length=50)
     board = models.ForeignKey('ConnectWiseBoard', on_delete=models.CASCADE)
     inactive_flag = models.BooleanField(default=False)
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     class Meta:
         verbose_name = 'Subtype'
@@ -2056,6 +2371,7 @@ class Item(TimeStampedModel):
     name = models.CharField(max_length=50)
     board = models.ForeignKey('ConnectWiseBoard', on_delete=models.CASCADE)
     inactive_flag = models.BooleanField(default=False)
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     class Meta:
         verbose_name = 'Item'
@@ -2137,6 +2453,7 @@ class Agreement(TimeStampedModel):
         'WorkRole', null=True, on_delete=models.SET_NULL)
     company = models.ForeignKey(
         'Company', null=True, on_delete=models.SET_NULL)
+    last_updated_utc = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return '{}/{}'.format(self.agreement_type, self.name)
@@ -2168,6 +2485,7 @@ class BaseUDF(TimeStampedModel):
     entry_method = models.CharField(max_length=50, blank=True, null=True)
     number_of_decimals = \
         models.PositiveSmallIntegerField(blank=True, null=True)
+    payload_hash = models.CharField(max_length=40, blank=True, null=True)
 
     class Meta:
         abstract = True
@@ -0,0 +1,443 @@
+"""
+Throttling of the requests made to ConnectWise.
+
+Every API client in a process shares one RateLimiter per set of
+credentials: a token bucket that lets api_rate_limit requests through per
+second, with optional caps on the requests in flight per endpoint. When
+ConnectWise answers 429 or 503, the limiter holds every request back for
+the Retry-After period and halves its rate, then recovers it gradually as
+requests succeed.
+
+With the api_rate_limit_backend setting set to 'cache', the rate, the
+Retry-After holds and the count of interactive requests in flight are
+shared by every process through the Django cache, which may itself be
+backed by the database.
+
+Requests are made in one of two lanes. Interactive requests, such as
+writes made on a user's behalf and callback handling, may use the whole
+rate. Background requests, made by cwsync, leave api_interactive_reserve
+of the bucket to them, and give way to interactive requests in flight for
+up to api_background_max_delay seconds each.
+"""
+import asyncio
+import datetime
+import email.utils
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.core.cache import cache
+
+BACKEND_LOCAL = 'local'
+BACKEND_CACHE = 'cache'
+
+# Seconds to hold requests back after a throttled response that has no
+# Retry-After header.
+DEFAULT_RETRY_AFTER = 1.0
+# The rate never adapts below this fraction of the configured rate.
+MIN_RATE_FRACTION = 0.1
+# Fraction of the configured rate recovered with each successful request.
+RATE_RECOVERY_FRACTION = 0.05
+# How many one-second windows ahead the cache backend may reserve a slot.
+MAX_CACHE_WINDOWS = 60
+# Seconds a background request waits before checking again whether the
+# interactive requests it gave way to are done.
+BACKGROUND_POLL_INTERVAL = 0.05
+# Seconds an async request waits before trying again for an endpoint cap
+# that is full.
+SEMAPHORE_POLL_INTERVAL = 0.05
+# Seconds the cache backend keeps its count of interactive requests in
+# flight after it last changed, so that counts left by a process that died
+# don't hold background requests back for good.
+INTERACTIVE_PENDING_TIMEOUT = 300
+
+LANE_INTERACTIVE = 'interactive'
+LANE_BACKGROUND = 'background'
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_default_lane = LANE_INTERACTIVE
+
+
+def set_default_lane(lane):
+    """
+    Set the lane of the requests this process makes through clients that
+    don't set their own request_lane.
+    """
+    global _default_lane
+    _default_lane = lane
+
+
+def get_default_lane():
+    return _default_lane
+
+
+@contextmanager
+def default_lane(lane):
+    """Set the default lane until the block exits."""
+    previous = get_default_lane()
+    set_default_lane(lane)
+    try:
+        yield
+    finally:
+        set_default_lane(previous)
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds in the given Retry-After header, which is
+    either a number of seconds or an HTTP date, or None if it can't be
+    parsed.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max((retry_at - now).total_seconds(), 0.0)
+
+
+def get_rate_limiter(key, request_settings):
+    """
+    Return the rate limiter for the given key, creating it on first use.
+    As with pooled sessions, the process ID is part of the key.
+    """
+    endpoint_concurrency = request_settings.get(
+        'api_endpoint_concurrency') or {}
+    backend = request_settings.get('api_rate_limit_backend', BACKEND_LOCAL)
+    config = (
+        backend,
+        request_settings.get('api_rate_limit', 0),
+        request_settings.get('api_rate_limit_burst', 0),
+        tuple(sorted(endpoint_concurrency.items())),
+        request_settings.get('api_interactive_reserve', 0.2),
+        request_settings.get('api_background_max_delay', 5),
+    )
+    limiter_key = (os.getpid(),) + tuple(key) + config
+
+    with _limiters_lock:
+        limiter = _limiters.get(limiter_key)
+        if limiter is None:
+            limiter_class = CacheRateLimiter if backend == BACKEND_CACHE \
+                else RateLimiter
+            limiter = limiter_class(
+                rate=config[1],
+                burst=config[2],
+                endpoint_concurrency=endpoint_concurrency,
+                interactive_reserve=config[4],
+                background_max_delay=config[5],
+                cache_key='djconnectwise_rate_limit:{}'.format(
+                    ':'.join(str(k) for k in key)),
+            )
+            _limiters[limiter_key] = limiter
+    return limiter
+
+
+def clear_rate_limiters():
+    """Forget every rate limiter of this process."""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+class RateLimiter:
+    """
+    A token bucket refilled at rate tokens per second, holding up to burst
+    tokens. A rate of zero lets requests through without limit, though
+    Retry-After holds and endpoint caps still apply.
+    """
+
+    def __init__(self, rate=0, burst=0, endpoint_concurrency=None,
+                 interactive_reserve=0.0, background_max_delay=0,
+                 cache_key=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.interactive_reserve = interactive_reserve
+        self.background_max_delay = background_max_delay
+        self.interactive_pending = 0
+        self.lock = threading.Lock()
+        self.cache_key = cache_key
+        self.endpoint_semaphores = {
+            prefix.strip('/'): threading.BoundedSemaphore(limit)
+            for prefix, limit in (endpoint_concurrency or {}).items()
+        }
+
+    def reserve(self):
+        """
+        Take a token, and return the number of seconds to wait before
+        making the request it pays for.
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.rate:
+                self._refill(now)
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def reserve_background(self, yield_to_interactive=True):
+        """
+        Take a token for a background request if one can be spared, and
+        return 0, or else return the number of seconds to wait before
+        asking again. A token can be spared while no interactive request is
+        in flight and the bucket holds more than its interactive reserve.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return self.blocked_until - now
+            if yield_to_interactive and self._interactive_in_flight():
+                return BACKGROUND_POLL_INTERVAL
+            if not self.rate:
+                return 0.0
+
+            self._refill(now)
+            spare = self.tokens - self.burst * self.interactive_reserve
+            if spare >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - spare) / self.rate
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.burst,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self, lane=LANE_INTERACTIVE):
+        for wait in self._waits(lane):
+            time.sleep(wait)
+
+    async def acquire_async(self, lane=LANE_INTERACTIVE):
+        for wait in self._waits(lane):
+            await asyncio.sleep(wait)
+
+    def _waits(self, lane):
+        """
+        Yield the waits before a request in the given lane may be made.
+        A background request that has given way for background_max_delay
+        seconds takes its token like an interactive one, so it can't be
+        starved.
+        """
+        if lane == LANE_BACKGROUND:
+            deadline = time.monotonic() + self.background_max_delay
+            while time.monotonic() < deadline:
+                wait = self.reserve_background()
+                if not wait:
+                    return
+                yield min(wait, max(deadline - time.monotonic(), 0.0))
+
+        wait = self.reserve()
+        if wait > 0:
+            yield wait
+
+    def _interactive_started(self):
+        with self.lock:
+            self.interactive_pending += 1
+
+    def _interactive_finished(self):
+        with self.lock:
+            self.interactive_pending -= 1
+
+    def _interactive_in_flight(self):
+        return self.interactive_pending > 0
+
+    def get_semaphore(self, endpoint):
+        """
+        Return the semaphore capping the requests in flight to the given
+        endpoint, matched by its longest configured prefix, if any.
+        """
+        endpoint = (endpoint or '').strip('/')
+        matches = [
+            prefix for prefix in self.endpoint_semaphores
+            if endpoint == prefix or endpoint.startswith(prefix + '/')
+        ]
+        if matches:
+            return self.endpoint_semaphores[max(matches, key=len)]
+        return None
+
+    @contextmanager
+    def slot(self, endpoint=None, lane=LANE_INTERACTIVE):
+        """
+        Wait for a request to the given endpoint, in the given lane, to be
+        allowed.
+        """
+        interactive = lane != LANE_BACKGROUND
+        if interactive:
+            self._interactive_started()
+
+        semaphore = self.get_semaphore(endpoint)
+        try:
+            if semaphore:
+                semaphore.acquire()
+            try:
+                self.acquire(lane)
+                yield
+            finally:
+                if semaphore:
+                    semaphore.release()
+        finally:
+            if interactive:
+                self._interactive_finished()
+
+    @asynccontextmanager
+    async def slot_async(self, endpoint=None, lane=LANE_INTERACTIVE):
+        """
+        Wait for a request to be allowed as slot() does, without blocking
+        the event loop. The endpoint caps are thread semaphores shared with
+        slot(), so a full one is polled rather than waited on.
+        """
+        interactive = lane != LANE_BACKGROUND
+        if interactive:
+            self._interactive_started()
+
+        semaphore = self.get_semaphore(endpoint)
+        try:
+            if semaphore:
+                while not semaphore.acquire(blocking=False):
+                    await asyncio.sleep(SEMAPHORE_POLL_INTERVAL)
+            try:
+                await self.acquire_async(lane)
+                yield
+            finally:
+                if semaphore:
+                    semaphore.release()
+        finally:
+            if interactive:
+                self._interactive_finished()
+
+    def throttled(self, retry_after=None):
+        """
+        Hold every request back after ConnectWise throttled one, and
+        halve the rate.
+        """
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+        with self.lock:
+            self.blocked_until = max(
+                self.blocked_until, time.monotonic() + retry_after)
+            if self.max_rate:
+                self.rate = max(self.rate / 2,
+                                self.max_rate * MIN_RATE_FRACTION)
+                self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        """Recover some of the rate given up to throttling."""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(
+                    self.max_rate,
+                    self.rate + self.max_rate * RATE_RECOVERY_FRACTION
+                )
+
+
+class CacheRateLimiter(RateLimiter):
+    """
+    A rate limiter shared between processes through the Django cache.
+    Requests are counted in one-second windows rather than in a bucket,
+    since the cache can only increment counters atomically.
+    """
+
+    def reserve(self):
+        now = time.time()
+        blocked_until = cache.get(self.blocked_key) or 0.0
+        wait = max(blocked_until - now, 0.0)
+        if not self.rate:
+            return wait
+
+        window = int(now + wait)
+        for window in range(window, window + MAX_CACHE_WINDOWS):
+            if self._count(window) <= max(int(self.rate), 1):
+                break
+        return max(wait, window - now)
+
+    def reserve_background(self, yield_to_interactive=True):
+        now = time.time()
+        blocked_until = cache.get(self.blocked_key) or 0.0
+        if blocked_until > now:
+            return blocked_until - now
+        if yield_to_interactive and self._interactive_in_flight():
+            return BACKGROUND_POLL_INTERVAL
+        if not self.rate:
+            return 0.0
+
+        window = int(now)
+        limit = max(int(self.rate * (1 - self.interactive_reserve)), 1)
+        key = '{}:{}'.format(self.cache_key, window)
+        if (cache.get(key) or 0) < limit:
+            self._count(window)
+            return 0.0
+        return window + 1 - now
+
+    def _count(self, window):
+        """
+        Count a request in the given one-second window, and return the
+        number counted so far.
+        """
+        key = '{}:{}'.format(self.cache_key, window)
+        cache.add(key, 0, timeout=MAX_CACHE_WINDOWS + 1)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The counter expired between add and incr.
+            cache.add(key, 1, timeout=MAX_CACHE_WINDOWS + 1)
+            return 1
+
+    def _interactive_started(self):
+        super()._interactive_started()
+        cache.add(self.pending_key, 0, timeout=INTERACTIVE_PENDING_TIMEOUT)
+        try:
+            cache.incr(self.pending_key)
+        except ValueError:
+            # The counter expired between add and incr.
+            cache.add(self.pending_key, 1,
+                      timeout=INTERACTIVE_PENDING_TIMEOUT)
+        else:
+            # incr() keeps the old expiry, which would drop the count of
+            # requests still in flight.
+            cache.touch(self.pending_key, INTERACTIVE_PENDING_TIMEOUT)
+
+    def _interactive_finished(self):
+        super()._interactive_finished()
+        try:
+            cache.decr(self.pending_key)
+        except ValueError:
+            # The counter expired, and this request's count with it.
+            pass
+        else:
+            cache.touch(self.pending_key, INTERACTIVE_PENDING_TIMEOUT)
+
+    def _interactive_in_flight(self):
+        return (cache.get(self.pending_key) or 0) > 0
+
+    def throttled(self, retry_after=None):
+        super().throttled(retry_after)
+        if retry_after is None:
+            retry_after = DEFAULT_RETRY_AFTER
+        blocked_until = time.time() + retry_after
+        if blocked_until > (cache.get(self.blocked_key) or 0.0):
+            cache.set(self.blocked_key, blocked_until,
+                      timeout=int(retry_after) + 1)
+
+    @property
+    def blocked_key(self):
+        return '{}:blocked_until'.format(self.cache_key)
+
+    @property
+    def pending_key(self):
+        return '{}:interactive_pending'.format(self.cache_key)
@@ -1,19 +1,29 @@
 import datetime
+import json
 import logging
 import math
 import os
+import socket
+import threading
+import time
 import urllib.parse
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from copy import deepcopy
 from decimal import Decimal
+from functools import partial
 from retrying import retry
 
 from botocore.exceptions import NoCredentialsError
 from dateutil.parser import parse
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, FieldDoesNotExist
 from django.core.files.storage import default_storage
-from django.db import transaction, IntegrityError, DatabaseError
-from django.db.models import Q
+from django.db import transaction, IntegrityError, DatabaseError, \
+    connection, connections
+from django.db.models import Count, Exists, OuterRef, Q
 from django.utils import timezone
 from django.utils.text import normalize_newlines
 from djconnectwise import api
@@ -33,6 +43,27 @@ SKIPPED = 3
 FILE_UMASK = 0o022
 
 MAX_POSITIVE_SMALL_INT = 32767
+
+# Where a sync watermark comes from: the local time the sync started, the
+# Date header of ConnectWise's first response, or the greatest
+# _info.lastUpdated among the records synced.
+WATERMARK_LOCAL = 'local'
+WATERMARK_SERVER_DATE = 'server_date'
+WATERMARK_LAST_UPDATED = 'last_updated'
+
+# What a sync does when another run holds its synchronizer's lease: wait
+# for it, skip the sync, or help with the sharded sync in progress.
+LEASE_WAIT = 'wait'
+LEASE_SKIP = 'skip'
+LEASE_JOIN = 'join'
+
+# The lease_status of a sync job.
+LEASE_ACQUIRED = 'acquired'
+LEASE_WAITING = 'waiting'
+LEASE_SKIPPED = 'skipped'
+LEASE_JOINED = 'joined'
+# Seconds between attempts to take a lease held by another run.
+LEASE_POLL_INTERVAL = 5
 # See https://docs.djangoproject.com/en/dev/ref/models/fields
 # /#positivesmallintegerfield
 
@@ -48,6 +79,15 @@ class InvalidObjectException(Exception):
     pass
 
 
+class LeaseLost(Exception):
+    """
+    Raised when a lease the sync holds could not be renewed, e.g. because
+    another worker took over its shard after it expired, so that the sync
+    stops rather than doing the same work as its new holder.
+    """
+    pass
+
+
 def log_sync_job(f):
     def wrapper(*args, **kwargs):
         sync_instance = args[0]
@@ -64,6 +104,8 @@ def log_sync_job(f):
             sync_job.sync_type = 'partial'
 
         sync_job.save()
+        # So the sync can record its lease state on the job.
+        sync_instance.sync_job = sync_job
 
         try:
             created_count, updated_count, skipped_count, deleted_count = \
@@ -85,6 +127,23 @@ def log_sync_job(f):
     return wrapper
 
 
+def sync_lease(f):
+    """
+    Run the decorated sync under its synchronizer's lease, with the
+    sync_lease_mode setting.
+    """
+    def wrapper(*args, **kwargs):
+        sync_instance = args[0]
+        if not sync_instance.lease_mode:
+            return f(*args, **kwargs)
+        return sync_instance.run_leased(partial(f, *args, **kwargs))
+    return wrapper
+
+
+def get_worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
 class SyncResults:
     """Track results of a sync job."""
     def __init__(self):
@@ -93,20 +152,117 @@ class SyncResults:
         self.skipped_count = 0
         self.deleted_count = 0
         self.synced_ids = set()
+        # The greatest _info.lastUpdated seen, if tracked.
+        self.last_updated = None
+
+
+class StagedIds:
+    """
+    Stands in for SyncResults.synced_ids when a full sync prunes in the
+    database, writing the IDs to the StagedRecordId table in batches
+    rather than holding them all in memory.
+    """
+    def __init__(self, prune_key, batch_size):
+        self.prune_key = prune_key
+        self.batch_size = batch_size
+        self.pending = set()
+
+    def add(self, record_id):
+        self.pending.add(record_id)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def update(self, record_ids):
+        for record_id in record_ids:
+            self.add(record_id)
+
+    def flush(self):
+        models.StagedRecordId.objects.bulk_create([
+            models.StagedRecordId(prune_key=self.prune_key,
+                                  record_id=record_id)
+            for record_id in self.pending
+        ], batch_size=self.batch_size)
+        self.pending.clear()
 
 
 class Synchronizer:
     lookup_key = 'id'
     bulk_prune = True
+    # Whether the endpoint can be paged by ID with the keyset_pagination
+    # setting, rather than by page number.
+    keyset_pagination_support = False
+    # Whether pages can be written with bulk queries under the bulk_persist
+    # setting. Synchronizers that save more than the instance's own columns
+    # (M2M fields, avatars) must persist record by record.
+    bulk_persist_support = True
+    # The model field that stores the record's _info.lastUpdated value, if
+    # any. Records whose stored value matches are skipped under the
+    # skip_unchanged_records setting without being transformed.
+    last_updated_field = None
+    # The model field that stores a hash of the record's API payload, for
+    # entities that have no usable lastUpdated. It is compared the same way.
+    payload_hash_field = None
+    # Top-level payload keys left out of the payload hash.
+    payload_hash_exclude = ('_info',)
+    # Whether a sharded full sync can split the records into partitions,
+    # here ranges of IDs. Otherwise the whole sync is one shard, so that
+    # only one worker runs it.
+    shard_support = False
+    # Whether a full sync can save its progress to resume from, under the
+    # sync_checkpoints setting. Checkpoints are saved by fetch_records(), so
+    # synchronizers that fetch their records some other way sync without.
+    checkpoint_support = True
+    # Filled by get_api_conditions() on first use, so that building a
+    # synchronizer, e.g. for a callback, doesn't run queries for conditions
+    # it may replace or never use.
+    _api_conditions = None
+    # Set by hold_lease() when the lease it holds can't be renewed.
+    _lease_lost = None
 
     def __init__(self, full=False, *args, **kwargs):
-        self.api_conditions = []
         self.partial_sync_support = True
         self.client = self.client_class()
         request_settings = DjconnectwiseSettings().get_settings()
         self.batch_size = request_settings['batch_size']
         self.mass_delete_protection = request_settings.get(
             'mass_delete_protection', True)
+        self.prefetch_pages = request_settings.get('prefetch_pages', 0)
+        self.page_fanout_workers = request_settings.get(
+            'page_fanout_workers', 0)
+        self.child_fetch_workers = request_settings.get(
+            'child_fetch_workers', 0)
+        self.related_sync_workers = request_settings.get(
+            'related_sync_workers', 0)
+        self.related_sync_timeout = request_settings.get(
+            'related_sync_timeout', 60)
+        self.parent_watermarks = request_settings.get(
+            'parent_watermarks', False)
+        self.sync_watermarks = request_settings.get(
+            'sync_watermarks', False)
+        self.prune_in_database = request_settings.get(
+            'prune_in_database', False)
+        self.prune_batch_size = request_settings.get(
+            'prune_batch_size', 1000)
+        self.resume = kwargs.pop('resume', False)
+        self.checkpoints = self.resume or request_settings.get(
+            'sync_checkpoints', False)
+        self.checkpoint = None
+        self._batch_index = 0
+        self.sync_shards = request_settings.get('sync_shards', 8)
+        self.shard_lease_seconds = request_settings.get(
+            'sync_shard_lease', 600)
+        self.lease_mode = request_settings.get('sync_lease_mode', '')
+        self.lease_seconds = request_settings.get('sync_lease_seconds', 300)
+        self.lease_wait = request_settings.get('sync_lease_wait', 3600)
+        self.sync_job = None
+        self.watermark_source = request_settings.get(
+            'sync_watermark_source', WATERMARK_LOCAL)
+        self.keyset_pagination = self.keyset_pagination_support and \
+            request_settings.get('keyset_pagination', False)
+        self.bulk_persist = self.bulk_persist_support and \
+            request_settings.get('bulk_persist', False)
+        self.skip_unchanged_records = bool(self._change_marker_field) and \
+            request_settings.get('skip_unchanged_records', False)
         self.full = full
 
         self.pre_delete_callback = kwargs.pop('pre_delete_callback', None)
@@ -120,6 +276,20 @@ class Synchronizer:
         # by the number of distinct PKs actually referenced, not by table size.
         self._related_pk_cache = {}
 
+    @property
+    def api_conditions(self):
+        if self._api_conditions is None:
+            self._api_conditions = self.get_api_conditions()
+        return self._api_conditions
+
+    @api_conditions.setter
+    def api_conditions(self, value):
+        self._api_conditions = value
+
+    def get_api_conditions(self):
+        """Return the conditions that records are fetched with."""
+        return []
+
     def set_relations(self, instance, json_data):
         for json_field, value in self.related_meta.items():
             model_class, field_name = value
@@ -161,6 +331,50 @@ class Synchronizer:
             cache[uid] = model_class.objects.filter(pk=uid).exists()
         return cache[uid]
 
+    def preload_related(self, records):
+        """
+        Fill the related PK memo for every relation in related_meta that the
+        given page of records refers to, with one query per related model,
+        so that assigning the relations record by record costs no queries.
+        """
+        related_meta = getattr(self, 'related_meta', None)
+        if not related_meta:
+            return
+
+        uids_by_model = {}
+        for json_field, (model_class, model_field) in related_meta.items():
+            try:
+                target_field = self.model_class._meta.get_field(
+                    model_field).target_field
+            except (FieldDoesNotExist, AttributeError):
+                # Not a foreign key on this model; set_relations will have
+                # its say.
+                continue
+            cache = self._related_pk_cache.setdefault(model_class, {})
+            uids = uids_by_model.setdefault(model_class, set())
+            for record in records:
+                relation_json = record.get(json_field)
+                if not isinstance(relation_json, dict) or \
+                        relation_json.get('id') is None:
+                    continue
+                try:
+                    uid = target_field.get_prep_value(relation_json['id'])
+                except (TypeError, ValueError):
+                    continue
+                if uid not in cache:
+                    uids.add(uid)
+
+        for model_class, uids in uids_by_model.items():
+            if not uids:
+                continue
+            cache = self._related_pk_cache[model_class]
+            existing = set(
+                model_class.objects.filter(pk__in=uids).values_list(
+                    'pk', flat=True)
+            )
+            for uid in uids:
+                cache[uid] = uid in existing
+
     def _assign_relation(self, instance, json_data,
                          json_field, model_class, model_field):
         """
@@ -204,6 +418,9 @@ class Synchronizer:
             field.delete_cached_value(instance)
 
     def _instance_ids(self, filter_params=None):
+        return set(self._instance_id_qset(filter_params))
+
+    def _instance_id_qset(self, filter_params=None):
         if not filter_params:
             ids = self.model_class.objects.all().order_by(self.lookup_key)\
                 .values_list(self.lookup_key, flat=True)
@@ -211,7 +428,7 @@ class Synchronizer:
             ids = self.model_class.objects.filter(filter_params)\
                 .order_by(self.lookup_key)\
                 .values_list(self.lookup_key, flat=True)
-        return set(ids)
+        return ids
 
     def get(self, results, conditions=None):
         return self.fetch_records(results, conditions)
@@ -224,27 +441,226 @@ class Synchronizer:
         while fetching pages of records. If it's omitted, then use
         self.api_conditions.
         """
-        page = 1
+        page_conditions = conditions or self.api_conditions
+        if self.checkpoint:
+            return self._fetch_records_checkpointed(results, page_conditions)
+
+        for page_records in self.iter_pages(page_conditions):
+            self.persist_page(page_records, results)
+        return results
+
+    def _fetch_records_checkpointed(self, results, conditions):
+        """
+        Fetch records as fetch_records does, saving the checkpoint as it
+        goes. Each call is a batch of the sync: batches the checkpoint has
+        already completed are skipped.
+
+        With keyset pagination, the checkpoint is saved after each page, and
+        the batch it stopped in picks up after the last ID it saved. Page
+        numbers can't be resumed from, since records deleted in the meantime
+        shift later records onto earlier pages, so without it the checkpoint
+        is only saved after each batch, and that batch starts over.
+
+        Pages are fetched in order, one after another or with prefetching,
+        since fanned-out pages can't be checkpointed by a single position.
+        """
+        checkpoint = self.checkpoint
+        batch_index = self._batch_index
+        self._batch_index += 1
+        if batch_index < checkpoint.batch_index:
+            return results
+
+        if self.keyset_pagination:
+            pages = self._iter_pages_keyset(
+                conditions, after_id=checkpoint.last_id)
+        else:
+            pages = self._iter_pages_sequential(conditions)
+
+        for page_records in pages:
+            self.persist_page(page_records, results)
+            if self.keyset_pagination:
+                checkpoint.page += 1
+                if page_records:
+                    checkpoint.last_id = page_records[-1]['id']
+                self.save_checkpoint(results)
+
+        checkpoint.batch_index += 1
+        checkpoint.page = 0
+        checkpoint.last_id = None
+        self.save_checkpoint(results)
+        return results
+
+    def fetch_page(self, page, conditions, **kwargs):
+        logger.info(
+            'Fetching {} records, batch {}'.format(
+                self.model_class.__bases__[0].__name__, page)
+        )
+        return self.get_page(
+            page=page, page_size=self.batch_size,
+            conditions=conditions, **kwargs
+        )
+
+    def get_count(self, conditions, **kwargs):
+        """
+        Return the number of records matching the given conditions, or None
+        if the endpoint has no count counterpart.
+        """
+        return None
+
+    def iter_pages(self, conditions, **kwargs):
+        """
+        Yield each page of records, up to and including the first page that
+        isn't full.
+
+        With the page_fanout_workers setting above zero and a count endpoint
+        available, every page is requested up front through that many
+        threads, and pages are yielded in the order they arrive.
+
+        Otherwise, with the prefetch_pages setting above zero, up to that
+        many of the following pages are requested on background threads
+        while the caller persists the current one, so the API and the DB are
+        busy at the same time. The last of those requests usually comes back
+        empty, since we can't know a page is the last one until it arrives.
+
+        Synchronizers using keyset pagination fetch one page at a time, since
+        each page starts after the last ID of the one before it.
+        """
+        if self.keyset_pagination:
+            yield from self._iter_pages_keyset(conditions, **kwargs)
+            return
+
+        if self.page_fanout_workers:
+            count = self.get_count(conditions, **kwargs)
+            if count is not None:
+                yield from self._iter_pages_fanout(count, conditions, **kwargs)
+                return
+
+        yield from self._iter_pages_sequential(conditions, **kwargs)
+
+    def _iter_pages_fanout(self, count, conditions, **kwargs):
+        page_count = math.ceil(count / self.batch_size)
+        logger.info(
+            'Fetching {} {} records in {} pages'.format(
+                count, self.model_class.__bases__[0].__name__, page_count)
+        )
+        executor = ThreadPoolExecutor(max_workers=self.page_fanout_workers)
+        # Keep a bounded number of pages requested but not yet persisted, so
+        # a slow DB doesn't leave every page of the sync sitting in memory.
+        max_pending = self.page_fanout_workers * 2
+        pending = {}
+        pages = iter(range(1, page_count + 1))
+        last_page_full = False
+        try:
+            while True:
+                for page in pages:
+                    future = executor.submit(
+                        self._fetch_page_in_thread, page, conditions, **kwargs
+                    )
+                    pending[future] = page
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    page_records = future.result()
+                    if page == page_count:
+                        last_page_full = len(page_records) >= self.batch_size
+                    yield page_records
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if not page_count or last_page_full:
+            # Records were added after we counted them, so walk on from the
+            # last counted page the usual way.
+            yield from self._iter_pages_sequential(
+                conditions, first_page=page_count + 1, **kwargs
+            )
+
+    def _iter_pages_keyset(self, conditions, after_id=None, **kwargs):
+        """
+        Page through records in ID order, asking each time for the first
+        page of records after the last ID seen. Unlike page numbers, this
+        costs the same at any depth, and records changing mid-sync can't
+        shift others across page boundaries.
+        """
+        # Parenthesize, so an 'or' in a batch condition can't swallow the
+        # ID condition.
+        base_conditions = ['({})'.format(c) for c in conditions or []]
+        page_conditions = base_conditions
+        last_id = after_id
+        if last_id is not None:
+            page_conditions = base_conditions + ['id>{}'.format(last_id)]
         while True:
             logger.info(
-                'Fetching {} records, batch {}'.format(
-                    self.model_class.__bases__[0].__name__, page)
+                'Fetching {} records after id {}'.format(
+                    self.model_class.__bases__[0].__name__, last_id)
             )
-            page_conditions = conditions or self.api_conditions
             page_records = self.get_page(
-                page=page, page_size=self.batch_size,
-                conditions=page_conditions,
+                page=1, page_size=self.batch_size,
+                conditions=page_conditions, order_by='id asc', **kwargs
             )
-            self.persist_page(page_records, results)
-            page += 1
+            yield page_records
             if len(page_records) < self.batch_size:
-                # This page wasn't full, so there's no more records after
-                # this page.
-                break
-        return results
+                return
+            last_id = page_records[-1]['id']
+            page_conditions = base_conditions + ['id>{}'.format(last_id)]
+
+    def _iter_pages_sequential(self, conditions, first_page=1, **kwargs):
+        if not self.prefetch_pages:
+            page = first_page
+            while True:
+                page_records = self.fetch_page(page, conditions, **kwargs)
+                yield page_records
+                if len(page_records) < self.batch_size:
+                    # This page wasn't full, so there's no more records after
+                    # this page.
+                    return
+                page += 1
+
+        executor = ThreadPoolExecutor(max_workers=self.prefetch_pages)
+        in_flight = deque()
+        next_page = first_page
+        try:
+            while True:
+                while len(in_flight) <= self.prefetch_pages:
+                    in_flight.append(executor.submit(
+                        self._fetch_page_in_thread, next_page, conditions,
+                        **kwargs
+                    ))
+                    next_page += 1
+                page_records = in_flight.popleft().result()
+                yield page_records
+                if len(page_records) < self.batch_size:
+                    return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch_page_in_thread(self, page, conditions, **kwargs):
+        try:
+            return self.fetch_page(page, conditions, **kwargs)
+        finally:
+            # Don't leak any DB connection get_page opened on this thread.
+            connections.close_all()
 
     def persist_page(self, records, results):
         """Persist one page of records to DB."""
+        self.check_lease()
+        if self.sync_watermarks and \
+                self.watermark_source == WATERMARK_LAST_UPDATED:
+            self.track_last_updated(records, results)
+        if self.skip_unchanged_records:
+            records = self.exclude_unchanged(records, results)
+        self.preload_related(records)
+
+        if self.bulk_persist:
+            return self.bulk_persist_page(records, results)
+        return self.persist_records(records, results)
+
+    def persist_records(self, records, results):
+        """Persist the given records to DB one at a time."""
         for record in records:
             try:
                 with transaction.atomic():
@@ -262,6 +678,204 @@ class Synchronizer:
 
         return results
 
+    def track_last_updated(self, records, results):
+        for record in records:
+            last_updated = self._parse_last_updated(record)
+            if last_updated and (results.last_updated is None or
+                                 last_updated > results.last_updated):
+                results.last_updated = last_updated
+
+    @staticmethod
+    def _parse_last_updated(record):
+        info = record.get('_info') or {}
+        last_updated = info.get('lastUpdated')
+        try:
+            return parse(last_updated) if last_updated else None
+        except (ValueError, OverflowError):
+            return None
+
+    def _payload_hash(self, record):
+        record = self.remove_null_characters(record)
+        payload = {k: v for k, v in record.items()
+                   if k not in self.payload_hash_exclude}
+        return get_hash(
+            json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        )
+
+    @property
+    def _change_marker_field(self):
+        return self.last_updated_field or self.payload_hash_field
+
+    def _change_marker(self, record):
+        if self.last_updated_field:
+            return self._parse_last_updated(record)
+        return self._payload_hash(record)
+
+    def _assign_change_markers(self, instance, record):
+        if self.last_updated_field:
+            setattr(instance, self.last_updated_field,
+                    self._parse_last_updated(record))
+        if self.payload_hash_field:
+            setattr(instance, self.payload_hash_field,
+                    self._payload_hash(record))
+
+    def exclude_unchanged(self, records, results):
+        """
+        Return the records whose _info.lastUpdated, or payload hash, differs
+        from the value stored on their row, with one query for the whole
+        page. The others are counted as skipped and marked as synced, so they
+        aren't pruned.
+
+        A record is still returned if its row has a foreign key left null
+        because the related row didn't exist yet, so it gets another chance
+        to be assigned.
+        """
+        relation_ids = {
+            r[self.lookup_key]: self.get_relation_ids(r) for r in records
+        }
+        relation_fields = sorted(
+            {field for ids in relation_ids.values() for field in ids}
+        )
+        stored = {
+            row['pk']: row for row in self.model_class.objects.filter(
+                pk__in=list(relation_ids)
+            ).values('pk', self._change_marker_field, *relation_fields)
+        }
+
+        changed = []
+        for record in records:
+            row = stored.get(record[self.lookup_key])
+            marker = row[self._change_marker_field] if row else None
+            unresolved = row and any(
+                uid is not None and row[field] is None
+                for field, uid in relation_ids[record[self.lookup_key]].items()
+            )
+            if marker is not None and not unresolved and \
+                    marker == self._change_marker(record):
+                results.skipped_count += 1
+                results.synced_ids.add(record['id'])
+            else:
+                changed.append(record)
+        return changed
+
+    def get_relation_ids(self, record):
+        """
+        Return the IDs of the related rows the given record refers to, keyed
+        by the column of the foreign key they are assigned to, for the
+        relations in related_meta. Synchronizers that assign other foreign
+        keys by hand add them, so exclude_unchanged can tell the ones left
+        null for a missing row.
+        """
+        relation_ids = {}
+        for json_field, (_, model_field) in \
+                (getattr(self, 'related_meta', None) or {}).items():
+            try:
+                field = self.model_class._meta.get_field(model_field)
+            except FieldDoesNotExist:
+                continue
+            relation_json = record.get(json_field)
+            if field.many_to_one and isinstance(relation_json, dict):
+                relation_ids[field.attname] = relation_json.get('id')
+        return relation_ids
+
+    def bulk_persist_page(self, records, results):
+        """
+        Persist one page of records to DB with one query to load the
+        existing rows, one bulk_create and one bulk_update.
+
+        A record that can't be assigned is logged and left out, like in the
+        record-by-record path. If the bulk write itself fails, the page is
+        persisted again with persist_records(), so one bad row can't sink the
+        rest.
+        Like any bulk query, this doesn't call save() or send model signals.
+        """
+        records = [self.remove_null_characters(r) for r in records]
+        existing = self.model_class.objects.in_bulk(
+            [r[self.lookup_key] for r in records]
+        )
+
+        to_create = []
+        to_update = []
+        update_fields = set()
+        skipped_count = 0
+        synced_ids = set()
+        for record in records:
+            synced_ids.add(record['id'])
+            instance = existing.get(record[self.lookup_key])
+            created = instance is None
+            if created:
+                instance = self.model_class()
+
+            try:
+                self._assign_field_data(instance, record)
+                self._assign_change_markers(instance, record)
+            except AttributeError as e:
+                logger.warning(
+                    "AttributeError while attempting to sync object {}."
+                    " Error: {}".format(self.model_class, e)
+                )
+                continue
+            except InvalidObjectException as e:
+                logger.warning('{}'.format(e))
+                continue
+
+            if not self._is_instance_valid(instance):
+                skipped_count += 1
+            elif created:
+                to_create.append(instance)
+            elif self._is_instance_changed(instance):
+                to_update.append(instance)
+                update_fields.update(instance.tracker.changed())
+            else:
+                skipped_count += 1
+
+        update_fields = self._bulk_update_fields(to_update, update_fields)
+        try:
+            with transaction.atomic():
+                if to_create:
+                    self.model_class.objects.bulk_create(to_create)
+                if to_update:
+                    self.model_class.objects.bulk_update(
+                        to_update, update_fields)
+        except (IntegrityError, DatabaseError, ValueError) as e:
+            logger.warning(
+                'Bulk write of {} records failed, persisting them one at a '
+                'time: {}'.format(self.model_class.__bases__[0].__name__, e)
+            )
+            return self.persist_records(records, results)
+
+        logger.info('{}: created {}, updated {}, skipped {}'.format(
+            self.model_class.__bases__[0].__name__,
+            len(to_create), len(to_update), skipped_count
+        ))
+        results.created_count += len(to_create)
+        results.updated_count += len(to_update)
+        results.skipped_count += skipped_count
+        results.synced_ids.update(synced_ids)
+
+        return results
+
+    def _bulk_update_fields(self, instances, changed_fields):
+        """
+        Return the names of the concrete columns to write for the given
+        changed tracker fields, plus any auto_now column, which bulk_update
+        doesn't set by itself.
+        """
+        fields = set()
+        for name in changed_fields:
+            field = self.model_class._meta.get_field(name)
+            if field.concrete and not field.primary_key and \
+                    not field.many_to_many:
+                fields.add(field.name)
+
+        for field in self.model_class._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                for instance in instances:
+                    field.pre_save(instance, False)
+                fields.add(field.name)
+
+        return sorted(fields)
+
     def get_page(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -305,6 +919,81 @@ class Synchronizer:
                 )
             )
 
+    def get_optimal_size(self, condition_list, max_url_length=2000,
+                         min_url_length=None):
+        if not condition_list:
+            # Return none if empty list
+            return None
+        size = len(condition_list)
+
+        if not min_url_length:
+            min_url_length = max_url_length - 20
+
+        if self.url_length(condition_list, size) < max_url_length:
+            # If we can fit all of the statuses in the first batch, return
+            return size
+
+        max_size = size
+        min_size = 1
+        while True:
+            url_len = self.url_length(condition_list, size)
+            if url_len <= max_url_length and url_len > min_url_length:
+                break
+            elif url_len > max_url_length:
+                max_size = size
+                size = math.floor((max_size+min_size)/2)
+            else:
+                min_size = size
+                size = math.floor((max_size+min_size)/2)
+            if min_size == 1 and max_size == 1:
+                # The URL cannot be made short enough. This ought never to
+                # happen in production.
+                break
+        return size
+
+    @staticmethod
+    def url_length(condition_list, size):
+        # We add the approximate amount of characters for the URL that we
+        # know will be there every time (200) plus a little more to ensure we
+        # don't undercut it (300), and add (3 * size), because for the number
+        # of conditions, there will be the same number of commas separating
+        # them but commas are urlencoded to %2C which is 3 characters.
+        return (sum(len(str(i)) for i in condition_list[:size])
+                + 300 + (3 * size))
+
+    def fetch_sync_by_ids(self, instance_ids, conditions=None):
+        """
+        Sync the records with the given IDs with as few requests as the URL
+        length allows, instead of a fetch_sync_by_id() request for each. The
+        IDs are requested with paged `id in (...)` conditions through
+        fetch_records(), along with this synchronizer's API conditions and
+        any conditions given.
+
+        Nothing is deleted. A record missing from the response may have
+        been deleted, or may just fall outside the API conditions, so it's
+        up to the caller to look up each ID that isn't in
+        results.synced_ids on its own.
+        """
+        results = SyncResults()
+        unfetched_ids = sorted(set(instance_ids))
+        max_url_length = self.client.request_settings['max_url_length']
+
+        while unfetched_ids:
+            size = self.get_optimal_size(unfetched_ids, max_url_length)
+            batch_ids = unfetched_ids[:size]
+            del unfetched_ids[:size]
+
+            condition = 'id in ({})'.format(
+                ','.join(str(i) for i in batch_ids)
+            )
+            self.fetch_records(
+                results,
+                conditions=self.api_conditions + [condition] +
+                (conditions or [])
+            )
+
+        return results
+
     def _is_instance_changed(self, instance):
         return instance.tracker.changed()
 
@@ -326,6 +1015,7 @@ class Synchronizer:
 
         try:
             self._assign_field_data(instance, api_instance)
+            self._assign_change_markers(instance, api_instance)
 
             # This will return the created instance, the updated instance, or
             # if the instance is skipped an unsaved copy of the instance.
@@ -377,34 +1067,51 @@ class Synchronizer:
         """
         stale_ids = initial_ids - synced_ids
 
-        if stale_ids and self.full and self.mass_delete_protection:
-            total_count = len(initial_ids)
-            delete_count = len(stale_ids)
-            if total_count > 0 and delete_count / total_count > 0.9:
-                logger.exception(
-                    'Mass delete protection: Aborting deletion of '
-                    '%s out of %s %s records during full sync '
-                    '(exceeds 90%% threshold).',
-                    delete_count, total_count,
-                    self.model_class.__bases__[0].__name__
-                )
-                return 0
+        if stale_ids and self._mass_delete_blocked(
+                len(stale_ids), len(initial_ids)):
+            return 0
 
         deleted_count = 0
         if stale_ids:
-            delete_qset = self.get_delete_qset(stale_ids)
-            deleted_count = delete_qset.count()
+            deleted_count = self.delete_stale_records(
+                [stale_ids], len(stale_ids))
 
-            pre_delete_result = None
-            if self.pre_delete_callback:
-                pre_delete_result = self.pre_delete_callback(
-                    *self.pre_delete_args
-                )
-            logger.info(
-                'Removing {} stale records for model: {}'.format(
-                    len(stale_ids), self.model_class.__bases__[0].__name__,
-                )
+        return deleted_count
+
+    def _mass_delete_blocked(self, delete_count, total_count):
+        if self.full and self.mass_delete_protection and \
+                total_count > 0 and delete_count / total_count > 0.9:
+            logger.exception(
+                'Mass delete protection: Aborting deletion of '
+                '%s out of %s %s records during full sync '
+                '(exceeds 90%% threshold).',
+                delete_count, total_count,
+                self.model_class.__bases__[0].__name__
             )
+            return True
+        return False
+
+    def delete_stale_records(self, stale_id_batches, stale_count):
+        """
+        Delete the records of each batch of stale IDs in turn, and return
+        the number deleted.
+        """
+        pre_delete_result = None
+        if self.pre_delete_callback:
+            pre_delete_result = self.pre_delete_callback(
+                *self.pre_delete_args
+            )
+        logger.info(
+            'Removing {} stale records for model: {}'.format(
+                stale_count, self.model_class.__bases__[0].__name__,
+            )
+        )
+
+        deleted_count = 0
+        for stale_ids in stale_id_batches:
+            self.check_lease()
+            delete_qset = self.get_delete_qset(stale_ids)
+            deleted_count += delete_qset.count()
             if self.bulk_prune:
                 delete_qset.delete()
             else:
@@ -420,11 +1127,375 @@ class Synchronizer:
                             )
                         )
 
-            if self.post_delete_callback:
-                self.post_delete_callback(pre_delete_result)
+        if self.post_delete_callback:
+            self.post_delete_callback(pre_delete_result)
+
+        return deleted_count
+
+    def stage_instance_ids(self, prune_key=None):
+        """
+        Copy the IDs of the records that exist before a full sync into the
+        StagedRecordId table with a single INSERT ... SELECT, and return
+        the prune key they were staged under.
+        """
+        prune_key = prune_key or uuid.uuid4().hex
+        sql, params = self._instance_id_qset().order_by() \
+            .query.sql_with_params()
+        table = connection.ops.quote_name(
+            models.StagedRecordId._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} (prune_key, initial, record_id) '
+                'SELECT %s, %s, staged.* FROM ({}) staged'.format(table, sql),
+                (prune_key, True) + tuple(params)
+            )
+        return prune_key
+
+    def get_checkpoint_lookup(self):
+        # Checkpoints are kept per synchronizer, like watermarks.
+        return self.get_watermark_lookup()
+
+    def start_checkpoint(self, results):
+        """
+        Load the checkpoint of an interrupted full sync to resume from, or
+        start a new one, and return the prune key its IDs are staged under.
+        Without resume, an old checkpoint is discarded and the sync starts
+        over.
+        """
+        lookup = self.get_checkpoint_lookup()
+        checkpoint = models.SyncCheckpoint.objects.filter(**lookup).first()
+        if checkpoint and not self.resume:
+            models.StagedRecordId.objects.filter(
+                prune_key=checkpoint.prune_key).delete()
+            checkpoint.delete()
+            checkpoint = None
+
+        if checkpoint:
+            logger.info(
+                'Resuming {} full sync from batch {}, page {}'.format(
+                    self.model_class.__bases__[0].__name__,
+                    checkpoint.batch_index, checkpoint.page + 1)
+            )
+            results.created_count = checkpoint.created_count
+            results.updated_count = checkpoint.updated_count
+            results.skipped_count = checkpoint.skipped_count
+        else:
+            checkpoint = models.SyncCheckpoint.objects.create(
+                prune_key=self.stage_instance_ids(),
+                started_at=timezone.now(),
+                **lookup
+            )
+
+        self.checkpoint = checkpoint
+        self._batch_index = 0
+        return checkpoint.prune_key
+
+    def save_checkpoint(self, results):
+        # The synced IDs are flushed first, so that they always cover the
+        # pages the checkpoint says are done.
+        results.synced_ids.flush()
+        self.checkpoint.created_count = results.created_count
+        self.checkpoint.updated_count = results.updated_count
+        self.checkpoint.skipped_count = results.skipped_count
+        self.checkpoint.save()
+
+    @log_sync_job
+    def sync_sharded(self, worker=None):
+        """
+        Take part in a sharded full sync: join the one in progress for this
+        synchronizer or plan a new one, then claim and fetch its shards
+        until none are left. Whichever worker then finds every shard done
+        prunes the stale records. The counts returned are those of the
+        shards this worker fetched, and of the prune if it ran it.
+
+        Sharded syncs share their work through the shards, so they don't
+        take the synchronizer's lease.
+        """
+        return self.work_shards(self.start_sharded_sync(), worker)
+
+    def work_shards(self, sharded_sync, worker=None):
+        """Fetch shards of the given sharded sync until none are left."""
+        worker = worker or get_worker_name()
+        results = SyncResults()
+        results.synced_ids = StagedIds(
+            sharded_sync.prune_key, self.prune_batch_size)
+
+        while True:
+            shard = models.SyncShard.objects.claim(
+                sharded_sync, worker, self.shard_lease_seconds)
+            if shard is None:
+                break
+
+            logger.info('Fetching {} shard {} as {}'.format(
+                self.model_class.__bases__[0].__name__, shard.index, worker))
+            shard_qset = models.SyncShard.objects.filter(
+                pk=shard.pk, claimed_by=worker)
+            with self.hold_lease(shard_qset):
+                self.fetch_shard(results, shard.spec)
+                results.synced_ids.flush()
+            shard_qset.update(done=True)
+
+        results.deleted_count = self.finish_sharded_sync(
+            sharded_sync, results)
+        return results.created_count, results.updated_count, \
+            results.skipped_count, results.deleted_count
+
+    def start_sharded_sync(self):
+        """
+        Return the sharded sync in progress for this synchronizer, or
+        plan a new one. Planning stages the IDs of the existing records and
+        creates the shards in one transaction, so workers starting at the
+        same time wait for it on the unique constraint and then join in.
+        """
+        lookup = self.get_checkpoint_lookup()
+        with transaction.atomic():
+            sharded_sync, created = models.ShardedSync.objects.get_or_create(
+                defaults={
+                    'prune_key': uuid.uuid4().hex,
+                    'started_at': timezone.now(),
+                },
+                **lookup
+            )
+            if created:
+                self.stage_instance_ids(sharded_sync.prune_key)
+                specs = self.get_shard_specs()
+                models.SyncShard.objects.bulk_create([
+                    models.SyncShard(
+                        sharded_sync=sharded_sync, index=index, spec=spec)
+                    for index, spec in enumerate(specs)
+                ])
+                logger.info('Planned {} full sync in {} shards'.format(
+                    self.model_class.__bases__[0].__name__, len(specs)))
+        return sharded_sync
+
+    def get_shard_specs(self):
+        """
+        Return the partitions of a sharded full sync, as dicts that
+        fetch_shard is later called with. With shard_support, these are up
+        to sync_shards ranges of IDs holding about as many local records
+        each, the last range open-ended to take in new records.
+        """
+        if not self.shard_support:
+            return [{}]
+
+        ids = self._instance_id_qset()
+        count = ids.count()
+        bounds = sorted({
+            ids[count * i // self.sync_shards]
+            for i in range(1, self.sync_shards)
+        }) if count else []
+
+        specs = []
+        lower = None
+        for upper in bounds + [None]:
+            conditions = list(self.api_conditions)
+            if lower is not None:
+                conditions.append('id>={}'.format(lower))
+            if upper is not None:
+                conditions.append('id<{}'.format(upper))
+            specs.append({'conditions': conditions})
+            lower = upper
+        return specs
+
+    def fetch_shard(self, results, spec):
+        """Fetch and persist the records of the given shard."""
+        if 'conditions' in spec:
+            return self.fetch_records(results, spec['conditions'])
+        return self.get(results)
+
+    @contextmanager
+    def hold_lease(self, lease_qset, lease_seconds=None):
+        """
+        Keep renewing the lease of the given rows on a background thread
+        until the block exits. If a renewal finds the rows no longer
+        leased to this worker, the next page or prune batch raises
+        LeaseLost, as does leaving the block.
+        """
+        lease_seconds = lease_seconds or self.shard_lease_seconds
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def renew():
+            try:
+                while not stop.wait(lease_seconds / 3):
+                    renewed = lease_qset.update(
+                        lease_expires=timezone.now() + datetime.timedelta(
+                            seconds=lease_seconds)
+                    )
+                    if not renewed:
+                        lost.set()
+                        return
+            finally:
+                connections.close_all()
+
+        previous_lease_lost = self._lease_lost
+        self._lease_lost = lost
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            self._lease_lost = previous_lease_lost
+        if lost.is_set():
+            self._raise_lease_lost()
+
+    def check_lease(self):
+        """Raise LeaseLost if the lease held for this sync was lost."""
+        if self._lease_lost is not None and self._lease_lost.is_set():
+            self._raise_lease_lost()
+
+    def _raise_lease_lost(self):
+        logger.warning('Lost the lease on {} sync, stopping.'.format(
+            self.model_class.__bases__[0].__name__))
+        raise LeaseLost(
+            'Lost the lease on the {} sync to another worker.'.format(
+                self.model_class.__bases__[0].__name__)
+        )
 
+    def finish_sharded_sync(self, sharded_sync, results):
+        """
+        If every shard of the given sync is done and no other worker is
+        pruning, prune its stale records and remove it. Return the number
+        of records deleted.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            sharded_sync = models.ShardedSync.objects \
+                .select_for_update(skip_locked=True).filter(
+                    Q(lease_expires__isnull=True) | Q(lease_expires__lt=now),
+                    pk=sharded_sync.pk,
+                ).first()
+            if sharded_sync is None or \
+                    sharded_sync.shards.filter(done=False).exists():
+                return 0
+            sharded_sync.lease_expires = now + datetime.timedelta(
+                seconds=self.shard_lease_seconds)
+            sharded_sync.save(update_fields=['lease_expires'])
+
+        sync_qset = models.ShardedSync.objects.filter(pk=sharded_sync.pk)
+        with self.hold_lease(sync_qset):
+            deleted_count = self.prune_staged_records(sharded_sync.prune_key)
+        models.StagedRecordId.objects.filter(
+            prune_key=sharded_sync.prune_key).delete()
+        sharded_sync.delete()
+
+        if self.sync_watermarks:
+            self.save_watermark(sharded_sync.started_at, results)
         return deleted_count
 
+    def run_leased(self, run):
+        """
+        Call run while holding this synchronizer's lease, and return what
+        it returns. If another run holds the lease, or a sharded sync is in
+        progress, then depending on lease_mode: skip the sync; join the
+        sharded sync as a helper, if this is a full sync; or wait up to
+        sync_lease_wait seconds for the lease, and skip if it doesn't come.
+        """
+        holder = get_worker_name()
+        acquired, current_holder = self.acquire_lease(holder)
+
+        if not acquired and self.lease_mode == LEASE_JOIN and self.full:
+            sharded_sync = models.ShardedSync.objects.filter(
+                **self.get_checkpoint_lookup()).first()
+            if sharded_sync:
+                self.record_lease(LEASE_JOINED, current_holder)
+                return self.work_shards(sharded_sync, holder)
+
+        if not acquired and self.lease_mode != LEASE_SKIP:
+            self.record_lease(LEASE_WAITING, current_holder)
+            deadline = time.monotonic() + self.lease_wait
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(LEASE_POLL_INTERVAL)
+                acquired, current_holder = self.acquire_lease(holder)
+
+        if not acquired:
+            logger.info('Skipping {} sync, {} is already running it'.format(
+                self.model_class.__bases__[0].__name__, current_holder))
+            self.record_lease(LEASE_SKIPPED, current_holder)
+            return 0, 0, 0, 0
+
+        self.record_lease(LEASE_ACQUIRED, holder)
+        lease_qset = models.SyncLease.objects.filter(
+            holder=holder, **self.get_checkpoint_lookup())
+        try:
+            with self.hold_lease(lease_qset, self.lease_seconds):
+                return run()
+        finally:
+            lease_qset.update(holder='', lease_expires=None)
+
+    def acquire_lease(self, holder):
+        """
+        Take this synchronizer's lease for the given holder if it is free
+        and no sharded sync is in progress. Return whether it was taken,
+        and who holds it.
+        """
+        lookup = self.get_checkpoint_lookup()
+        now = timezone.now()
+        with transaction.atomic():
+            lease, _ = models.SyncLease.objects.select_for_update() \
+                .get_or_create(**lookup)
+            if lease.holder and lease.holder != holder and \
+                    lease.lease_expires and lease.lease_expires > now:
+                return False, lease.holder
+
+            if models.ShardedSync.objects.filter(**lookup).exists():
+                return False, 'sharded sync'
+
+            lease.holder = holder
+            lease.lease_expires = now + datetime.timedelta(
+                seconds=self.lease_seconds)
+            lease.sync_job = self.sync_job
+            lease.save()
+        return True, holder
+
+    def record_lease(self, status, holder):
+        if self.sync_job is None:
+            return
+        self.sync_job.lease_status = status
+        self.sync_job.lease_holder = holder
+        models.SyncJob.objects.filter(pk=self.sync_job.pk).update(
+            lease_status=status, lease_holder=holder)
+
+    def prune_staged_records(self, prune_key):
+        """
+        Delete the records staged as existing before the sync that the
+        sync didn't receive, found with an anti-join of the staged IDs and
+        deleted prune_batch_size at a time.
+        """
+        staged = models.StagedRecordId.objects.filter(prune_key=prune_key)
+        stale_qset = staged.filter(initial=True).annotate(
+            synced=Exists(staged.filter(
+                initial=False, record_id=OuterRef('record_id')))
+        )
+        counts = stale_qset.aggregate(
+            total=Count('pk'),
+            stale=Count('pk', filter=Q(synced=False)),
+        )
+        if not counts['stale'] or self._mass_delete_blocked(
+                counts['stale'], counts['total']):
+            return 0
+
+        return self.delete_stale_records(
+            self._stale_id_batches(stale_qset.filter(synced=False)),
+            counts['stale']
+        )
+
+    def _stale_id_batches(self, stale_qset):
+        stale_qset = stale_qset.order_by('record_id')
+        last_id = None
+        while True:
+            qset = stale_qset
+            if last_id is not None:
+                qset = qset.filter(record_id__gt=last_id)
+            batch = list(qset.values_list(
+                'record_id', flat=True)[:self.prune_batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
+
     def get_delete_qset(self, stale_ids):
         return self.model_class.objects.filter(pk__in=stale_ids)
 
@@ -433,13 +1504,67 @@ class Synchronizer:
             entity_name=self.model_class.__bases__[0].__name__
         )
 
+    def get_watermark_lookup(self):
+        return {
+            'entity_name': self.model_class.__bases__[0].__name__,
+            'synchronizer_class': '',
+        }
+
+    def get_watermark(self):
+        """Return the time of this synchronizer's watermark, or None."""
+        return models.SyncWatermark.objects.filter(
+            **self.get_watermark_lookup()
+        ).values_list('watermark', flat=True).first()
+
+    def save_watermark(self, sync_start, results):
+        """
+        Advance the watermark after a successful sync, to the source
+        chosen by the sync_watermark_source setting.
+        """
+        if self.watermark_source == WATERMARK_LAST_UPDATED:
+            # If nothing was synced, the old watermark still holds.
+            watermark = results.last_updated
+        elif self.watermark_source == WATERMARK_SERVER_DATE:
+            watermark = self.client.server_date or sync_start
+        else:
+            watermark = sync_start
+
+        if watermark:
+            models.SyncWatermark.objects.update_or_create(
+                defaults={'watermark': watermark},
+                **self.get_watermark_lookup()
+            )
+
+    def last_updated_condition(self, value):
+        """Return the condition for records updated after the given time."""
+        request_settings = DjconnectwiseSettings().get_settings()
+        if request_settings.get('send_naive_datetimes', True):
+            value = value.astimezone(datetime.timezone.utc).strftime(
+                '%Y-%m-%dT%H:%M:%S.%f')
+        else:
+            value = value.isoformat()
+        return 'lastUpdated>[{0}]'.format(value)
+
     @log_sync_job
+    @sync_lease
     def sync(self):
         sync_job_qset = self.get_sync_job_qset()
+        sync_start = timezone.now()
 
-        # Since the job is created before it begins, make sure to exclude
-        # itself, and at least one other sync job exists.
-        if sync_job_qset.count() > 1 and not self.full and \
+        watermark = None
+        if self.sync_watermarks:
+            self.client.server_date = None
+            watermark = self.get_watermark()
+
+        if watermark and not self.full and self.partial_sync_support:
+            self.api_conditions.append(
+                self.last_updated_condition(watermark))
+
+        # Without a watermark, such as on the first sync after turning on
+        # sync_watermarks, go by the last sync job. Since the job is created
+        # before it begins, make sure to exclude itself, and at least one
+        # other sync job exists.
+        elif sync_job_qset.count() > 1 and not self.full and \
                 self.partial_sync_support:
             send_naive_datetimes = (
                 DjconnectwiseSettings().get_settings())['send_naive_datetimes']
@@ -456,16 +1581,50 @@ class Synchronizer:
             )
         results = SyncResults()
 
+        # With prune_in_database or checkpoints, the IDs of records prior to
+        # sync and of those synced are staged in the database rather than in
+        # memory.
+        prune_key = None
+        if self.full and self.checkpoints and self.checkpoint_support:
+            prune_key = self.start_checkpoint(results)
+            sync_start = self.checkpoint.started_at
+        elif self.full and self.prune_in_database:
+            prune_key = self.stage_instance_ids()
+        if prune_key:
+            results.synced_ids = StagedIds(prune_key, self.prune_batch_size)
+
         # Set of IDs of all records prior to sync,
         # to find stale records for deletion.
-        initial_ids = self._instance_ids() if self.full else []
+        initial_ids = self._instance_ids() \
+            if self.full and not prune_key else []
 
-        results = self.get(results, )
+        completed = False
+        try:
+            results = self.get(results, )
+
+            # Only now that every record has been seen can stale ones be
+            # told apart.
+            if prune_key:
+                results.synced_ids.flush()
+                results.deleted_count = self.prune_staged_records(prune_key)
+            elif self.full:
+                results.deleted_count = self.prune_stale_records(
+                    initial_ids, results.synced_ids
+                )
+            completed = True
+        finally:
+            # A checkpointed sync that failed keeps its staged IDs, to be
+            # resumed with.
+            if prune_key and (completed or not self.checkpoint):
+                models.StagedRecordId.objects.filter(
+                    prune_key=prune_key).delete()
 
-        if self.full:
-            results.deleted_count = self.prune_stale_records(
-                initial_ids, results.synced_ids
-            )
+        if self.checkpoint:
+            self.checkpoint.delete()
+            self.checkpoint = None
+
+        if self.sync_watermarks:
+            self.save_watermark(sync_start, results)
 
         return results.created_count, results.updated_count, \
             results.skipped_count, results.deleted_count
@@ -492,18 +1651,80 @@ class Synchronizer:
             results.skipped_count, results.deleted_count
 
     def sync_children(self, *args):
-        for synchronizer, filter_params in args:
-            created_count, updated_count, skipped_count, deleted_count \
-                = synchronizer.callback_sync(filter_params)
-            msg = '{} Child Sync - Created: {},'\
-                ' Updated: {}, Skipped: {}, Deleted: {}'.format(
-                    synchronizer.model_class.__bases__[0].__name__,
-                    created_count,
-                    updated_count,
-                    skipped_count,
-                    deleted_count
+        self.run_related_syncs([
+            partial(self.sync_child, synchronizer, filter_params)
+            for synchronizer, filter_params in args
+        ])
+
+    def sync_child(self, synchronizer, filter_params):
+        created_count, updated_count, skipped_count, deleted_count \
+            = synchronizer.callback_sync(filter_params)
+        msg = '{} Child Sync - Created: {},'\
+            ' Updated: {}, Skipped: {}, Deleted: {}'.format(
+                synchronizer.model_class.__bases__[0].__name__,
+                created_count,
+                updated_count,
+                skipped_count,
+                deleted_count
+            )
+        logger.info(msg)
+
+    def run_related_syncs(self, related_syncs):
+        """
+        Call each of the given related syncs, one after another.
+
+        With the related_sync_workers setting above zero, they run at once
+        on that many threads instead, each on its own DB connection and in
+        its own transaction. Syncs that haven't started after
+        related_sync_timeout seconds are taken off the pool and, once those
+        still running are done, run one after another on this thread, so
+        none are skipped.
+
+        Other connections can't see rows the caller hasn't committed yet,
+        so inside a transaction the syncs always run one after another.
+        """
+        if not self.related_sync_workers or len(related_syncs) < 2 or \
+                connection.in_atomic_block:
+            for related_sync in related_syncs:
+                related_sync()
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.related_sync_workers)
+        try:
+            futures = [
+                executor.submit(self._run_related_sync_in_thread, s)
+                for s in related_syncs
+            ]
+            _, not_done = wait(futures, timeout=self.related_sync_timeout)
+            if not_done:
+                logger.warning(
+                    '{} of {} related syncs of {} did not finish within {} '
+                    'seconds; running those not yet started '
+                    'inline.'.format(
+                        len(not_done), len(futures),
+                        self.model_class.__bases__[0].__name__,
+                        self.related_sync_timeout
+                    )
                 )
-            logger.info(msg)
+        finally:
+            # Leave no thread running behind the caller's back.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        for related_sync, future in zip(related_syncs, futures):
+            if future.cancelled():
+                related_sync()
+            else:
+                # Raise the first error, as the sequential syncs would.
+                future.result()
+
+    @staticmethod
+    def _run_related_sync_in_thread(related_sync):
+        try:
+            with transaction.atomic():
+                related_sync()
+        finally:
+            # Don't leak the DB connection this thread opened.
+            connections.close_all()
 
     def remove_null_characters(self, json_data):
         for value in json_data:
@@ -534,11 +1755,37 @@ class BatchConditionMixin:
     groups that get the URL close to 2000 characters, and get those results
     in pages. And then get the next set of statuses in pages, and so on.
     """
+    # Each batch is a shard of a sharded full sync.
+    shard_support = True
+    # Filled by get_batch_condition_list() on first use, so only a batched
+    # get() pays for loading it.
+    _batch_condition_list = None
+
+    @property
+    def batch_condition_list(self):
+        if self._batch_condition_list is None:
+            self._batch_condition_list = self.get_batch_condition_list()
+        return self._batch_condition_list
+
+    @batch_condition_list.setter
+    def batch_condition_list(self, value):
+        self._batch_condition_list = value
+
+    def get_batch_condition_list(self):
+        """Return the values to batch the batch conditions over."""
+        return []
+
     def get_batch_condition(self, conditions):
         raise NotImplementedError
 
     def get(self, results, conditions=None):
         """Buffer and return all pages of results."""
+        for batch_conditions in self.iter_batch_conditions():
+            results = super().get(results, conditions=batch_conditions)
+        return results
+
+    def iter_batch_conditions(self):
+        """Yield the conditions to fetch each batch of records with."""
         unfetched_conditions = deepcopy(self.batch_condition_list)
         while unfetched_conditions:
             # While there are still items left in the list there are still
@@ -552,50 +1799,13 @@ class BatchConditionMixin:
             batch_condition = self.get_batch_condition(batch_conditions)
             batch_conditions = deepcopy(self.api_conditions)
             batch_conditions.append(batch_condition)
-            results = super().get(results, conditions=batch_conditions)
-        return results
-
-    def get_optimal_size(self, condition_list, max_url_length=2000,
-                         min_url_length=None):
-        if not condition_list:
-            # Return none if empty list
-            return None
-        size = len(condition_list)
-
-        if not min_url_length:
-            min_url_length = max_url_length - 20
+            yield batch_conditions
 
-        if self.url_length(condition_list, size) < max_url_length:
-            # If we can fit all of the statuses in the first batch, return
-            return size
-
-        max_size = size
-        min_size = 1
-        while True:
-            url_len = self.url_length(condition_list, size)
-            if url_len <= max_url_length and url_len > min_url_length:
-                break
-            elif url_len > max_url_length:
-                max_size = size
-                size = math.floor((max_size+min_size)/2)
-            else:
-                min_size = size
-                size = math.floor((max_size+min_size)/2)
-            if min_size == 1 and max_size == 1:
-                # The URL cannot be made short enough. This ought never to
-                # happen in production.
-                break
-        return size
-
-    @staticmethod
-    def url_length(condition_list, size):
-        # We add the approximate amount of characters for the URL that we
-        # know will be there every time (200) plus a little more to ensure we
-        # don't undercut it (300), and add (3 * size), because for the number
-        # of conditions, there will be the same number of commas separating
-        # them but commas are urlencoded to %2C which is 3 characters.
-        return (sum(len(str(i)) for i in condition_list[:size])
-                + 300 + (3 * size))
+    def get_shard_specs(self):
+        return [
+            {'conditions': batch_conditions}
+            for batch_conditions in self.iter_batch_conditions()
+        ]
 
 
 class CallbackSyncMixin:
@@ -617,7 +1827,15 @@ class CallbackSyncMixin:
     def callback_sync(self, filter_params):
         sync_job_qset = self.get_sync_job_qset()
 
-        if sync_job_qset.exists() and not self.sync_all:
+        watermark = None
+        if self.sync_watermarks and not self.sync_all:
+            watermark = self.get_watermark()
+
+        if watermark:
+            self.api_conditions.append(
+                self.last_updated_condition(watermark))
+
+        elif sync_job_qset.exists() and not self.sync_all:
             send_naive_datetimes = (
                 DjconnectwiseSettings().get_settings())['send_naive_datetimes']
             last_sync_job = sync_job_qset.last()
@@ -640,6 +1858,17 @@ class CallbackSyncMixin:
 class ChildFetchRecordsMixin:
     parent_model_class = None
     sync_single_id = None
+    # The parent model field that stores the parent's _info.lastUpdated
+    # value. With the parent_watermarks setting, partial syncs only visit
+    # parents that changed since their children were last synced.
+    parent_last_updated_field = None
+    # Ranges of parent IDs are the shards of a sharded full sync.
+    shard_support = True
+    # Records are fetched parent by parent, which has no checkpoints.
+    checkpoint_support = False
+    # The lowest and highest parent IDs to visit, either of which may be
+    # None for no bound, when fetching a shard.
+    parent_id_range = None
 
     def get_total_pages(self, results, conditions=None, object_id=None):
         """
@@ -650,44 +1879,208 @@ class ChildFetchRecordsMixin:
         self.api_conditions.
         """
         page_conditions = conditions or self.api_conditions
-        page = 1
-        while True:
-            logger.info(
-                'Fetching {} records: {} id {}, page {}'.format(
-                    self.model_class.__bases__[0].__name__,
-                    self.parent_model_class.__name__,
-                    object_id, page)
-            )
-            page_records = self.get_page(
-                page=page, page_size=self.batch_size,
-                conditions=page_conditions,
-                object_id=object_id,
-            )
+        for page_records in self.iter_pages(page_conditions,
+                                            object_id=object_id):
             self.persist_page(page_records, results)
-            page += 1
-
-            if len(page_records) < self.batch_size:
-                # This page wasn't full, so there's no more records after
-                # this page.
-                break
         return results
 
+    def fetch_page(self, page, conditions, object_id=None, **kwargs):
+        logger.info(
+            'Fetching {} records: {} id {}, page {}'.format(
+                self.model_class.__bases__[0].__name__,
+                self.parent_model_class.__name__,
+                object_id, page)
+        )
+        return self.get_page(
+            page=page, page_size=self.batch_size,
+            conditions=conditions,
+            object_id=object_id, **kwargs
+        )
+
     def fetch_records(self, results, conditions=None):
+        object_ids, parent_marks = self.get_parents_to_visit()
+        visited_ids = []
 
-        for object_id in self.parent_object_ids:
-            try:
-                self.get_total_pages(
-                    results,
-                    conditions=conditions,
-                    object_id=object_id,
-                )
-            except ConnectWiseSecurityPermissionsException:
-                # Pass boards TopLeft may not have access to so the
-                #  whole sync doesn't fail
-                continue
+        if self.child_fetch_workers and not self.sync_single_id:
+            self._fetch_records_concurrently(
+                results, object_ids, visited_ids, conditions)
+        else:
+            for object_id in object_ids:
+                try:
+                    self.get_total_pages(
+                        results,
+                        conditions=conditions,
+                        object_id=object_id,
+                    )
+                except ConnectWiseSecurityPermissionsException:
+                    # Pass boards TopLeft may not have access to so the
+                    #  whole sync doesn't fail
+                    continue
+                visited_ids.append(object_id)
+
+        if parent_marks is not None:
+            self.save_parent_watermarks(visited_ids, parent_marks)
+
+        return results
+
+    @property
+    def use_parent_watermarks(self):
+        return self.parent_watermarks and \
+            bool(self.parent_last_updated_field) and not self.sync_single_id
+
+    def get_parents_to_visit(self):
+        """
+        Return the IDs of the parents to fetch records for, and a dict of
+        their current lastUpdated values to record watermarks with, or None
+        if watermarks aren't in use.
+
+        A partial sync skips the parents whose lastUpdated is no newer than
+        their watermark. A full sync visits them all, catching any child
+        changes that didn't touch their parent.
+        """
+        object_ids = self.parent_object_ids
+        if self.parent_id_range:
+            lower, upper = self.parent_id_range
+            object_ids = [
+                object_id for object_id in object_ids
+                if (lower is None or object_id >= lower) and
+                (upper is None or object_id <= upper)
+            ]
+        if not self.use_parent_watermarks:
+            return object_ids, None
+
+        parent_marks = dict(
+            self.parent_model_class.objects.values_list(
+                'pk', self.parent_last_updated_field)
+        )
+        if self.full:
+            return object_ids, parent_marks
+
+        watermarks = dict(
+            models.ParentWatermark.objects.filter(
+                entity_name=self.model_class.__bases__[0].__name__
+            ).values_list('parent_id', 'parent_last_updated')
+        )
+        to_visit = []
+        for object_id in object_ids:
+            last_updated = parent_marks.get(object_id)
+            watermark = watermarks.get(object_id)
+            if last_updated is None or watermark is None or \
+                    last_updated > watermark:
+                to_visit.append(object_id)
+
+        logger.info('Fetching {} records for {} of {} {} records'.format(
+            self.model_class.__bases__[0].__name__, len(to_visit),
+            len(parent_marks), self.parent_model_class.__name__
+        ))
+        return to_visit, parent_marks
+
+    def get_shard_specs(self):
+        """
+        Split the parents into up to sync_shards ranges of IDs. The first
+        and last ranges are open-ended, to take in parents added since.
+        """
+        object_ids = sorted(self.parent_object_ids)
+        size = max(math.ceil(len(object_ids) / self.sync_shards), 1)
+        chunks = [
+            object_ids[i:i + size] for i in range(0, len(object_ids), size)
+        ] or [[]]
+
+        specs = []
+        for index, chunk in enumerate(chunks):
+            lower = chunk[0] if index else None
+            upper = chunk[-1] if index < len(chunks) - 1 else None
+            specs.append({'parent_ids': [lower, upper]})
+        return specs
+
+    def fetch_shard(self, results, spec):
+        if 'parent_ids' not in spec:
+            return super().fetch_shard(results, spec)
+
+        self.parent_id_range = spec['parent_ids']
+        try:
+            return self.fetch_records(results)
+        finally:
+            self.parent_id_range = None
+
+    def save_parent_watermarks(self, visited_ids, parent_marks):
+        entity_name = self.model_class.__bases__[0].__name__
+        watermarks = [
+            models.ParentWatermark(
+                entity_name=entity_name,
+                parent_id=object_id,
+                parent_last_updated=parent_marks[object_id],
+            )
+            for object_id in visited_ids
+            if parent_marks.get(object_id) is not None
+        ]
+        models.ParentWatermark.objects.bulk_create(
+            watermarks,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['entity_name', 'parent_id'],
+            update_fields=['parent_last_updated', 'synced_at'],
+        )
+
+    def _fetch_records_concurrently(self, results, object_ids, visited_ids,
+                                    conditions=None):
+        """
+        Fetch the records of up to child_fetch_workers parents at once on
+        background threads, and persist each parent's pages on this thread
+        as they arrive, so only one thread writes to the DB. The IDs of the
+        parents that were fetched are appended to visited_ids.
+        """
+        page_conditions = conditions or self.api_conditions
+        executor = ThreadPoolExecutor(max_workers=self.child_fetch_workers)
+        # Keep a bounded number of parents fetched but not yet persisted.
+        max_pending = self.child_fetch_workers * 2
+        pending = {}
+        object_ids = iter(object_ids)
+        try:
+            while True:
+                for object_id in object_ids:
+                    future = executor.submit(
+                        self._fetch_parent_pages, page_conditions, object_id
+                    )
+                    pending[future] = object_id
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    object_id = pending.pop(future)
+                    try:
+                        pages = future.result()
+                    except ConnectWiseSecurityPermissionsException:
+                        # Pass boards TopLeft may not have access to so the
+                        #  whole sync doesn't fail
+                        continue
+                    for page_records in pages:
+                        self.persist_page(page_records, results)
+                    visited_ids.append(object_id)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
         return results
 
+    def _fetch_parent_pages(self, conditions, object_id):
+        """Return every page of records of the given parent."""
+        pages = []
+        page = 1
+        try:
+            while True:
+                page_records = self.fetch_page(
+                    page, conditions, object_id=object_id)
+                pages.append(page_records)
+                if len(page_records) < self.batch_size:
+                    return pages
+                page += 1
+        finally:
+            # Don't leak any DB connection get_page opened on this thread.
+            connections.close_all()
+
     def get_page(self, *args, **kwargs):
         object_id = kwargs.get('object_id')
         return self.client_call(object_id, *args, **kwargs)
@@ -754,7 +2147,9 @@ class ServiceNoteSynchronizer(ChildFetchRecordsMixin,
                               Synchronizer):
     client_class = api.ServiceAPIClient
     model_class = models.ServiceNoteTracker
+    last_updated_field = 'last_updated_utc'
     parent_model_class = models.Ticket
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'member': (models.Member, 'member')
@@ -1049,6 +2444,7 @@ class OpportunityNoteSynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.SalesAPIClient
     model_class = models.OpportunityNoteTracker
     parent_model_class = models.Opportunity
+    parent_last_updated_field = 'last_updated_utc'
 
     def _assign_field_data(self, instance, json_data):
         instance.id = json_data.get('id')
@@ -1286,6 +2682,7 @@ class BoardChildSynchronizer(Synchronizer):
 class BoardStatusSynchronizer(ChildFetchRecordsMixin, BoardChildSynchronizer):
     client_class = api.ServiceAPIClient
     model_class = models.BoardStatusTracker
+    payload_hash_field = 'payload_hash'
     parent_model_class = models.ConnectWiseBoard
 
     def __init__(self, *args, **kwargs):
@@ -1332,6 +2729,7 @@ class BoardFilterMixin(ChildFetchRecordsMixin):
 class M2MAssignmentMixin:
     # indicates if many to many field info is changed or not
     m2m_changed = False
+    bulk_persist_support = False
 
     def set_m2m_has_changed(self, instance_objects, api_objects):
         # This method works only when a model has one m2m field now.
@@ -1373,6 +2771,9 @@ class TeamSynchronizer(M2MAssignmentMixin, BoardFilterMixin,
 class CompanySynchronizer(M2MAssignmentMixin, Synchronizer):
     client_class = api.CompanyAPIClient
     model_class = models.CompanyTracker
+    last_updated_field = 'last_updated_utc'
+    keyset_pagination_support = True
+    shard_support = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1480,9 +2881,20 @@ class CompanySynchronizer(M2MAssignmentMixin, Synchronizer):
             )
         return company
 
+    def get_relation_ids(self, record):
+        relation_ids = super().get_relation_ids(record)
+        relation_ids['status_id'] = (record.get('status') or {}).get('id')
+        relation_ids['calendar_id'] = record.get('calendarId')
+        relation_ids['territory_id'] = \
+            (record.get('territory') or {}).get('id')
+        return relation_ids
+
     def get_page(self, *args, **kwargs):
         return self.client.get_companies(*args, **kwargs)
 
+    def get_count(self, conditions, **kwargs):
+        return self.client.get_companies_count(conditions=conditions)
+
     def get_single(self, company_id):
         return self.client.by_id(company_id)
 
@@ -1576,6 +2988,7 @@ class CompanyTeamSynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.CompanyAPIClient
     model_class = models.CompanyTeamTracker
     parent_model_class = models.Company
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'company': (models.Company, 'company'),
@@ -1602,6 +3015,7 @@ class CompanySiteSynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.CompanyAPIClient
     model_class = models.CompanySiteTracker
     parent_model_class = models.Company
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'company': (models.Company, 'company'),
@@ -1637,6 +3051,7 @@ class CompanyTeamRoleSynchronizer(Synchronizer):
 class ContactSynchronizer(Synchronizer):
     client_class = api.CompanyAPIClient
     model_class = models.ContactTracker
+    last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'company': (models.Company, 'company'),
@@ -1646,6 +3061,67 @@ class ContactSynchronizer(Synchronizer):
         super().__init__(*args, **kwargs)
         self.api_conditions = ['inactiveFlag=False']
 
+        # Contacts come with their communicationItems, so with the
+        # inline_contact_communications setting they are persisted from
+        # the same pages instead of one request per contact.
+        settings = DjconnectwiseSettings().get_settings()
+        self.inline_communications = \
+            settings.get('sync_contact_communications', True) and \
+            settings.get('inline_contact_communications', False)
+        self.communication_results = SyncResults()
+        if self.inline_communications:
+            # A resumed sync would prune the communications of the
+            # contacts fetched before it stopped.
+            self.checkpoint_support = False
+            self.communication_synchronizer = \
+                ContactCommunicationSynchronizer(full=self.full)
+
+    def get(self, results, conditions=None):
+        if not self.inline_communications:
+            return super().get(results, conditions)
+
+        communication_sync = self.communication_synchronizer
+        self.communication_results = SyncResults()
+        initial_ids = communication_sync._instance_ids() \
+            if self.full else set()
+
+        results = super().get(results, conditions)
+
+        if self.full:
+            self.communication_results.deleted_count = \
+                communication_sync.prune_stale_records(
+                    initial_ids, self.communication_results.synced_ids
+                )
+        logger.info(
+            'ContactCommunication: created {}, updated {}, skipped {}, '
+            'deleted {}'.format(
+                self.communication_results.created_count,
+                self.communication_results.updated_count,
+                self.communication_results.skipped_count,
+                self.communication_results.deleted_count,
+            )
+        )
+        return results
+
+    def persist_page(self, records, results):
+        if not self.inline_communications:
+            return super().persist_page(records, results)
+
+        # Collect the communications before the contacts are persisted,
+        # since unchanged contacts may be dropped from the page.
+        communications = []
+        for record in records:
+            for item in record.get('communicationItems') or []:
+                item = dict(item)
+                item.setdefault('contactId', record['id'])
+                communications.append(item)
+
+        results = super().persist_page(records, results)
+        if communications:
+            self.communication_synchronizer.persist_page(
+                communications, self.communication_results)
+        return results
+
     def _assign_field_data(self, instance, json_data):
         instance.id = json_data.get('id')
         instance.first_name = json_data.get('firstName')
@@ -1666,6 +3142,13 @@ class ContactSynchronizer(Synchronizer):
         self.sync_related(instance)
         return instance
 
+    def fetch_sync_by_ids(self, instance_ids, conditions=None):
+        results = super().fetch_sync_by_ids(instance_ids, conditions)
+        for instance in self.model_class.objects.filter(
+                pk__in=results.synced_ids):
+            self.sync_related(instance)
+        return results
+
     def sync_related(self, instance):
         instance_id = instance.id
         sync_classes = []
@@ -1683,6 +3166,7 @@ class ContactCommunicationSynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.CompanyAPIClient
     model_class = models.ContactCommunicationTracker
     parent_model_class = models.Contact
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'type': (models.CommunicationType, 'type'),
@@ -1791,6 +3275,7 @@ class ActivityTypeSynchronizer(Synchronizer):
 class ActivitySynchronizer(UpdateRecordMixin, Synchronizer):
     client_class = api.SalesAPIClient
     model_class = models.ActivityTracker
+    last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'opportunity': (models.Opportunity, 'opportunity'),
@@ -1818,12 +3303,11 @@ class ActivitySynchronizer(UpdateRecordMixin, Synchronizer):
         'date_end': 'dateEnd',
     }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def get_api_conditions(self):
         # Only sync activities in non-closed statuses. There shouldn't be
         # too many activity statuses so we don't need to page this like we
         # do with tickets.
-        self.api_conditions = ['status/id in ({})'.format(
+        return ['status/id in ({})'.format(
             ','.join(
                 [
                     str(i.id) for
@@ -1894,7 +3378,7 @@ class SalesProbabilitySynchronizer(Synchronizer):
 class ScheduleEntriesSynchronizer(BatchConditionMixin, Synchronizer):
     client_class = api.ScheduleAPIClient
     model_class = models.ScheduleEntryTracker
-    batch_condition_list = []
+    last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'where': (models.Location, 'where'),
@@ -1916,22 +3400,25 @@ class ScheduleEntriesSynchronizer(BatchConditionMixin, Synchronizer):
         if not self.no_batch:
             self.api_conditions.append("doneFlag=false")
 
-            # Only get schedule entries for tickets or opportunities that we
-            # already have in the DB.
-            ticket_ids = set(
-                models.Ticket.objects.order_by(
-                    self.lookup_key).values_list('id', flat=True)
-            )
-            opportunity_ids = set(
-                models.Opportunity.objects.order_by(
-                    self.lookup_key).values_list('id', flat=True)
-            )
-            activity_ids = set(
-                models.Activity.objects.order_by(
-                    self.lookup_key).values_list('id', flat=True)
-            )
-            self.batch_condition_list = \
-                list(ticket_ids | opportunity_ids | activity_ids)
+    def get_batch_condition_list(self):
+        if self.no_batch:
+            return []
+
+        # Only get schedule entries for tickets or opportunities that we
+        # already have in the DB.
+        ticket_ids = set(
+            models.Ticket.objects.order_by(
+                self.lookup_key).values_list('id', flat=True)
+        )
+        opportunity_ids = set(
+            models.Opportunity.objects.order_by(
+                self.lookup_key).values_list('id', flat=True)
+        )
+        activity_ids = set(
+            models.Activity.objects.order_by(
+                self.lookup_key).values_list('id', flat=True)
+        )
+        return list(ticket_ids | opportunity_ids | activity_ids)
 
     def get(self, results, conditions=None):
 
@@ -1942,6 +3429,11 @@ class ScheduleEntriesSynchronizer(BatchConditionMixin, Synchronizer):
 
         return results
 
+    def get_shard_specs(self):
+        if self.no_batch:
+            return Synchronizer.get_shard_specs(self)
+        return super().get_shard_specs()
+
     def get_optimal_size(self, condition_list, max_url_length=2000,
                          min_url_length=None):
         object_id_size = self.settings['schedule_entry_conditions_size']
@@ -2199,7 +3691,8 @@ class TimeEntrySynchronizer(BatchConditionMixin,
                             Synchronizer):
     client_class = api.TimeAPIClient
     model_class = models.TimeEntryTracker
-    batch_condition_list = []
+    last_updated_field = 'last_updated_utc'
+    keyset_pagination_support = True
 
     related_meta = {
         'company': (models.Company, 'company'),
@@ -2242,13 +3735,15 @@ class TimeEntrySynchronizer(BatchConditionMixin,
         self.api_conditions = [
             "(chargeToType='ServiceTicket' OR chargeToType='ProjectTicket')"
         ]
+
+    def get_batch_condition_list(self):
         # Only get time entries for tickets that are already in the DB
         # Possibly Activities also in the future
         ticket_ids = set(
             models.Ticket.objects.order_by(
                 self.lookup_key).values_list('id', flat=True)
         )
-        self.batch_condition_list = list(ticket_ids)
+        return list(ticket_ids)
 
     def get_batch_condition(self, conditions):
         return 'chargeToId in ({})'.format(
@@ -2352,9 +3847,18 @@ class TimeEntrySynchronizer(BatchConditionMixin,
 
         return instance
 
+    def get_relation_ids(self, record):
+        relation_ids = super().get_relation_ids(record)
+        relation_ids['charge_to_id_id'] = record.get('chargeToId')
+        relation_ids['system_location_id'] = record.get('locationId')
+        return relation_ids
+
     def get_page(self, *args, **kwargs):
         return self.client.get_time_entries(*args, **kwargs)
 
+    def get_count(self, conditions, **kwargs):
+        return self.client.get_time_entries_count(conditions=conditions)
+
     def create_new_entry(self, target, **kwargs):
         """
         Send POST request to ConnectWise to create a new entry and then
@@ -2494,6 +3998,7 @@ class ProjectPhaseSynchronizer(
     client_class = api.ProjectAPIClient
     model_class = models.ProjectPhaseTracker
     parent_model_class = models.Project
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'board': (models.ConnectWiseBoard, 'board'),
@@ -2626,6 +4131,7 @@ class ProjectTeamMemberSynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.ProjectAPIClient
     model_class = models.ProjectTeamMemberTracker
     parent_model_class = models.Project
+    parent_last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'member': (models.Member, 'member'),
@@ -2727,7 +4233,7 @@ class ProjectSynchronizer(CreateRecordMixin,
                           Synchronizer):
     client_class = api.ProjectAPIClient
     model_class = models.ProjectTracker
-    batch_condition_list = []
+    last_updated_field = 'last_updated_utc'
     related_meta = {
         'status': (models.ProjectStatus, 'status'),
         'manager': (models.Member, 'manager'),
@@ -2753,20 +4259,21 @@ class ProjectSynchronizer(CreateRecordMixin,
         'company': 'company',
     }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def get_api_conditions(self):
+        if not self.full:
+            return []
 
         filtered_statuses = \
             models.ProjectStatus.objects.filter(closed_flag=False)
+        return ['status/id in ({})'.format(
+            ','.join(str(i.id) for i in filtered_statuses)
+        )]
 
-        if self.full:
-            self.api_conditions = ['status/id in ({})'.format(
-                ','.join(str(i.id) for i in filtered_statuses)
-            )]
-
-        if filtered_statuses:
-            self.batch_condition_list = \
-                list(filtered_statuses.values_list('id', flat=True))
+    def get_batch_condition_list(self):
+        return list(
+            models.ProjectStatus.objects.filter(
+                closed_flag=False).values_list('id', flat=True)
+        )
 
     def _assign_field_data(self, instance, json_data):
         actual_start = json_data.get('actualStart')
@@ -2867,6 +4374,7 @@ class MemberSynchronizer(Synchronizer):
     client_class = api.SystemAPIClient
     model_class = models.MemberTracker
     bulk_prune = False
+    bulk_persist_support = False
 
     related_meta = {
         'workRole': (models.WorkRole, 'work_role'),
@@ -3019,7 +4527,8 @@ class MemberSynchronizer(Synchronizer):
 
 class TicketSynchronizerMixin:
     model_class = models.TicketTracker
-    batch_condition_list = []
+    last_updated_field = 'last_updated_utc'
+    keyset_pagination_support = True
 
     related_meta = {
         'team': (models.Team, 'team'),
@@ -3090,6 +4599,8 @@ class TicketSynchronizerMixin:
 
         if self.full:
             self.api_conditions = ['closedFlag=False']
+
+    def get_batch_condition_list(self):
         # To get all open tickets, we can simply supply a `closedFlag=False`
         # condition for on-premise ConnectWise. But for hosted ConnectWise,
         # this results in timeouts for requests, so we also need to add a
@@ -3110,10 +4621,7 @@ class TicketSynchronizerMixin:
                     board__id__in=board_ids
                 )
 
-        if filtered_statuses:
-            # Only do this if we know of at least one open status.
-            self.batch_condition_list = \
-                list(filtered_statuses.values_list('id', flat=True))
+        return list(filtered_statuses.values_list('id', flat=True))
 
     def get_batch_condition(self, conditions):
         batch_condition = 'status/id in ({})'.format(
@@ -3150,6 +4658,9 @@ class TicketSynchronizerMixin:
     def get_page(self, *args, **kwargs):
         return self.client.get_tickets(*args, **kwargs)
 
+    def get_count(self, conditions, **kwargs):
+        return self.client.tickets_count(conditions=conditions)
+
     def get_single(self, ticket_id):
         return self.client.get_ticket(ticket_id)
 
@@ -3179,9 +4690,11 @@ class TicketSynchronizerMixin:
             activity_sync.api_conditions = ['ticket/id={}'.format(instance_id)]
             sync_classes.append((activity_sync, Q(ticket=instance)))
 
-        self.task_synchronizer_class().sync_items(instance)
-
-        self.sync_children(*sync_classes)
+        self.run_related_syncs(
+            [partial(self.task_synchronizer_class().sync_items, instance)] +
+            [partial(self.sync_child, synchronizer, filter_params)
+             for synchronizer, filter_params in sync_classes]
+        )
 
     def fetch_sync_by_id(self, instance_id, sync_config={}):
         request_settings = DjconnectwiseSettings().get_settings()
@@ -3211,7 +4724,34 @@ class TicketSynchronizerMixin:
             self.sync_related(instance, sync_config, result)
         return instance
 
-    def _instance_ids(self, filter_params=None):
+    def fetch_sync_by_ids(self, instance_ids, conditions=None,
+                          sync_config={}):
+        conditions = list(conditions or [])
+        request_settings = DjconnectwiseSettings().get_settings()
+        board_ids = request_settings.get('board_status_filter')
+        if board_ids:
+            # Tickets outside the permitted boards come back missing, so
+            # the caller looks them up on their own, and fetch_sync_by_id()
+            # ignores them.
+            conditions.append('board/id in ({})'.format(
+                ','.join(str(i) for i in board_ids)
+            ))
+
+        existing_ids = set(
+            self.filter_by_record_type().filter(pk__in=instance_ids)
+            .values_list('id', flat=True)
+        )
+        results = super().fetch_sync_by_ids(instance_ids, conditions)
+
+        open_tickets = self.filter_by_record_type().filter(
+            pk__in=results.synced_ids, closed_flag=False
+        )
+        for instance in open_tickets:
+            result = UPDATED if instance.id in existing_ids else CREATED
+            self.sync_related(instance, sync_config, result)
+        return results
+
+    def _instance_id_qset(self, filter_params=None):
         tickets_qset = self.filter_by_record_type().order_by(self.lookup_key)
 
         if not filter_params:
@@ -3220,7 +4760,7 @@ class TicketSynchronizerMixin:
             ids = tickets_qset.filter(filter_params).values_list(
                 self.lookup_key, flat=True
             )
-        return set(ids)
+        return ids
 
     def get_delete_qset(self, stale_ids):
         tickets = self.filter_by_record_type()
@@ -3232,6 +4772,12 @@ class TicketSynchronizerMixin:
             synchronizer_class=self.__class__.__name__
         )
 
+    def get_watermark_lookup(self):
+        return {
+            'entity_name': self.model_class.__bases__[0].__name__,
+            'synchronizer_class': self.__class__.__name__,
+        }
+
     def _assign_field_data(self, instance, json_data):
 
         instance.id = json_data.get('id')
@@ -3351,6 +4897,13 @@ class TicketSynchronizerMixin:
 
         return instance
 
+    def get_relation_ids(self, record):
+        relation_ids = super().get_relation_ids(record)
+        relation_ids['merged_parent_id'] = \
+            (record.get('mergedParentTicket') or {}).get('id')
+        relation_ids['company_site_id'] = (record.get('site') or {}).get('id')
+        return relation_ids
+
     def create(self, fields, **kwargs):
         """
         Send POST request to ConnectWise to create tickets.
@@ -3574,6 +5127,15 @@ class ProjectTicketSynchronizer(TicketSynchronizerMixin,
 
         return results
 
+    def get_shard_specs(self):
+        # The open project pass is a shard of its own.
+        return super().get_shard_specs() + [{'open_project_tickets': True}]
+
+    def fetch_shard(self, results, spec):
+        if spec.get('open_project_tickets'):
+            return self._fetch_open_project_tickets(results)
+        return super().fetch_shard(results, spec)
+
     def _fetch_open_project_tickets(self, results):
         """
         Second pass: fetch the closed tickets of every open project.
@@ -3703,6 +5265,7 @@ class CalendarSynchronizer(Synchronizer):
 class HolidaySynchronizer(ChildFetchRecordsMixin, Synchronizer):
     client_class = api.ScheduleAPIClient
     model_class = models.HolidayTracker
+    payload_hash_field = 'payload_hash'
     parent_model_class = models.HolidayList
 
     def _assign_field_data(self, instance, json_data):
@@ -3749,6 +5312,7 @@ class HolidayListSynchronizer(Synchronizer):
 class OpportunitySynchronizer(UpdateRecordMixin, Synchronizer):
     client_class = api.SalesAPIClient
     model_class = models.OpportunityTracker
+    last_updated_field = 'last_updated_utc'
     related_meta = {
         'type': (models.OpportunityType, 'opportunity_type'),
         'stage': (models.OpportunityStage, 'stage'),
@@ -3912,6 +5476,7 @@ class OpportunityTypeSynchronizer(Synchronizer):
 class TypeSynchronizer(BoardFilterMixin, Synchronizer):
     client_class = api.ServiceAPIClient
     model_class = models.TypeTracker
+    payload_hash_field = 'payload_hash'
 
     related_meta = {
         'board': (models.ConnectWiseBoard, 'board')
@@ -3932,6 +5497,7 @@ class TypeSynchronizer(BoardFilterMixin, Synchronizer):
 class SubTypeSynchronizer(BoardFilterMixin, Synchronizer):
     client_class = api.ServiceAPIClient
     model_class = models.SubTypeTracker
+    payload_hash_field = 'payload_hash'
 
     related_meta = {
         'board': (models.ConnectWiseBoard, 'board')
@@ -3952,6 +5518,7 @@ class SubTypeSynchronizer(BoardFilterMixin, Synchronizer):
 class ItemSynchronizer(BoardFilterMixin, Synchronizer):
     client_class = api.ServiceAPIClient
     model_class = models.ItemTracker
+    payload_hash_field = 'payload_hash'
 
     related_meta = {
         'board': (models.ConnectWiseBoard, 'board')
@@ -4055,6 +5622,7 @@ class ProjectRoleSynchronizer(Synchronizer):
 class AgreementSynchronizer(Synchronizer):
     client_class = api.FinanceAPIClient
     model_class = models.AgreementTracker
+    last_updated_field = 'last_updated_utc'
 
     related_meta = {
         'type': (models.AgreementType, 'agreement_type'),
@@ -4125,6 +5693,10 @@ class SourceSynchronizer(Synchronizer):
 
 class UDFSynchronizer(Synchronizer):
     record_type = None  # Override in subclasses
+    checkpoint_support = False
+    payload_hash_field = 'payload_hash'
+    # The value belongs to the sampled record, not to the field definition.
+    payload_hash_exclude = ('_info', 'value')
 
     def fetch_records(self, results, conditions=None):
         """
@@ -41,6 +41,31 @@ class TestConnectWiseAPIClient(TestCase):
         self.client = api.ServiceAPIClient()  # Must use a real client as
         # ConnectWiseAPIClient is effectively abstract
 
+    def test_clients_share_session_per_credentials(self):
+        self.assertIs(self.client.session, api.SystemAPIClient().session)
+        self.assertIs(
+            self.client.session,
+            self.client.info_manager.session
+        )
+
+        other_client = api.ServiceAPIClient(api_public_key='other-key')
+        self.assertIsNot(self.client.session, other_client.session)
+
+    @responses.activate
+    def test_session_keeps_no_cookies(self):
+        endpoint = 'https://localhost/cookies'
+        responses.add(responses.GET, endpoint, json={},
+                      headers={'Set-Cookie': 'cw-session=1; Path=/'})
+
+        self.client.session.get(endpoint)
+
+        self.assertEqual(len(self.client.session.cookies), 0)
+
+    def test_close_sessions(self):
+        session = self.client.session
+        api.close_sessions()
+        self.assertIsNot(session, api.ServiceAPIClient().session)
+
     def test_prepare_conditions_single(self):
         conditions = [
             'closedFlag=False',
@@ -536,6 +561,26 @@ class TestTimeAPIClient(BaseAPITestCase):
             )
         self.assertEqual(mock_call.call_count, 1)
 
+    @responses.activate
+    def test_get_time_entries_order_by(self):
+        mk.get(self.endpoint, fixtures.API_TIME_ENTRY_LIST)
+        self.client.get_time_entries(order_by='id asc')
+
+        self.assertIn('orderBy=id+asc', responses.calls[0].request.url)
+
+    @responses.activate
+    def test_get_time_entries_count(self):
+        client = api.TimeAPIClient()
+        endpoint = client._endpoint(
+            '{}/count'.format(client.ENDPOINT_ENTRIES))
+        mk.get(endpoint, {'count': 2300})
+
+        count = client.get_time_entries_count(
+            conditions=['chargeToId in (1,2)'])
+
+        self.assertEqual(count, 2300)
+        self.assertIn('conditions=', responses.calls[0].request.url)
+
 
 class TestFetchAPICodebase(TestCase):
     HOST = 'https://na.myconnectwise.net'
@@ -543,6 +588,7 @@ class TestFetchAPICodebase(TestCase):
 
     def setUp(self):
         self.manager = CompanyInfoManager()
+        api.clear_api_codebase_cache()
 
     def _companyinfo_endpoint(self):
         return api.CompanyInfoManager.COMPANYINFO_ENDPOINT.format(
@@ -594,6 +640,38 @@ class TestFetchAPICodebase(TestCase):
         self.assertEqual(api_codebase, cache.get('api_codebase'))
         _patch.stop()
 
+    def test_fetch_api_codebase_from_memo(self):
+        cache.set('api_codebase',
+                  fixtures.API_COMPANY_INFO['Codebase'])
+        manager = CompanyInfoManager(codebase_ttl=60)
+        manager.fetch_api_codebase(
+            self.HOST, self.COMPANY_ID, force_fetch=False)
+
+        cache.clear()
+        with patch('djconnectwise.api.cache.get') as mock_cache_get:
+            api_codebase, updated = manager.fetch_api_codebase(
+                self.HOST, self.COMPANY_ID, force_fetch=False)
+
+        mock_cache_get.assert_not_called()
+        self.assertEqual(api_codebase, fixtures.API_COMPANY_INFO['Codebase'])
+        self.assertFalse(updated)
+
+    @responses.activate
+    def test_fetch_api_codebase_force_fetch_refreshes_memo(self):
+        cache.set('api_codebase', 'v2019_1/')
+        manager = CompanyInfoManager(codebase_ttl=60)
+        manager.fetch_api_codebase(
+            self.HOST, self.COMPANY_ID, force_fetch=False)
+
+        mk.get(self._companyinfo_endpoint(), fixtures.API_COMPANY_INFO)
+        api_codebase, updated = manager.fetch_api_codebase(
+            self.HOST, self.COMPANY_ID, force_fetch=True)
+        self.assertTrue(updated)
+
+        api_codebase, updated = manager.fetch_api_codebase(
+            self.HOST, self.COMPANY_ID, force_fetch=False)
+        self.assertEqual(api_codebase, fixtures.API_COMPANY_INFO['Codebase'])
+
 
 class TestSalesAPIClient(BaseAPITestCase):
 
@@ -710,6 +788,9 @@ class TestSalesAPIClient(BaseAPITestCase):
 
 class TestAPISettings(TestCase):
 
+    def setUp(self):
+        api.clear_api_codebase_cache()
+
     def get_cloud_client(self):
         server_url = 'https://{}'.format(CLOUD_DOMAIN)
         return api.ServiceAPIClient(server_url=server_url)
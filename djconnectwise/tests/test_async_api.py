@@ -0,0 +1,118 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from .. import async_api
+from . import fixtures
+from djconnectwise.api import ConnectWiseAPIClientError
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+@skipUnless(httpx, 'httpx is not installed')
+class TestAsyncServiceAPIClient(TestCase):
+
+    def get_client(self, handler):
+        self.requests = []
+
+        def _handler(request):
+            self.requests.append(request)
+            return handler(request)
+
+        return async_api.AsyncServiceAPIClient(
+            transport=httpx.MockTransport(_handler)
+        )
+
+    async def test_get_tickets(self):
+        client = self.get_client(
+            lambda request: httpx.Response(200, json=fixtures.API_SERVICE_TICKET_LIST)  # noqa: E501
+        )
+        async with client:
+            result = await client.get_tickets(conditions=['closedFlag=False'])
+
+        self.assertEqual(result, fixtures.API_SERVICE_TICKET_LIST)
+        params = self.requests[0].url.params
+        self.assertEqual(params['pageSize'], '1000')
+        self.assertEqual(params['page'], '1')
+        self.assertEqual(params['conditions'], '(closedFlag=False)')
+
+    async def test_tickets_count(self):
+        client = self.get_client(
+            lambda request: httpx.Response(200, json={'count': 12})
+        )
+        async with client:
+            self.assertEqual(await client.tickets_count(), 12)
+
+    @patch('djconnectwise.async_api.asyncio.sleep')
+    async def test_retries_server_errors(self, mock_sleep):
+        responses = [
+            httpx.Response(502, content=b'Bad Gateway'),
+            httpx.Response(200, json=fixtures.API_SERVICE_TICKET),
+        ]
+        client = self.get_client(lambda request: responses.pop(0))
+        retry_counter = {'count': 0}
+        async with client:
+            result = await client.fetch_resource(
+                client.ENDPOINT_TICKETS, retry_counter=retry_counter)
+
+        self.assertEqual(result, fixtures.API_SERVICE_TICKET)
+        self.assertEqual(retry_counter['count'], 2)
+        mock_sleep.assert_called_once_with(async_api.retry_wait(1))
+
+    async def test_no_retry_on_client_errors(self):
+        client = self.get_client(
+            lambda request: httpx.Response(400, content=b'{}')
+        )
+        retry_counter = {'count': 0}
+        async with client:
+            with self.assertRaises(ConnectWiseAPIClientError):
+                await client.fetch_resource(
+                    client.ENDPOINT_TICKETS, retry_counter=retry_counter)
+        self.assertEqual(retry_counter['count'], 1)
+
+
+@skipUnless(httpx, 'httpx is not installed')
+class TestAsyncSystemAPIClient(TestCase):
+
+    def get_client(self, handler):
+        return async_api.AsyncSystemAPIClient(
+            transport=httpx.MockTransport(handler)
+        )
+
+    async def test_get_member_image_by_photo_id(self):
+        client = self.get_client(lambda request: httpx.Response(
+            200, content=b'image',
+            headers={'Content-Disposition': 'attachment; filename=me.png'}
+        ))
+        async with client:
+            filename, content = await client.get_member_image_by_photo_id(
+                1, 'someone')
+
+        self.assertEqual(filename, 'me.png')
+        self.assertEqual(content, b'image')
+
+    async def test_get_member_image_by_photo_id_not_found(self):
+        client = self.get_client(
+            lambda request: httpx.Response(404, content=b'{}')
+        )
+        async with client:
+            self.assertEqual(
+                await client.get_member_image_by_photo_id(1, 'someone'),
+                (None, None)
+            )
+
+
+@skipUnless(httpx, 'httpx is not installed')
+class TestAsyncConfigurationAPIClient(TestCase):
+
+    async def test_get_configurations_by_no_ids(self):
+        client = async_api.AsyncConfigurationAPIClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(500))
+        )
+        async with client:
+            self.assertEqual(await client.get_configurations_by_ids([]), [])
@@ -1,9 +1,15 @@
 import io
+import multiprocessing
+from concurrent.futures import Future
+from unittest.mock import patch
 
+from django.apps import apps
+from django.conf import settings
 from django.core.management import call_command
 from django.test import TestCase
 
 from djconnectwise import models
+from djconnectwise.management.commands import cwsync
 
 from . import mocks
 from . import fixtures
@@ -25,6 +31,29 @@ def slug_to_title(slug):
     return slug.title().replace('_', ' ')
 
 
+def worker_state():
+    """Report how Django was set up in a worker process."""
+    return apps.ready, settings.CONNECTWISE_SERVER_URL
+
+
+class InlineExecutor:
+    """Run submitted work at once, in this process and DB transaction."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
 class AbstractBaseSyncTest(object):
 
     def _test_sync(self, mock_call, return_value, cw_object,
@@ -1091,6 +1120,67 @@ class TestSyncAllCommand(TestCase):
             self.assertIn(summary, output)
 
 
+class TestSyncParallelCommand(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dependencies = cwsync.synchronizer_dependencies(
+            cwsync.Command().synchronizer_map)
+
+    def test_reference_data_has_no_dependencies(self):
+        for name in ('priority', 'territory', 'work_type', 'source'):
+            self.assertEqual(self.dependencies[name], set())
+
+    def test_dependencies(self):
+        self.assertIn('board', self.dependencies['board_status'])
+        self.assertIn('company_status', self.dependencies['company'])
+        self.assertIn('ticket', self.dependencies['project_ticket'])
+        self.assertIn('ticket', self.dependencies['service_note'])
+        self.assertIn('holiday_list', self.dependencies['holiday'])
+
+    def test_dependencies_follow_map_order(self):
+        names = list(self.dependencies)
+        for name, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                self.assertLess(names.index(dependency), names.index(name))
+
+    def test_sync_in_parallel(self):
+        fixture_utils.init_work_roles()
+        fixture_utils.init_work_types()
+        mocks.service_api_get_boards_call(fixtures.API_BOARD_LIST)
+        mocks.service_api_get_statuses_call(fixtures.API_BOARD_STATUS_LIST)
+        out = io.StringIO()
+        command = cwsync.Command(stdout=out)
+
+        with patch.object(command, 'get_executor',
+                          return_value=InlineExecutor()):
+            results = list(command.sync_in_parallel(
+                ['board_status', 'board'], False, 4))
+
+        self.assertEqual([error for _, error in results], [None, None])
+        output = out.getvalue()
+        # Statuses wait for their boards, whatever order they're asked in.
+        self.assertLess(output.index('Board Sync Summary'),
+                        output.index('Board Status Sync Summary'))
+        self.assertEqual(models.BoardStatus.objects.count(),
+                         len(fixtures.API_BOARD_STATUS_LIST))
+
+    def test_spawned_workers_set_up_django(self):
+        # Spawned workers don't inherit settings made with
+        # settings.configure(), as the test settings are.
+        command = cwsync.Command()
+        command.mp_context = multiprocessing.get_context('spawn')
+
+        # Keep this test's DB connection, and its transaction, open.
+        with patch('djconnectwise.management.commands.cwsync.connections'), \
+                command.get_executor(1) as executor:
+            ready, server_url = \
+                executor.submit(worker_state).result(timeout=60)
+
+        self.assertTrue(ready)
+        self.assertEqual(server_url, settings.CONNECTWISE_SERVER_URL)
+
+
 class TestListUsersCommand(TestCase):
     def test_command(self):
         # We don't need to check output carefully. Just verify it
@@ -0,0 +1,211 @@
+import email.utils
+import time
+from unittest.mock import patch
+
+import responses
+from django.core.cache import cache
+from django.test import TestCase
+
+from djconnectwise import api, ratelimit
+
+
+class TestParseRetryAfter(TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(ratelimit.parse_retry_after('5'), 5.0)
+
+    def test_http_date(self):
+        retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+        seconds = ratelimit.parse_retry_after(retry_at)
+        self.assertGreater(seconds, 25)
+        self.assertLessEqual(seconds, 30)
+
+    def test_invalid(self):
+        self.assertIsNone(ratelimit.parse_retry_after(None))
+        self.assertIsNone(ratelimit.parse_retry_after('soon'))
+
+
+class TestRateLimiter(TestCase):
+
+    def test_unlimited(self):
+        limiter = ratelimit.RateLimiter()
+        for _ in range(100):
+            self.assertEqual(limiter.reserve(), 0)
+
+    def test_burst_then_rate(self):
+        limiter = ratelimit.RateLimiter(rate=10, burst=2)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+        # The third request has to wait for a token, a tenth of a second.
+        self.assertAlmostEqual(limiter.reserve(), 0.1, places=2)
+
+    def test_throttled_holds_requests_and_halves_rate(self):
+        limiter = ratelimit.RateLimiter(rate=10)
+        limiter.throttled(retry_after=2)
+
+        self.assertGreater(limiter.reserve(), 1.9)
+        self.assertEqual(limiter.rate, 5)
+
+        limiter.succeeded()
+        self.assertEqual(limiter.rate, 5.5)
+
+    def test_throttled_without_rate(self):
+        limiter = ratelimit.RateLimiter()
+        limiter.throttled(retry_after=2)
+        self.assertGreater(limiter.reserve(), 1.9)
+
+    def test_endpoint_semaphore(self):
+        limiter = ratelimit.RateLimiter(endpoint_concurrency={
+            'service/tickets': 2,
+            'service/tickets/notes': 1,
+        })
+        self.assertIs(
+            limiter.get_semaphore('service/tickets/1'),
+            limiter.endpoint_semaphores['service/tickets']
+        )
+        self.assertIs(
+            limiter.get_semaphore('service/tickets/notes'),
+            limiter.endpoint_semaphores['service/tickets/notes']
+        )
+        self.assertIsNone(limiter.get_semaphore('service/ticketsx'))
+        self.assertIsNone(limiter.get_semaphore('company/companies'))
+
+
+class TestRateLimiterLanes(TestCase):
+
+    def test_background_leaves_interactive_reserve(self):
+        limiter = ratelimit.RateLimiter(
+            rate=10, burst=10, interactive_reserve=0.5)
+        for _ in range(5):
+            self.assertEqual(limiter.reserve_background(), 0)
+
+        # Half the bucket is left to interactive requests.
+        self.assertGreater(limiter.reserve_background(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+
+    def test_background_gives_way_to_interactive(self):
+        limiter = ratelimit.RateLimiter()
+        with limiter.slot('service/tickets'):
+            self.assertEqual(limiter.reserve_background(),
+                             ratelimit.BACKGROUND_POLL_INTERVAL)
+            self.assertEqual(
+                limiter.reserve_background(yield_to_interactive=False), 0)
+        self.assertEqual(limiter.reserve_background(), 0)
+
+    def test_background_is_not_starved(self):
+        limiter = ratelimit.RateLimiter(background_max_delay=0.2)
+        with limiter.slot('service/tickets'):
+            start = time.monotonic()
+            limiter.acquire(ratelimit.LANE_BACKGROUND)
+            self.assertLess(time.monotonic() - start, 1)
+
+    async def test_async_slot(self):
+        limiter = ratelimit.RateLimiter(
+            endpoint_concurrency={'service/tickets': 1})
+        semaphore = limiter.get_semaphore('service/tickets')
+
+        async with limiter.slot_async('service/tickets/1'):
+            self.assertEqual(limiter.reserve_background(),
+                             ratelimit.BACKGROUND_POLL_INTERVAL)
+            self.assertFalse(semaphore.acquire(blocking=False))
+
+        self.assertEqual(limiter.reserve_background(), 0)
+        self.assertTrue(semaphore.acquire(blocking=False))
+
+    def test_default_lane(self):
+        client = api.ServiceAPIClient()
+        self.assertEqual(client.get_request_lane(),
+                         ratelimit.LANE_INTERACTIVE)
+
+        with ratelimit.default_lane(ratelimit.LANE_BACKGROUND):
+            self.assertEqual(client.get_request_lane(),
+                             ratelimit.LANE_BACKGROUND)
+            client.request_lane = ratelimit.LANE_INTERACTIVE
+            self.assertEqual(client.get_request_lane(),
+                             ratelimit.LANE_INTERACTIVE)
+
+        self.assertEqual(ratelimit.get_default_lane(),
+                         ratelimit.LANE_INTERACTIVE)
+
+
+class TestCacheRateLimiter(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_is_shared(self):
+        first = ratelimit.CacheRateLimiter(rate=1, cache_key='test')
+        second = ratelimit.CacheRateLimiter(rate=1, cache_key='test')
+
+        self.assertEqual(first.reserve(), 0)
+        # The window's only slot is gone, so wait for the next one.
+        self.assertGreater(second.reserve(), 0)
+
+    def test_interactive_requests_are_shared(self):
+        first = ratelimit.CacheRateLimiter(cache_key='test')
+        second = ratelimit.CacheRateLimiter(cache_key='test')
+
+        with first.slot('service/tickets'):
+            self.assertEqual(second.reserve_background(),
+                             ratelimit.BACKGROUND_POLL_INTERVAL)
+        self.assertEqual(second.reserve_background(), 0)
+
+    @patch.object(ratelimit, 'INTERACTIVE_PENDING_TIMEOUT', 1)
+    def test_interactive_count_outlives_its_first_timeout(self):
+        first = ratelimit.CacheRateLimiter(cache_key='test')
+        second = ratelimit.CacheRateLimiter(cache_key='test')
+
+        with first.slot('service/tickets'):
+            time.sleep(0.6)
+            with second.slot('service/tickets'):
+                pass
+            time.sleep(0.6)
+            # Each change to the count pushed its expiry back.
+            self.assertTrue(second._interactive_in_flight())
+
+    def test_throttled_is_shared(self):
+        first = ratelimit.CacheRateLimiter(cache_key='test')
+        second = ratelimit.CacheRateLimiter(cache_key='test')
+
+        first.throttled(retry_after=2)
+        self.assertGreater(second.reserve(), 1.5)
+
+
+class TestThrottledRequests(TestCase):
+
+    def setUp(self):
+        ratelimit.clear_rate_limiters()
+        self.client = api.ServiceAPIClient()
+
+    def tearDown(self):
+        ratelimit.clear_rate_limiters()
+
+    def test_clients_share_rate_limiter(self):
+        self.assertIs(
+            self.client.rate_limiter, api.SystemAPIClient().rate_limiter)
+
+    @responses.activate
+    def test_request_429(self):
+        url = 'tickets'
+        endpoint = self.client._endpoint(url)
+        responses.add(responses.GET, endpoint, status=429,
+                      headers={'Retry-After': '3'})
+
+        with self.assertRaises(api.ConnectWiseAPIThrottledError) as cm:
+            self.client.request('get', url)
+
+        self.assertEqual(cm.exception.retry_after, 3)
+        self.assertGreater(self.client.rate_limiter.reserve(), 2.5)
+
+    @responses.activate
+    def test_throttled_request_is_retried(self):
+        url = 'tickets'
+        endpoint = self.client._endpoint(url)
+        responses.add(responses.GET, endpoint, status=503)
+        responses.add(responses.GET, endpoint, json=[], status=200)
+
+        with patch('time.sleep'):
+            result = self.client.fetch_resource(url)
+
+        self.assertEqual(result, [])
+        self.assertEqual(len(responses.calls), 2)
@@ -1,19 +1,26 @@
 from copy import deepcopy
 from decimal import Decimal
 from unittest import TestCase
+from unittest.mock import patch
 from django.test import TransactionTestCase
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.core.files.storage import default_storage
+from django.utils import timezone
 
 import datetime
+import threading
+import time
 
 from dateutil.parser import parse
 from djconnectwise import models
-from djconnectwise.utils import get_hash
+from djconnectwise.utils import get_hash, DjconnectwiseSettings
 from djconnectwise.sync import InvalidObjectException
 
 from . import fixtures
 from . import fixture_utils
 from . import mocks
+from .. import api
 from .. import sync
 from ..sync import log_sync_job
 
@@ -136,6 +143,104 @@ class TestBatchConditionMixin(TestCase):
         self.assertIsNone(size)
 
 
+class TestSynchronizerPaging(TestCase):
+    PAGES = {
+        1: [{'id': 1}, {'id': 2}],
+        2: [{'id': 3}, {'id': 4}],
+        3: [{'id': 5}],
+    }
+
+    def setUp(self):
+        self.synchronizer = sync.BoardSynchronizer()
+        self.synchronizer.batch_size = 2
+
+    def _get_page(self, *args, **kwargs):
+        return self.PAGES.get(kwargs['page'], [])
+
+    def _iter_pages(self):
+        with patch.object(self.synchronizer, 'get_page',
+                          side_effect=self._get_page) as mock_get_page:
+            pages = list(self.synchronizer.iter_pages([]))
+        return pages, mock_get_page
+
+    def test_iter_pages(self):
+        pages, mock_get_page = self._iter_pages()
+
+        self.assertEqual(pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+        self.assertEqual(mock_get_page.call_count, 3)
+
+    def test_iter_pages_prefetch(self):
+        self.synchronizer.prefetch_pages = 2
+        pages, mock_get_page = self._iter_pages()
+
+        self.assertEqual(pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+        # Read-ahead never requests more than prefetch_pages past the end.
+        self.assertLessEqual(mock_get_page.call_count, 5)
+
+    def test_iter_pages_fanout(self):
+        self.synchronizer.page_fanout_workers = 2
+        with patch.object(self.synchronizer, 'get_count', return_value=5):
+            pages, mock_get_page = self._iter_pages()
+
+        self.assertCountEqual(
+            pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+        self.assertEqual(mock_get_page.call_count, 3)
+
+    def test_iter_pages_fanout_stale_count(self):
+        # Records added after counting still get fetched.
+        self.synchronizer.page_fanout_workers = 2
+        with patch.object(self.synchronizer, 'get_count', return_value=4):
+            pages, mock_get_page = self._iter_pages()
+
+        self.assertCountEqual(
+            pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+
+    def test_iter_pages_fanout_without_count(self):
+        self.synchronizer.page_fanout_workers = 2
+        pages, mock_get_page = self._iter_pages()
+
+        self.assertEqual(pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+
+    def test_iter_pages_keyset(self):
+        self.synchronizer.keyset_pagination = True
+        records = [{'id': i} for i in range(1, 6)]
+
+        def _get_page(*args, **kwargs):
+            last_id = 0
+            for condition in kwargs['conditions']:
+                if condition.startswith('id>'):
+                    last_id = int(condition[3:])
+            self.assertEqual(kwargs['page'], 1)
+            self.assertEqual(kwargs['order_by'], 'id asc')
+            return [r for r in records if r['id'] > last_id][:2]
+
+        with patch.object(self.synchronizer, 'get_page',
+                          side_effect=_get_page) as mock_get_page:
+            pages = list(
+                self.synchronizer.iter_pages(['a=1 or b=2']))
+
+        self.assertEqual(pages, [self.PAGES[1], self.PAGES[2], self.PAGES[3]])
+        self.assertEqual(
+            mock_get_page.call_args.kwargs['conditions'],
+            ['(a=1 or b=2)', 'id>4']
+        )
+
+    def test_iter_pages_prefetch_raises(self):
+        self.synchronizer.prefetch_pages = 2
+
+        def _get_page(*args, **kwargs):
+            if kwargs['page'] == 2:
+                raise api.ConnectWiseAPIError('Failed')
+            return self._get_page(*args, **kwargs)
+
+        with patch.object(self.synchronizer, 'get_page',
+                          side_effect=_get_page):
+            pages = self.synchronizer.iter_pages([])
+            self.assertEqual(next(pages), self.PAGES[1])
+            with self.assertRaises(api.ConnectWiseAPIError):
+                next(pages)
+
+
 class TestTerritorySynchronizer(TestCase, SynchronizerTestMixin):
     synchronizer_class = sync.TerritorySynchronizer
     model_class = models.TerritoryTracker
@@ -284,6 +389,91 @@ class TestCompanySynchronizer(TestCase, SynchronizerTestMixin):
         self.assertEqual(
             company.company_types.first().id, api_company['types'][0]['id'])
 
+    def test_fetch_sync_by_ids(self):
+        other_company = deepcopy(fixtures.API_COMPANY)
+        other_company['id'] = 3
+        _, _patch = self.call_api([fixtures.API_COMPANY, other_company])
+        self.synchronizer_class().sync()
+        _patch.stop()
+
+        updated_company = deepcopy(fixtures.API_COMPANY)
+        updated_company['name'] = 'Updated Company'
+        mock_call, _patch = self.call_api([updated_company])
+        results = self.synchronizer_class().fetch_sync_by_ids([3, 2])
+        _patch.stop()
+
+        # One request for both records, with the synchronizer's own
+        # conditions. The one missing from the response is left alone.
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(
+            mock_call.call_args.kwargs['conditions'],
+            self.synchronizer_class().api_conditions + ['id in (2,3)']
+        )
+        self.assertEqual(results.updated_count, 1)
+        self.assertEqual(results.deleted_count, 0)
+        self.assertEqual(results.synced_ids, {2})
+        self.assertEqual(
+            models.Company.objects.get(id=2).name, 'Updated Company')
+        self.assertTrue(models.Company.objects.filter(id=3).exists())
+
+
+class TestContactSynchronizerInlineCommunications(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        fixture_utils.init_companies()
+        fixture_utils.init_communication_types()
+        models.ContactCommunication.objects.all().delete()
+
+        request_settings = DjconnectwiseSettings().get_settings()
+        request_settings['inline_contact_communications'] = True
+        _, self.settings_patch = mocks.create_mock_call(
+            'djconnectwise.utils.DjconnectwiseSettings.get_settings',
+            request_settings
+        )
+
+    def tearDown(self):
+        self.settings_patch.stop()
+
+    def _sync(self, contacts, full=False):
+        mocks.company_api_get_contacts(contacts)
+        synchronizer = sync.ContactSynchronizer(full=full)
+        synchronizer.sync()
+        return synchronizer
+
+    def test_sync_communications_from_contacts(self):
+        communications_call, _ = \
+            mocks.company_api_get_contact_communications([])
+        synchronizer = self._sync(fixtures.API_COMPANY_CONTACT_LIST)
+
+        communications_call.assert_not_called()
+        self.assertEqual(synchronizer.communication_results.created_count,
+                         len(fixtures.API_CONTACT_COMMUNICATION_LIST))
+        for json_data in fixtures.API_CONTACT_COMMUNICATION_LIST:
+            instance = models.ContactCommunication.objects.get(
+                id=json_data['id'])
+            self.assertEqual(instance.contact_id, json_data['contactId'])
+            self.assertEqual(instance.value, json_data['value'])
+            self.assertEqual(instance.type_id, json_data['type']['id'])
+
+    def test_full_sync_prunes_communications(self):
+        self._sync(fixtures.API_COMPANY_CONTACT_LIST)
+
+        contacts = deepcopy(fixtures.API_COMPANY_CONTACT_LIST)
+        kept, removed = contacts[0]['communicationItems'][:2]
+        contacts[0]['communicationItems'] = [kept]
+        synchronizer = self._sync(contacts, full=True)
+
+        self.assertEqual(synchronizer.communication_results.deleted_count, 1)
+        self.assertTrue(
+            models.ContactCommunication.objects.filter(
+                id=kept['id']).exists())
+        self.assertFalse(
+            models.ContactCommunication.objects.filter(
+                id=removed['id']).exists())
+
 
 class TestCompanyStatusSynchronizer(TestCase, SynchronizerTestMixin):
     synchronizer_class = sync.CompanyStatusSynchronizer
@@ -337,6 +527,41 @@ class TestCompanyTeamSynchronizer(TestCase, SynchronizerTestMixin):
         self.assertNotEqual(original.tech_flag, new_json['techFlag'])
         self._assert_fields(changed, new_json)
 
+    def _sync_with_watermarks(self, full=False):
+        mock_call, _ = self.call_api(self.fixture)
+        synchronizer = self.synchronizer_class(full=full)
+        synchronizer.parent_watermarks = True
+        synchronizer.sync()
+        return mock_call
+
+    def test_parent_watermarks(self):
+        fixture_utils.init_companies()
+        models.Company.objects.update(
+            last_updated_utc=parse('2020-01-01T10:00:00Z'))
+        company_ids = list(
+            models.Company.objects.values_list('id', flat=True))
+
+        self._sync_with_watermarks(full=True)
+        self.assertEqual(
+            models.ParentWatermark.objects.filter(
+                entity_name='CompanyTeam').count(),
+            len(company_ids)
+        )
+
+        # No company has changed since, so there's nothing to visit.
+        mock_call = self._sync_with_watermarks()
+        mock_call.assert_not_called()
+
+        models.Company.objects.filter(id=company_ids[0]).update(
+            last_updated_utc=parse('2020-01-02T10:00:00Z'))
+        mock_call = self._sync_with_watermarks()
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(mock_call.call_args[0][0], company_ids[0])
+
+        # A full sync visits every company regardless.
+        mock_call = self._sync_with_watermarks(full=True)
+        self.assertEqual(mock_call.call_count, len(company_ids))
+
     def _assert_fields(self, instance, json_data):
         self.assertEqual(instance.account_manager_flag,
                          json_data['accountManagerFlag'])
@@ -407,6 +632,54 @@ class TestTimeEntrySynchronizer(TestCase, SynchronizerTestMixin):
         self.assertEqual(skipped_count, 1)
         self.assertEqual(updated_count, 0)
 
+    def test_sync_skips_unchanged_last_updated(self):
+        json_data = deepcopy(self.fixture[0])
+        json_data['_info'] = {'lastUpdated': '2020-01-01T10:00:00Z'}
+        self._sync([json_data])
+        instance = self.model_class.objects.get(id=json_data['id'])
+        self.assertEqual(instance.last_updated_utc,
+                         parse('2020-01-01T10:00:00Z'))
+
+        new_json = deepcopy(json_data)
+        new_json['notes'] = 'Not transformed'
+        self.call_api([new_json])
+        synchronizer = self.synchronizer_class()
+        synchronizer.skip_unchanged_records = True
+        _, updated_count, skipped_count, _ = synchronizer.sync()
+
+        self.assertEqual((updated_count, skipped_count), (0, 1))
+        instance = self.model_class.objects.get(id=json_data['id'])
+        self.assertEqual(instance.notes, json_data['notes'])
+
+        new_json['_info'] = {'lastUpdated': '2020-01-02T10:00:00Z'}
+        self.call_api([new_json])
+        _, updated_count, skipped_count, _ = synchronizer.sync()
+
+        self.assertEqual((updated_count, skipped_count), (1, 0))
+        instance = self.model_class.objects.get(id=json_data['id'])
+        self.assertEqual(instance.notes, 'Not transformed')
+
+    def test_sync_unchanged_with_unresolved_relation(self):
+        json_data = deepcopy(self.fixture[0])
+        json_data['_info'] = {'lastUpdated': '2020-01-01T10:00:00Z'}
+        # The location hasn't been synced yet.
+        json_data['locationId'] = 9999
+        self._sync([json_data])
+        instance = self.model_class.objects.get(id=json_data['id'])
+        self.assertIsNone(instance.system_location)
+
+        new_json = deepcopy(json_data)
+        new_json['notes'] = 'Transformed again'
+        self.call_api([new_json])
+        synchronizer = self.synchronizer_class()
+        synchronizer.skip_unchanged_records = True
+        _, updated_count, _, _ = synchronizer.sync()
+
+        # Unchanged, but not skipped, as the location may exist by now.
+        self.assertEqual(updated_count, 1)
+        instance = self.model_class.objects.get(id=json_data['id'])
+        self.assertEqual(instance.notes, 'Transformed again')
+
     def _assert_fields(self, instance, json_data):
         self.assertEqual(instance.id, json_data['id'])
         self.assertEqual(instance.charge_to_id.id, json_data['chargeToId'])
@@ -925,6 +1198,58 @@ class TestBoardSynchronizer(TestCase, SynchronizerTestMixin):
         fixture_utils.init_work_types()
         fixture_utils.init_boards()
 
+    def test_preload_related(self):
+        synchronizer = self.synchronizer_class()
+        synchronizer.preload_related(self.fixture)
+
+        instance = self.model_class()
+        with CaptureQueriesContext(connection) as queries:
+            synchronizer.set_relations(instance, self.fixture[0])
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            instance.work_role_id, self.fixture[0]['workRole']['id'])
+
+
+class TestBoardSynchronizerBulkPersist(TestBoardSynchronizer):
+    """Run the board synchronizer tests again, writing pages in bulk."""
+
+    def _get_synchronizer(self):
+        synchronizer = self.synchronizer_class()
+        synchronizer.bulk_persist = True
+        return synchronizer
+
+    def _sync(self, return_data):
+        _, get_patch = self.call_api(return_data)
+        self.synchronizer = self._get_synchronizer()
+        self.synchronizer.sync()
+        return _, get_patch
+
+    def _sync_with_results(self, return_data):
+        _, get_patch = self.call_api(return_data)
+        self.synchronizer = self._get_synchronizer()
+        return self.synchronizer.sync()
+
+    def test_bulk_write_failure_falls_back(self):
+        self._sync(self.fixture)
+        new_json = deepcopy(self.fixture[0])
+        new_json['name'] = 'Some New Name'
+        _, get_patch = self.call_api([new_json])
+        synchronizer = self._get_synchronizer()
+
+        with patch.object(self.model_class.objects, 'bulk_update',
+                          side_effect=IntegrityError('Failed')), \
+                patch.object(synchronizer, 'preload_related',
+                             wraps=synchronizer.preload_related) as preload:
+            _, updated_count, _, _ = synchronizer.sync()
+
+        self.assertEqual(updated_count, 1)
+        # The page isn't prepared again for the record-by-record write.
+        self.assertEqual(preload.call_count, 1)
+        self._assert_fields(
+            self.model_class.objects.get(id=new_json['id']), new_json)
+        self.assertTrue(synchronizer.bulk_persist)
+
 
 class TestBoardStatusSynchronizer(TestCase, SynchronizerTestMixin):
     synchronizer_class = sync.BoardStatusSynchronizer
@@ -945,6 +1270,30 @@ class TestBoardStatusSynchronizer(TestCase, SynchronizerTestMixin):
     def call_api(self, return_data):
         return mocks.service_api_get_statuses_call(return_data)
 
+    def test_sync_child_fetch_workers(self):
+        self.call_api(self.fixture)
+        synchronizer = self.synchronizer_class()
+        synchronizer.child_fetch_workers = 2
+        created_count, _, _, _ = synchronizer.sync()
+
+        self.assertEqual(created_count, len(self.fixture))
+        instance_dict = {c['id']: c for c in self.fixture}
+        for instance in self.model_class.objects.all():
+            self._assert_fields(instance, instance_dict[instance.id])
+
+    def test_sync_child_fetch_workers_skips_forbidden_parents(self):
+        synchronizer = self.synchronizer_class()
+        synchronizer.child_fetch_workers = 2
+        with patch(
+            'djconnectwise.api.ServiceAPIClient.get_statuses',
+            side_effect=api.ConnectWiseSecurityPermissionsException('Denied')
+        ) as mock_call:
+            created_count, _, _, _ = synchronizer.sync()
+
+        self.assertEqual(mock_call.call_count,
+                         models.ConnectWiseBoard.objects.count())
+        self.assertEqual(created_count, 0)
+
 
 class TestServiceNoteSynchronizer(TestCase, SynchronizerTestMixin):
     synchronizer_class = sync.ServiceNoteSynchronizer
@@ -2204,6 +2553,40 @@ class TestSyncSettings(TestCase):
         _patch.stop()
 
 
+class TestLazySynchronizerConditions(TestCase):
+
+    def test_construction_runs_no_queries(self):
+        for synchronizer_class in (sync.ServiceTicketSynchronizer,
+                                   sync.ProjectTicketSynchronizer,
+                                   sync.TimeEntrySynchronizer,
+                                   sync.ScheduleEntriesSynchronizer,
+                                   sync.ActivitySynchronizer,
+                                   sync.ProjectSynchronizer):
+            with CaptureQueriesContext(connection) as queries:
+                synchronizer_class(full=True)
+            self.assertEqual(len(queries), 0, synchronizer_class.__name__)
+
+    def test_batch_condition_list_loaded_on_use(self):
+        fixture_utils.init_boards()
+        fixture_utils.init_board_statuses()
+        synchronizer = sync.ServiceTicketSynchronizer()
+
+        self.assertEqual(
+            synchronizer.batch_condition_list,
+            list(models.BoardStatus.available_objects.filter(
+                closed_status=False).order_by('id').values_list(
+                'id', flat=True))
+        )
+
+    def test_replaced_batch_condition_list_is_not_loaded(self):
+        synchronizer = sync.TimeEntrySynchronizer()
+        synchronizer.batch_condition_list = [1]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(synchronizer.batch_condition_list, [1])
+        self.assertEqual(len(queries), 0)
+
+
 class MockSynchronizer:
     error_message = 'One heck of an error'
     model_class = models.TicketTracker
@@ -2263,6 +2646,29 @@ class TestTypeSynchronizer(TestCase, SynchronizerTestMixin):
     def call_api(self, return_data):
         return mocks.service_api_get_types_call(return_data)
 
+    def test_sync_skips_unchanged_payload(self):
+        self._sync(self.fixture)
+        instance = self.model_class.objects.get(id=self.fixture[0]['id'])
+        self.assertEqual(len(instance.payload_hash), 40)
+
+        synchronizer = self.synchronizer_class()
+        synchronizer.skip_unchanged_records = True
+        with patch.object(synchronizer, '_assign_field_data') as assign:
+            _, updated_count, skipped_count, _ = synchronizer.sync()
+
+        assign.assert_not_called()
+        self.assertEqual(updated_count, 0)
+        self.assertEqual(skipped_count, len(self.fixture))
+
+        new_json = deepcopy(self.fixture[0])
+        new_json['name'] = 'Some New Name'
+        self.call_api([new_json])
+        _, updated_count, _, _ = synchronizer.sync()
+
+        self.assertEqual(updated_count, 1)
+        self._assert_fields(
+            self.model_class.objects.get(id=new_json['id']), new_json)
+
     def _assert_fields(self, instance, json_data):
         self.assertEqual(instance.id, json_data['id'])
         self.assertEqual(instance.name, json_data['name'])
@@ -2516,3 +2922,495 @@ class TestProjectTicketRetention(TransactionTestCase):
         retention = self._retention_pass(self._conditions_used(full=False))
 
         self.assertEqual(retention, [])
+
+
+class TestRunRelatedSyncs(TransactionTestCase):
+    # A TestCase's atomic block would force the syncs to run one after
+    # another, so use a TransactionTestCase to exercise the thread pool.
+
+    def test_related_syncs_run_in_order(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 0
+        calls = []
+
+        synchronizer.run_related_syncs(
+            [lambda: calls.append(1), lambda: calls.append(2)])
+
+        self.assertEqual(calls, [1, 2])
+
+    def test_related_syncs_run_concurrently(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 2
+        # Each sync only finishes once the other one has started.
+        barrier = threading.Barrier(2, timeout=5)
+
+        synchronizer.run_related_syncs([barrier.wait, barrier.wait])
+
+        self.assertFalse(barrier.broken)
+
+    def test_concurrent_related_syncs_commit(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 2
+        barrier = threading.Barrier(2, timeout=5)
+
+        def sync_location(name):
+            def related_sync():
+                barrier.wait()
+                models.Location.objects.create(name=name)
+            return related_sync
+
+        synchronizer.run_related_syncs(
+            [sync_location('first'), sync_location('second')])
+
+        self.assertEqual(
+            set(models.Location.objects.values_list('name', flat=True)),
+            {'first', 'second'}
+        )
+
+    def test_related_syncs_are_waited_for(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 1
+        synchronizer.related_sync_timeout = 0.1
+        calls = []
+
+        def slow_sync():
+            time.sleep(0.5)
+            calls.append('slow')
+
+        synchronizer.run_related_syncs(
+            [slow_sync, lambda: calls.append(threading.get_ident())])
+
+        # The running sync was waited for past the timeout, and the one
+        # that hadn't started was then run on this thread.
+        self.assertEqual(calls, ['slow', threading.get_ident()])
+
+    def test_cancelled_related_sync_errors_are_raised(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 1
+        synchronizer.related_sync_timeout = 0.1
+
+        def failing_sync():
+            raise api.ConnectWiseAPIError('Failed')
+
+        with self.assertRaises(api.ConnectWiseAPIError):
+            synchronizer.run_related_syncs(
+                [lambda: time.sleep(0.5), failing_sync])
+
+    def test_related_syncs_in_transaction_run_in_order(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 2
+        threads = []
+
+        with transaction.atomic():
+            synchronizer.run_related_syncs([
+                lambda: threads.append(threading.get_ident()),
+                lambda: threads.append(threading.get_ident()),
+            ])
+
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+
+    def test_related_sync_errors_are_raised(self):
+        synchronizer = sync.BoardSynchronizer()
+        synchronizer.related_sync_workers = 2
+
+        def failing_sync():
+            raise api.ConnectWiseAPIError('Failed')
+
+        with self.assertRaises(api.ConnectWiseAPIError):
+            synchronizer.run_related_syncs([failing_sync, lambda: None])
+
+
+class TestSyncWatermarks(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        models.SyncWatermark.objects.all().delete()
+
+        request_settings = DjconnectwiseSettings().get_settings()
+        request_settings['sync_watermarks'] = True
+        _, self.settings_patch = mocks.create_mock_call(
+            'djconnectwise.utils.DjconnectwiseSettings.get_settings',
+            request_settings
+        )
+
+    def tearDown(self):
+        self.settings_patch.stop()
+
+    def _sync(self, companies, source='local'):
+        mock_call, _patch = mocks.company_api_get_call(companies)
+        synchronizer = sync.CompanySynchronizer()
+        synchronizer.watermark_source = source
+        synchronizer.sync()
+        _patch.stop()
+        return mock_call
+
+    def _get_watermark(self):
+        return models.SyncWatermark.objects.get(
+            entity_name='Company').watermark
+
+    def test_partial_sync_starts_from_watermark(self):
+        self._sync([fixtures.API_COMPANY])
+        watermark = self._get_watermark()
+
+        mock_call = self._sync([fixtures.API_COMPANY])
+        conditions = [
+            c for c in mock_call.call_args.kwargs['conditions']
+            if c.startswith('lastUpdated')
+        ]
+        self.assertEqual(conditions, [
+            'lastUpdated>[{}]'.format(
+                watermark.strftime('%Y-%m-%dT%H:%M:%S.%f'))
+        ])
+        self.assertGreater(self._get_watermark(), watermark)
+
+    def test_partial_sync_without_watermark_uses_sync_job(self):
+        # As on the first sync after sync_watermarks is turned on.
+        self._sync([fixtures.API_COMPANY])
+        models.SyncWatermark.objects.all().delete()
+        last_sync_job = models.SyncJob.objects.filter(
+            entity_name='Company').last()
+
+        mock_call = self._sync([fixtures.API_COMPANY])
+        conditions = [
+            c for c in mock_call.call_args.kwargs['conditions']
+            if c.startswith('lastUpdated')
+        ]
+        self.assertEqual(conditions, [
+            'lastUpdated>[{}]'.format(
+                last_sync_job.start_time.strftime('%Y-%m-%dT%H:%M:%S.%f'))
+        ])
+        self.assertIsNotNone(self._get_watermark())
+
+    def test_failed_sync_keeps_watermark(self):
+        self._sync([fixtures.API_COMPANY])
+        watermark = self._get_watermark()
+
+        _, _patch = mocks.create_mock_call(
+            'djconnectwise.api.CompanyAPIClient.get_companies', None,
+            side_effect=api.ConnectWiseAPIError('Failed'))
+        with self.assertRaises(api.ConnectWiseAPIError):
+            sync.CompanySynchronizer().sync()
+        _patch.stop()
+
+        self.assertEqual(self._get_watermark(), watermark)
+
+    def test_last_updated_source(self):
+        company = deepcopy(fixtures.API_COMPANY)
+        company['_info']['lastUpdated'] = '2020-01-01T00:00:00Z'
+        self._sync([company], source=sync.WATERMARK_LAST_UPDATED)
+
+        self.assertEqual(self._get_watermark(), parse('2020-01-01T00:00:00Z'))
+
+
+class TestPruneInDatabase(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        models.Company.objects.all().delete()
+
+        self.other_company = deepcopy(fixtures.API_COMPANY)
+        self.other_company['id'] = 3
+        self._sync([fixtures.API_COMPANY, self.other_company])
+
+    def _sync(self, companies, full=False, mass_delete_protection=False):
+        _, _patch = mocks.company_api_get_call(companies)
+        synchronizer = sync.CompanySynchronizer(full=full)
+        synchronizer.prune_in_database = True
+        synchronizer.prune_batch_size = 1
+        synchronizer.mass_delete_protection = mass_delete_protection
+        results = synchronizer.sync()
+        _patch.stop()
+        return results
+
+    def test_full_sync_prunes_stale_records(self):
+        _, _, _, deleted_count = self._sync([self.other_company], full=True)
+
+        self.assertEqual(deleted_count, 1)
+        self.assertEqual(
+            list(models.Company.objects.values_list('id', flat=True)), [3])
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+    def test_mass_delete_protection(self):
+        _, _, _, deleted_count = self._sync(
+            [], full=True, mass_delete_protection=True)
+
+        self.assertEqual(deleted_count, 0)
+        self.assertEqual(models.Company.objects.count(), 2)
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+
+class TestSyncCheckpoints(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        models.Company.objects.all().delete()
+        models.SyncCheckpoint.objects.all().delete()
+        models.StagedRecordId.objects.all().delete()
+
+        self.companies = []
+        for company_id in (2, 3, 4, 5):
+            company = deepcopy(fixtures.API_COMPANY)
+            company['id'] = company_id
+            self.companies.append(company)
+
+        # Company 4 is gone from ConnectWise by the time of the full sync.
+        _, _patch = mocks.company_api_get_call(self.companies)
+        sync.CompanySynchronizer().sync()
+        _patch.stop()
+        del self.companies[2]
+
+        self.pages = []
+
+    def _get_page(self, page=None, conditions=None, **kwargs):
+        if self.keyset:
+            after_ids = [
+                int(c[len('id>'):]) for c in conditions
+                if c.startswith('id>')
+            ]
+            records = [
+                c for c in self.companies if c['id'] > max(after_ids or [0])
+            ]
+            # The page number the records would have been on.
+            page = len(self.companies) - len(records) + 1
+        else:
+            records = self.companies[page - 1:]
+        self.pages.append(page)
+        if page == self.fail_page:
+            raise api.ConnectWiseAPIError('API outage')
+        return records[:1]
+
+    def _sync(self, resume=False, fail_page=None, keyset=True,
+              checkpoint_support=True):
+        self.fail_page = fail_page
+        self.keyset = keyset
+        _, _patch = mocks.create_mock_call(
+            'djconnectwise.api.CompanyAPIClient.get_companies', None,
+            side_effect=self._get_page)
+        synchronizer = sync.CompanySynchronizer(full=True, resume=resume)
+        synchronizer.checkpoints = True
+        synchronizer.checkpoint_support = checkpoint_support
+        synchronizer.keyset_pagination = keyset
+        synchronizer.batch_size = 1
+        try:
+            return synchronizer.sync()
+        finally:
+            _patch.stop()
+
+    def test_resume_from_checkpoint(self):
+        with self.assertRaises(api.ConnectWiseAPIError):
+            self._sync(fail_page=2)
+
+        checkpoint = models.SyncCheckpoint.objects.get(entity_name='Company')
+        self.assertEqual(checkpoint.page, 1)
+        self.assertEqual(checkpoint.last_id, 2)
+        # Nothing is pruned until every page has been seen.
+        self.assertTrue(models.Company.objects.filter(id=4).exists())
+
+        self.pages = []
+        _, _, _, deleted_count = self._sync(resume=True)
+
+        self.assertEqual(self.pages, [2, 3, 4])
+        self.assertEqual(deleted_count, 1)
+        self.assertFalse(models.Company.objects.filter(id=4).exists())
+        self.assertFalse(models.SyncCheckpoint.objects.exists())
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+    def test_resume_restarts_paged_batch(self):
+        # Page numbers could skip records if some were deleted since, so
+        # without keyset pagination the batch is fetched again.
+        with self.assertRaises(api.ConnectWiseAPIError):
+            self._sync(fail_page=2, keyset=False)
+
+        checkpoint = models.SyncCheckpoint.objects.get(entity_name='Company')
+        self.assertEqual(checkpoint.batch_index, 0)
+        self.assertEqual(checkpoint.page, 0)
+
+        self.pages = []
+        _, _, _, deleted_count = self._sync(resume=True, keyset=False)
+
+        self.assertEqual(self.pages, [1, 2, 3, 4])
+        self.assertEqual(deleted_count, 1)
+        self.assertFalse(models.SyncCheckpoint.objects.exists())
+
+    def test_unsupported_synchronizer_skips_checkpoints(self):
+        with self.assertRaises(api.ConnectWiseAPIError):
+            self._sync(fail_page=2, checkpoint_support=False)
+
+        self.assertFalse(models.SyncCheckpoint.objects.exists())
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+    def test_sync_without_resume_starts_over(self):
+        with self.assertRaises(api.ConnectWiseAPIError):
+            self._sync(fail_page=2)
+
+        self.pages = []
+        self._sync()
+
+        self.assertEqual(self.pages, [1, 2, 3, 4])
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+
+class TestShardedSync(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        models.Company.objects.all().delete()
+        models.ShardedSync.objects.all().delete()
+        models.StagedRecordId.objects.all().delete()
+
+        self.companies = []
+        for company_id in (2, 3, 4, 5):
+            company = deepcopy(fixtures.API_COMPANY)
+            company['id'] = company_id
+            self.companies.append(company)
+
+        # Company 3 is gone from ConnectWise by the time of the full sync.
+        _, _patch = mocks.company_api_get_call(self.companies)
+        sync.CompanySynchronizer().sync()
+        _patch.stop()
+        del self.companies[1]
+
+        _, self.api_patch = mocks.create_mock_call(
+            'djconnectwise.api.CompanyAPIClient.get_companies', None,
+            side_effect=self._get_page)
+
+    def tearDown(self):
+        self.api_patch.stop()
+
+    def _get_page(self, page=None, conditions=None, **kwargs):
+        companies = self.companies
+        for condition in conditions:
+            if condition.startswith('id>='):
+                lower = int(condition[4:])
+                companies = [c for c in companies if c['id'] >= lower]
+            elif condition.startswith('id<'):
+                upper = int(condition[3:])
+                companies = [c for c in companies if c['id'] < upper]
+        return companies if page == 1 else []
+
+    def _synchronizer(self):
+        synchronizer = sync.CompanySynchronizer(full=True)
+        synchronizer.sync_shards = 2
+        return synchronizer
+
+    def test_shard_specs_are_id_ranges(self):
+        specs = self._synchronizer().get_shard_specs()
+
+        self.assertEqual(
+            [[c for c in spec['conditions'] if c.startswith('id')]
+             for spec in specs],
+            [['id<4'], ['id>=4']]
+        )
+
+    def test_prune_waits_for_every_shard(self):
+        synchronizer = self._synchronizer()
+        sharded_sync = synchronizer.start_sharded_sync()
+        # Another worker holds the first shard.
+        other_shard = models.SyncShard.objects.claim(
+            sharded_sync, 'other', 600)
+
+        _, _, _, deleted_count = synchronizer.sync_sharded('worker')
+
+        self.assertEqual(deleted_count, 0)
+        self.assertTrue(models.Company.objects.filter(id=3).exists())
+        self.assertFalse(
+            models.SyncShard.objects.get(pk=other_shard.pk).done)
+
+        # The other worker dies, so its shard is taken over once its lease
+        # runs out, and the last shard done brings on the prune.
+        models.SyncShard.objects.filter(pk=other_shard.pk).update(
+            lease_expires=timezone.now() - datetime.timedelta(seconds=1))
+        _, _, _, deleted_count = \
+            self._synchronizer().sync_sharded('worker')
+
+        self.assertEqual(deleted_count, 1)
+        self.assertFalse(models.Company.objects.filter(id=3).exists())
+        self.assertFalse(models.ShardedSync.objects.exists())
+        self.assertFalse(models.StagedRecordId.objects.exists())
+
+    def test_lost_shard_lease_stops_the_sync(self):
+        synchronizer = self._synchronizer()
+        # Renew every 10ms.
+        synchronizer.shard_lease_seconds = 0.03
+        sharded_sync = synchronizer.start_sharded_sync()
+        get_page = self._get_page
+
+        def taken_over(page=None, conditions=None, **kwargs):
+            # Another worker takes over the shard while it is fetched.
+            sharded_sync.shards.update(claimed_by='other')
+            time.sleep(0.1)
+            return get_page(page, conditions, **kwargs)
+        self.api_patch.stop()
+        _, self.api_patch = mocks.create_mock_call(
+            'djconnectwise.api.CompanyAPIClient.get_companies', None,
+            side_effect=taken_over)
+
+        with self.assertRaises(sync.LeaseLost):
+            synchronizer.sync_sharded('worker')
+
+        self.assertFalse(sharded_sync.shards.filter(done=True).exists())
+        self.assertTrue(models.Company.objects.filter(id=3).exists())
+
+
+class TestSyncLease(TestCase):
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+        models.SyncLease.objects.all().delete()
+        models.ShardedSync.objects.all().delete()
+        self.api_call, self.api_patch = mocks.company_api_get_call(
+            [fixtures.API_COMPANY])
+
+    def tearDown(self):
+        self.api_patch.stop()
+
+    def _hold_lease(self, expires_in):
+        models.SyncLease.objects.create(
+            entity_name='Company',
+            holder='other-host:1',
+            lease_expires=timezone.now() + datetime.timedelta(
+                seconds=expires_in),
+        )
+
+    def _sync(self, lease_mode):
+        synchronizer = sync.CompanySynchronizer()
+        synchronizer.lease_mode = lease_mode
+        counts = synchronizer.sync()
+        return counts, models.SyncJob.objects.all().last()
+
+    def test_sync_holds_and_releases_lease(self):
+        _, sync_job = self._sync(sync.LEASE_WAIT)
+
+        self.assertEqual(sync_job.lease_status, sync.LEASE_ACQUIRED)
+        self.assertEqual(sync_job.lease_holder, sync.get_worker_name())
+        self.api_call.assert_called()
+        lease = models.SyncLease.objects.get(entity_name='Company')
+        self.assertEqual(lease.holder, '')
+        self.assertEqual(lease.sync_job, sync_job)
+
+    def test_skip_while_leased(self):
+        self._hold_lease(600)
+        counts, sync_job = self._sync(sync.LEASE_SKIP)
+
+        self.assertEqual(counts, (0, 0, 0, 0))
+        self.api_call.assert_not_called()
+        self.assertEqual(sync_job.lease_status, sync.LEASE_SKIPPED)
+        self.assertEqual(sync_job.lease_holder, 'other-host:1')
+        self.assertTrue(sync_job.success)
+
+    def test_expired_lease_is_taken_over(self):
+        self._hold_lease(-1)
+        _, sync_job = self._sync(sync.LEASE_SKIP)
+
+        self.assertEqual(sync_job.lease_status, sync.LEASE_ACQUIRED)
+        self.api_call.assert_called()
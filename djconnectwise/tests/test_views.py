@@ -1,12 +1,17 @@
 import json
 import copy
+from unittest import mock
 from . import fixtures, fixture_utils, mocks
 
+from django.core.management import call_command
+from django.db import DatabaseError
 from django.urls import reverse
 from django.test import Client, TestCase
 
-from djconnectwise.models import Company, Ticket, Project
+from djconnectwise.models import Company, Ticket, Project, CallbackEvent
+from djconnectwise.utils import DjconnectwiseSettings
 from djconnectwise import views, api
+from djconnectwise.sync import InvalidObjectException
 
 
 class BaseTestCallBackView(TestCase):
@@ -227,3 +232,176 @@ class TestCompanyCallBackView(BaseTestCallBackView):
             company_fixture['id'],
             manager='available_objects'
         )
+
+
+class TestQueuedCallBackView(BaseTestCallBackView):
+    MODEL_CLASS = Company
+
+    def setUp(self):
+        fixture_utils.init_territories()
+        fixture_utils.init_company_statuses()
+        fixture_utils.init_company_types()
+
+        request_settings = DjconnectwiseSettings().get_settings()
+        request_settings.update({
+            'callback_queue': True,
+            'callback_coalesce_seconds': 0,
+        })
+        _, self.settings_patch = mocks.create_mock_call(
+            'djconnectwise.utils.DjconnectwiseSettings.get_settings',
+            request_settings
+        )
+
+    def tearDown(self):
+        self.settings_patch.stop()
+
+    def test_callback_is_queued(self):
+        mock_call, _patch = mocks.company_api_by_id_call(fixtures.API_COMPANY)
+        response = self.post_data(
+            'company', views.CALLBACK_ADDED, fixtures.API_COMPANY['id'])
+        _patch.stop()
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(mock_call.called)
+        self.assertEqual(Company.objects.count(), 0)
+        event = CallbackEvent.objects.get()
+        self.assertEqual(event.callback_type, 'company')
+        self.assertEqual(event.entity_id, fixtures.API_COMPANY['id'])
+        self.assertEqual(event.action, views.CALLBACK_ADDED)
+
+    def test_worker_coalesces_events(self):
+        company_id = fixtures.API_COMPANY['id']
+        self.post_data('company', views.CALLBACK_ADDED, company_id)
+        self.post_data('company', views.CALLBACK_UPDATED, company_id)
+        self.assertEqual(CallbackEvent.objects.count(), 2)
+
+        mock_call, _patch = mocks.company_api_by_id_call(fixtures.API_COMPANY)
+        call_command('cwcallbackworker', '--once')
+        _patch.stop()
+
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(Company.objects.get().id, company_id)
+        self.assertEqual(CallbackEvent.objects.count(), 0)
+
+    def test_worker_batches_records(self):
+        other_company = copy.deepcopy(fixtures.API_COMPANY)
+        other_company['id'] = 3
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+        self.post_data('company', views.CALLBACK_UPDATED, 3)
+
+        by_id_call, by_id_patch = \
+            mocks.company_api_by_id_call(fixtures.API_COMPANY)
+        list_call, list_patch = mocks.company_api_get_call(
+            [fixtures.API_COMPANY, other_company])
+        call_command('cwcallbackworker', '--once')
+        by_id_patch.stop()
+        list_patch.stop()
+
+        self.assertFalse(by_id_call.called)
+        self.assertEqual(list_call.call_count, 1)
+        self.assertEqual(
+            set(Company.objects.values_list('id', flat=True)), {2, 3})
+        self.assertEqual(CallbackEvent.objects.count(), 0)
+
+    def test_worker_applies_deletes_and_missing_records_singly(self):
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+        self.post_data('company', views.CALLBACK_UPDATED, 3)
+        self.post_data('ticket', views.CALLBACK_DELETED, 4)
+
+        # Company 3 is missing from the batched response, so it's fetched
+        # on its own rather than deleted.
+        by_id_call, by_id_patch = \
+            mocks.company_api_by_id_call(fixtures.API_COMPANY)
+        list_call, list_patch = \
+            mocks.company_api_get_call([fixtures.API_COMPANY])
+        delete_call, delete_patch = mocks.create_mock_call(
+            'djconnectwise.sync.ServiceTicketSynchronizer'
+            '.fetch_delete_by_id', None)
+        # Claim both types at once, as a worker claims a single type.
+        with mock.patch('djconnectwise.models.CallbackEventManager.claim',
+                        side_effect=[list(CallbackEvent.objects.all()), []]):
+            call_command('cwcallbackworker', '--once')
+        by_id_patch.stop()
+        list_patch.stop()
+        delete_patch.stop()
+
+        self.assertEqual(list_call.call_count, 1)
+        self.assertEqual(by_id_call.call_count, 1)
+        self.assertEqual(by_id_call.call_args.args, (3,))
+        delete_call.assert_called_once_with(4)
+        self.assertEqual(CallbackEvent.objects.count(), 0)
+
+    def test_worker_releases_failed_events(self):
+        self.post_data(
+            'company', views.CALLBACK_ADDED, fixtures.API_COMPANY['id'])
+
+        _, _patch = mocks.company_api_by_id_call(
+            None, raised=api.ConnectWiseAPIError)
+        # Stop after the first failure rather than retrying until the
+        # attempts run out.
+        with mock.patch('djconnectwise.models.CallbackEventManager.claim',
+                        side_effect=[list(CallbackEvent.objects.all()), []]):
+            call_command('cwcallbackworker', '--once')
+        _patch.stop()
+
+        event = CallbackEvent.objects.get()
+        self.assertIsNone(event.claimed_at)
+        self.assertEqual(event.attempts, 1)
+
+    def test_worker_releases_events_on_other_errors(self):
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+        self.post_data('company', views.CALLBACK_UPDATED, 3)
+
+        with mock.patch(
+                'djconnectwise.sync.CompanySynchronizer.fetch_sync_by_ids',
+                side_effect=DatabaseError('Deadlock')), \
+                mock.patch(
+                    'djconnectwise.models.CallbackEventManager.claim',
+                    side_effect=[list(CallbackEvent.objects.all()), []]):
+            call_command('cwcallbackworker', '--once')
+
+        for event in CallbackEvent.objects.all():
+            self.assertIsNone(event.claimed_at)
+            self.assertEqual(event.attempts, 1)
+
+    def test_worker_drops_invalid_records(self):
+        self.post_data(
+            'company', views.CALLBACK_ADDED, fixtures.API_COMPANY['id'])
+
+        with mock.patch(
+                'djconnectwise.sync.CompanySynchronizer.fetch_sync_by_id',
+                side_effect=InvalidObjectException('Not synced')):
+            call_command('cwcallbackworker', '--once')
+
+        self.assertFalse(CallbackEvent.objects.exists())
+
+    def test_ticket_events_are_claimed_first(self):
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+        self.post_data('ticket', views.CALLBACK_UPDATED, 69)
+
+        events = CallbackEvent.objects.claim()
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].callback_type, 'ticket')
+        self.assertIsNotNone(CallbackEvent.objects.get(
+            callback_type='ticket').claimed_at)
+
+    def test_claim_is_limited_to_one_type(self):
+        for company_id in (2, 3, 4):
+            self.post_data('company', views.CALLBACK_UPDATED, company_id)
+        self.post_data('contact', views.CALLBACK_UPDATED, 5)
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+
+        events = CallbackEvent.objects.claim(limit=2)
+
+        self.assertEqual(
+            [(e.callback_type, e.entity_id) for e in events],
+            [('company', 2), ('company', 2), ('company', 3)]
+        )
+
+    def test_claimed_entity_is_skipped(self):
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+        CallbackEvent.objects.claim()
+        self.post_data('company', views.CALLBACK_UPDATED, 2)
+
+        self.assertEqual(CallbackEvent.objects.claim(), [])
@@ -1,9 +1,11 @@
+import os
 import re
 import hashlib
 import logging
 from io import BytesIO
 from datetime import datetime, timedelta, timezone
 
+import django
 from PIL import Image, ImageOps
 from django.conf import settings
 from django.core.files.base import ContentFile
@@ -255,13 +257,60 @@ def parse_udf(custom_fields):
     return result
 
 
+def worker_setup_args():
+    """
+    Return the arguments for setup_worker() that set Django up in a worker
+    process the way it is in this one: the settings module, or else the
+    settings given to settings.configure(), which a spawned process
+    doesn't inherit.
+    """
+    if settings.SETTINGS_MODULE:
+        return settings.SETTINGS_MODULE, None
+    return None, {
+        name: getattr(settings, name) for name in dir(settings)
+        if name.isupper() and settings.is_overridden(name)
+    }
+
+
+def setup_worker(settings_module, configured_settings):
+    """
+    Set Django up in a worker process, from the arguments
+    worker_setup_args() returned in the parent process.
+    """
+    if not settings.configured:
+        if settings_module:
+            os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+        else:
+            settings.configure(**configured_settings)
+    django.setup()
+
+
 class DjconnectwiseSettings:
 
     def get_settings(self):
         # Make some defaults
         request_settings = {
             'timeout': 30.0,
+            'session_pool_size': 10,
+            'api_rate_limit': 0,
+            'api_rate_limit_burst': 0,
+            'api_rate_limit_backend': 'local',
+            'api_endpoint_concurrency': {},
+            'api_interactive_reserve': 0.2,
+            'api_background_max_delay': 5,
+            'api_codebase_ttl': 300,
             'batch_size': 50,
+            'prefetch_pages': 0,
+            'page_fanout_workers': 0,
+            'child_fetch_workers': 0,
+            'related_sync_workers': 0,
+            'related_sync_timeout': 60,
+            'parent_watermarks': False,
+            'sync_watermarks': False,
+            'sync_watermark_source': 'local',
+            'keyset_pagination': False,
+            'bulk_persist': False,
+            'skip_unchanged_records': False,
             'max_attempts': 3,
             'max_url_length': 2000,
             'schedule_entry_conditions_size': 0,
@@ -269,11 +318,24 @@ class DjconnectwiseSettings:
             'sync_child_tickets': True,
             'sync_time_and_note_entries': True,
             'sync_contact_communications': True,
+            'inline_contact_communications': False,
             'keep_closed_ticket_days': 0,
             'keep_closed_status_board_ids': 0,
             'company_exclude_status_ids': '',
             'send_naive_datetimes': True,
             'mass_delete_protection': False,
+            'prune_in_database': False,
+            'prune_batch_size': 1000,
+            'sync_checkpoints': False,
+            'sync_shards': 8,
+            'sync_shard_lease': 600,
+            'sync_lease_mode': '',
+            'sync_lease_seconds': 300,
+            'sync_lease_wait': 3600,
+            'callback_queue': False,
+            'callback_coalesce_seconds': 5,
+            'callback_claim_timeout': 300,
+            'callback_batch_size': 100,
         }
 
         if hasattr(settings, 'DJCONNECTWISE_CONF_CALLABLE'):
@@ -11,6 +11,7 @@ from django.views.generic import View
 from . import models
 from djconnectwise import sync
 from .api import ConnectWiseAPIError
+from .utils import DjconnectwiseSettings
 
 
 logger = logging.getLogger(__name__)
@@ -27,15 +28,18 @@ CALLBACK_ACTIONS = (
 )
 
 
-def get_ticket_sync_class(entity):
+def get_record_type(entity):
+    if entity:
+        return json.loads(entity).get('recordType')
+    return None
+
+
+def get_ticket_sync_class(entity=None, record_type=None):
     project_ticket_types = [
         models.Ticket.PROJECT_TICKET, models.Ticket.PROJECT_ISSUE
     ]
     if entity:
-        ticket_entity = json.loads(entity)
-        record_type = ticket_entity.get('recordType')
-    else:
-        record_type = None
+        record_type = get_record_type(entity)
 
     if record_type in project_ticket_types:
         sync_class = sync.ProjectTicketSynchronizer
@@ -72,6 +76,8 @@ class CallBackView(views.CsrfExemptMixin,
             sync.ScheduleEntriesSynchronizer, models.ScheduleEntry
         ),
     }
+    # Queued callbacks of these types are applied before any others.
+    HIGH_PRIORITY_TYPES = ('ticket',)
 
     def post(self, request, *args, **kwargs):
         """
@@ -108,17 +114,18 @@ class CallBackView(views.CsrfExemptMixin,
         entity_id = form.cleaned_data['entity_id']
         action = form.cleaned_data['action']
         callback_type = body.get('Type')
-
+        record_type = None
         if callback_type == self.CALLBACK_TICKET_TYPE:
-            entity = body.get('Entity')
-            get_synchronizer, model_class = \
-                self.CALLBACK_TYPES[callback_type]
+            record_type = get_record_type(body.get('Entity'))
 
-            sync_class = get_synchronizer(entity)
-        else:
-            sync_class, model_class = self.CALLBACK_TYPES[callback_type]
+        if DjconnectwiseSettings().get_settings().get('callback_queue'):
+            # Leave the API calls to the cwcallbackworker command, so that
+            # a burst of callbacks doesn't tie up the web workers.
+            self.enqueue(entity_id, action, callback_type, record_type)
+            return HttpResponse(status=204)
 
-        synchronizer = sync_class()
+        synchronizer, model_class = \
+            self.get_synchronizer(callback_type, record_type)
 
         try:
             self.handle(entity_id, action, callback_type, synchronizer)
@@ -134,6 +141,41 @@ class CallBackView(views.CsrfExemptMixin,
         # We need not return anything to ConnectWise
         return HttpResponse(status=204)
 
+    def enqueue(self, entity_id, action, callback_type, record_type=None):
+        if callback_type in self.HIGH_PRIORITY_TYPES:
+            priority = models.CallbackEvent.HIGH_PRIORITY
+        else:
+            priority = models.CallbackEvent.NORMAL_PRIORITY
+
+        return models.CallbackEvent.objects.create(
+            callback_type=callback_type,
+            entity_id=entity_id,
+            action=action,
+            record_type=record_type,
+            priority=priority,
+        )
+
+    def get_sync_class(self, callback_type, record_type=None):
+        """
+        Return the synchronizer class and the model class for the given
+        callback type. For tickets, the record type picks the service or
+        project ticket synchronizer.
+        """
+        if callback_type == self.CALLBACK_TICKET_TYPE:
+            get_synchronizer, model_class = \
+                self.CALLBACK_TYPES[callback_type]
+
+            sync_class = get_synchronizer(record_type=record_type)
+        else:
+            sync_class, model_class = self.CALLBACK_TYPES[callback_type]
+
+        return sync_class, model_class
+
+    def get_synchronizer(self, callback_type, record_type=None):
+        sync_class, model_class = \
+            self.get_sync_class(callback_type, record_type)
+        return sync_class(), model_class
+
     def handle(self, entity_id, action, callback_type, synchronizer):
         """
         Do the interesting stuff here, so that it can be overridden in
@@ -38,6 +38,10 @@ setup(
         # avatars to storage.
         'botocore',
     ],
+    extras_require={
+        # The asyncio clients in djconnectwise.async_api.
+        'async': ['httpx[http2]'],
+    },
     # Django likes to inspect apps for /migrations directories, and can't if
     # package is installed as a egg. zip_safe=False disables installation as
     # an egg.